@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'books.settings')
+# The async views run ORM calls in worker threads, whose persistent
+# connections are never closed at the end of a request.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -1,3 +1,4 @@
+import sys
 from pathlib import Path
 import environ
 
@@ -18,6 +19,9 @@ SECRET_KEY = env("SECRET_KEY")
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# `manage.py test`; a few STORE_* defaults below differ for the test suite.
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = []
 
 
@@ -30,6 +34,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'debug_toolbar',
     'django_filters',
@@ -44,6 +49,9 @@ INTERNAL_IPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'store.instrumentation.InstrumentationMiddleware',
+    'store.compression.CompressionMiddleware',
+    'store.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,11 +92,35 @@ DATABASES = {
         'NAME': env("DB_NAME"), 
         'USER': env("DB_USER"),
         'PASSWORD': env("DB_PASSWORD"),
-        'HOST': 'localhost', 
-        'PORT': 5432,
+        'HOST': env('DB_HOST', default='localhost'),
+        'PORT': env.int('DB_PORT', default=5432),
+        # books/asgi.py defaults DB_CONN_MAX_AGE to 0, see store/async_views.py.
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': env.bool('DB_CONN_HEALTH_CHECKS', default=True),
     }
 }
 
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1:5432,replica2:5432. Safe
+# requests to views with `replica_reads = True` read from them, see
+# store/db_router.py.
+#
+# Under `manage.py test` each replica is a separate, migrated test database
+# (two local databases standing in for primary and replica) and reads stay
+# on the primary, so the rest of the suite sees its own data; the router
+# tests opt in with override_settings(STORE_READ_REPLICAS=...).
+STORE_REPLICA_DATABASES = []
+for index, replica in enumerate(env.list('DB_REPLICA_HOSTS', default=[])):
+    host, _, port = replica.partition(':')
+    alias = f'replica_{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host, 'PORT': int(port or 5432),
+                        'TEST': {'NAME': f'test_{DATABASES["default"]["NAME"]}_{alias}'}}
+    STORE_REPLICA_DATABASES.append(alias)
+STORE_READ_REPLICAS = [] if TESTING else list(STORE_REPLICA_DATABASES)
+
+DATABASE_ROUTERS = ['store.db_router.ReplicaRouter']
+STORE_REPLICA_STICKY_SECONDS = env.int('STORE_REPLICA_STICKY_SECONDS', default=5)
+STORE_REPLICA_HEALTH_INTERVAL = env.int('STORE_REPLICA_HEALTH_INTERVAL', default=5)
+
 AUTHENTICATION_BACKENDS = (
     'social_core.backends.github.GithubOAuth2',
     'django.contrib.auth.backends.ModelBackend',
@@ -137,13 +169,73 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
-    'rest_framework.renderers.JSONRenderer',
+    'store.renderers.FastJSONRenderer',
     ),
     'DEFAULT_PARSER_CLASSES': (
     'rest_framework.parsers.JSONParser',
-    )
+    ),
+    # Number of proxies in front of the app that append to X-Forwarded-For.
+    # Unset, anonymous clients are throttled by REMOTE_ADDR.
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=None),
+}
+
+# e.g. CACHE_URL=rediscache://127.0.0.1:6379/1
+CACHES = {'default': env.cache('CACHE_URL', default='locmemcache://')}
+
+# Versioned response cache, see store/caching.py. Every worker has to see
+# the same catalogue version, so outside the tests it is only enabled with
+# a shared CACHE_URL. LocMemLRUBackend keeps the version per process and is
+# only correct with a single worker.
+if TESTING:
+    STORE_RESPONSE_CACHE = {
+        'BACKEND': 'store.caching.LocMemLRUBackend',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'max_bytes': 64 * 1024 * 1024,
+        },
+    }
+elif env('CACHE_URL', default=''):
+    STORE_RESPONSE_CACHE = {
+        'BACKEND': 'store.caching.SharedBackend',
+        'TIMEOUT': 300,
+    }
+else:
+    STORE_RESPONSE_CACHE = None
+
+# Seconds identical requests wait for a response being computed after a
+# cache miss instead of computing it again (0 disables). See CachedResponseMixin.
+STORE_SINGLE_FLIGHT_WAIT = env.float('STORE_SINGLE_FLIGHT_WAIT', default=5.0)
+
+# Per-process token buckets: `burst` requests at once, then `rate`. See
+# store/throttling.py.
+STORE_THROTTLE_RATES = {
+    'books': {
+        'user': {'rate': '50/s', 'burst': 500},
+        'anon': {'rate': '20/s', 'burst': 200},
+    },
+    'relations': {
+        'user': {'rate': '20/s', 'burst': 200},
+    },
 }
 
+# Responses smaller than this are sent uncompressed.
+STORE_COMPRESSION_MIN_SIZE = env.int('STORE_COMPRESSION_MIN_SIZE', default=1024)
+
+# Views over their query budget raise in the test suite and only log a
+# warning otherwise, see store/instrumentation.py.
+STORE_QUERY_BUDGET_RAISE = env.bool('STORE_QUERY_BUDGET_RAISE', default=TESTING)
+
+STORE_FAST_BOOK_SERIALIZER = env.bool('STORE_FAST_BOOK_SERIALIZER', default=True)
+
+# Acknowledge like/bookmark toggles before they reach the database, e.g.
+# {'BACKEND': 'store.write_behind.LocalBuffer', 'OPTIONS': {'flush_interval': 1.0}}.
+# See store/write_behind.py for the guarantees.
+STORE_WRITE_BEHIND = None
+
+# 'inline' updates a book's rating in the request that rates it; 'deferred'
+# queues the book for `manage.py process_rating_queue`.
+STORE_RATING_MODE = env('STORE_RATING_MODE', default='inline')
+
 SOCIAL_AUTH_POSTGRES_JSONFIELD_ENABLED = True
 
 SOCIAL_AUTH_GITHUB_KEY = env("GITHUB_CLIENT_ID")
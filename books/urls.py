@@ -4,7 +4,9 @@ from django.urls import re_path as  url
 from rest_framework.routers import SimpleRouter
 from django.conf import settings
 
-from store.views import BookViewSet, UserBookRelationView ,auth
+from store.views import BookViewSet, LibraryView, UserBookRelationView ,auth
+from store.instrumentation import metrics
+from store import async_views
 
 router = SimpleRouter()
 router.register(r'book', BookViewSet)
@@ -14,6 +16,11 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     url('', include('social_django.urls', namespace='social')),
     path('auth/', auth),
+    path('metrics/', metrics, name='metrics'),
+    url(r'^me/library/(?P<shelf>bookmarks|likes|rated)/$', LibraryView.as_view({'get': 'list'}), name='library'),
+    path('async/book/', async_views.book_list, name='async-book-list'),
+    path('async/book/<int:pk>/', async_views.book_detail, name='async-book-detail'),
+    path('async/book_relation/<int:book>/', async_views.relation_update, name='async-user-book-relation-detail'),
 ]
 
 urlpatterns += router.urls
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import pickle
+import time
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import exceptions, status
+
+from .caching import dump_payload, get_response_cache, load_payload
+from .db_router import primary_reads
+from .fast_serializers import fast_book_serializer_enabled
+from .library import OWN_RELATION_PARAM
+from .models import Book, UserBookRelation
+from .renderers import FastJSONRenderer
+from .serializers import UserBookRelationSerializer
+from .views import BookViewSet, UserBookRelationView
+from .write_behind import BufferBusy, get_write_buffer
+
+# Plain Django async views: DRF 3.14 has no async views. Under ASGI they run
+# on the event loop and only borrow a worker thread for the parts Django 4.1
+# cannot do asynchronously (session lookup, cache round trips, the raw
+# readers query, model validation and Model.save()). Filtering, ordering,
+# keyset pagination, permissions and throttles are those of the sync
+# endpoints, and so is the response cache: same backend, catalogue version
+# and fill from the primary, under keys of their own (the pagination links
+# differ). Concurrent misses wait for the first one within the event loop
+# and, with SharedBackend, across processes through its lock. Conditional
+# GET stays on the sync endpoints.
+#
+# Run under ASGI with DB_CONN_MAX_AGE=0 (books/asgi.py defaults to it):
+# the ORM calls run in worker threads, and persistent connections held by
+# those threads are never closed at the end of a request.
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def exception_response(exc):
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = json_response(detail, status=exc.status_code)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait
+    return response
+
+
+def get_book_view(request, action, **kwargs):
+    # Querysets are built lazily, so filter backends never touch the database
+    # here; reads are safe as IsOwnerOrStaffOrReadOnly allows safe methods.
+    view = BookViewSet(action_map={'get': action}, args=(), kwargs=kwargs, format_kwarg=None, basename='async-book')
+    # With the view's authenticators, so request.user is the session user
+    # that resolve_user() loaded.
+    view.request = view.initialize_request(request)
+    # Part of the cache key; these views only speak JSON.
+    view.request.accepted_media_type = 'application/json'
+    # Token buckets live in process memory, so this does not block.
+    view.check_throttles(view.request)
+    return view
+
+
+async def resolve_user(request):
+    # Throttles and ?own_relation need the session user; loading it is
+    # sync-only.
+    request.user = await sync_to_async(get_user)(request)
+
+
+async def serialize(view, rows, many=False):
+    serializer = view.get_fast_serializer(rows, many=many)
+    return await sync_to_async(lambda: serializer.data)()
+
+
+# With STORE_FAST_BOOK_SERIALIZER off the sync views serialize model
+# instances with BooksSerializer; so do these, in a worker thread.
+@sync_to_async
+def model_list_data(view, queryset):
+    page = view.paginate_queryset(queryset)
+    if page is None:
+        return view.get_serializer(queryset, many=True).data
+    return view.get_paginated_response(view.get_serializer(page, many=True).data).data
+
+
+@sync_to_async
+def model_detail_data(view, queryset, pk):
+    try:
+        book = queryset.get(pk=pk)
+    except (Book.DoesNotExist, TypeError, ValueError, ValidationError):
+        raise exceptions.NotFound()
+    return view.get_serializer(book).data
+
+
+cache_call = partial(sync_to_async, thread_sensitive=False)
+# (event loop, cache key) -> future of the payload being computed; the
+# futures belong to their loop.
+flights = {}
+
+
+async def cached_data(view, compute):
+    # CachedResponseMixin.cached_response for coroutines. Returns the data
+    # and the X-Cache status.
+    backend = get_response_cache()
+    if backend is None or view.action not in view.cached_actions:
+        return await compute(), None
+
+    key = view.get_response_cache_key(view.request, await cache_call(backend.get_version)())
+    payload = await cache_call(backend.get)(key)
+    if payload is not None:
+        backend.metrics.hits += 1
+        return load_payload(payload)[0], 'HIT'
+
+    backend.metrics.misses += 1
+    wait = getattr(settings, 'STORE_SINGLE_FLIGHT_WAIT', 0)
+    if not wait:
+        return (await fill_cache(backend, key, compute))[0], 'MISS'
+
+    loop = asyncio.get_running_loop()
+    flight = flights.get((loop, key))
+    if flight is not None:
+        try:
+            payload = await asyncio.wait_for(asyncio.shield(flight), wait)
+        except asyncio.TimeoutError:
+            payload = None
+        payload = payload or await cache_call(backend.get)(key)
+        if payload is not None:
+            backend.metrics.coalesced += 1
+            return load_payload(payload)[0], 'COALESCED'
+        return (await fill_cache(backend, key, compute))[0], 'MISS'
+
+    flight = flights[(loop, key)] = loop.create_future()
+    payload = None
+    try:
+        data, payload, cache_status = await lead_flight(view, backend, key, wait, compute)
+        return data, cache_status
+    finally:
+        del flights[(loop, key)]
+        flight.set_result(payload)
+
+
+async def lead_flight(view, backend, key, wait, compute):
+    if not hasattr(backend, 'lock'):
+        return *await fill_cache(backend, key, compute), 'MISS'
+    if await cache_call(backend.lock)(key, view.get_single_flight_lock_timeout(wait)):
+        try:
+            return *await fill_cache(backend, key, compute), 'MISS'
+        finally:
+            await cache_call(backend.unlock)(key)
+    # Another process holds the lock.
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        await asyncio.sleep(min(view.single_flight_poll, max(deadline - time.monotonic(), 0)))
+        payload = await cache_call(backend.get)(key)
+        if payload is not None:
+            backend.metrics.coalesced += 1
+            return load_payload(payload)[0], payload, 'COALESCED'
+    return *await fill_cache(backend, key, compute), 'MISS'
+
+
+async def fill_cache(backend, key, compute):
+    with primary_reads('cache_fill'):
+        data = await compute()
+    payload = dump_payload(pickle.dumps(data, pickle.HIGHEST_PROTOCOL), None)
+    await cache_call(backend.set)(key, payload)
+    backend.metrics.sets += 1
+    return data, payload
+
+
+def cached_json_response(data, cache_status):
+    response = json_response(data)
+    if cache_status is not None:
+        response['X-Cache'] = cache_status
+    return response
+
+
+async def book_list(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    await resolve_user(request)
+    try:
+        view = get_book_view(request, 'list')
+
+        async def compute():
+            if not fast_book_serializer_enabled():
+                return await model_list_data(view, view.filter_queryset(view.get_queryset()))
+            rows = view.book_values(view.filter_queryset(view.get_queryset()))
+            paginator = view.paginator
+            page = paginator.get_page_queryset(rows, view.request)
+            if page is None:
+                return await serialize(view, [row async for row in rows.aiterator()], many=True)
+            page = paginator.set_page([row async for row in page.aiterator()])
+            return paginator.get_paginated_response(await serialize(view, page, many=True)).data
+
+        return cached_json_response(*await cached_data(view, compute))
+    except exceptions.APIException as exc:
+        return exception_response(exc)
+
+
+book_list.replica_reads = True
+
+
+async def book_detail(request, pk):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    await resolve_user(request)
+    try:
+        view = get_book_view(request, 'retrieve', pk=pk)
+
+        async def compute():
+            queryset = view.filter_queryset(view.get_queryset())
+            if not fast_book_serializer_enabled():
+                return await model_detail_data(view, queryset, pk)
+            try:
+                row = await view.book_values(queryset.filter(pk=pk)).aget()
+            except (Book.DoesNotExist, ValidationError):
+                raise exceptions.NotFound()
+            return await serialize(view, row)
+
+        return cached_json_response(*await cached_data(view, compute))
+    except exceptions.APIException as exc:
+        return exception_response(exc)
+
+
+book_detail.replica_reads = True
+
+
+async def relation_update(request, book):
+    if request.method not in ('PUT', 'PATCH'):
+        return HttpResponseNotAllowed(['PUT', 'PATCH'])
+
+    user = await sync_to_async(get_user)(request)
+    if not user.is_authenticated:
+        # Session authentication has no WWW-Authenticate challenge, so DRF
+        # answers 403 rather than 401 on the sync endpoint too.
+        exc = exceptions.NotAuthenticated()
+        exc.status_code = status.HTTP_403_FORBIDDEN
+        return exception_response(exc)
+    request.user = user
+    try:
+        UserBookRelationView().check_throttles(request)
+    except exceptions.Throttled as exc:
+        return exception_response(exc)
+    try:
+        data = json.loads(request.body)
+    except ValueError as e:
+        return exception_response(exceptions.ParseError(f'JSON parse error - {e}'))
+    if not await Book.objects.filter(pk=book).aexists():
+        return exception_response(exceptions.NotFound())
+    buffer = get_write_buffer()
+    if buffer is not None:
+        # Buffered toggles for this book are older than this request.
+        try:
+            await sync_to_async(buffer.settle)([(user.pk, book)])
+        except BufferBusy as exc:
+            return exception_response(exc)
+
+    relation, created = await UserBookRelation.objects.aget_or_create(user=user, book_id=book)
+    serializer = UserBookRelationSerializer(relation, data=data, partial=request.method == 'PATCH')
+    # Validation looks the book up and Model.asave() only arrives in Django
+    # 4.2; save() also keeps the book counters in step.
+    if not await sync_to_async(serializer.is_valid)():
+        return json_response(serializer.errors, status=400)
+    await sync_to_async(serializer.save)()
+    return json_response(serializer.data)
@@ -0,0 +1,318 @@
+import itertools
+import json
+import platform
+import random
+import time
+import tracemalloc
+from itertools import accumulate
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .compression import CODINGS
+from .models import Book, UserBookRelation
+from .relations_process import recount_books
+from .renderers import FastJSONRenderer, MessagePackRenderer, msgpack, orjson
+
+BENCH_PREFIX = 'bench_'
+WORDS = ('war', 'peace', 'river', 'night', 'garden', 'stone', 'winter', 'city', 'letters', 'shadow',
+         'house', 'sea', 'journey', 'crown', 'silence', 'fire', 'glass', 'road', 'empire', 'song')
+RATE_WEIGHTS = ((None, 50), (5, 18), (4, 15), (3, 9), (2, 5), (1, 3))
+
+SCENARIOS = ('list', 'retrieve', 'search', 'filter', 'relation_patch')
+COMPARED_METRICS = ('p50_ms', 'p90_ms', 'p99_ms', 'peak_memory_bytes', 'queries')
+
+
+def zipf_weights(size, exponent=1.1):
+    # Cumulative weights of a Zipf distribution: rank 1 is the most popular.
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, size + 1)))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class DatasetGenerator:
+    # Builds a synthetic catalogue with bulk inserts. Book popularity and
+    # user activity follow Zipf distributions, so a few books collect most of
+    # the relations, like real catalogues. Everything is derived from `seed`,
+    # and generated usernames and author names start with BENCH_PREFIX so
+    # `clear()` can remove the dataset again. Running again without clearing
+    # keeps the users and books already generated under the same names.
+    def __init__(self, books=10000, users=1000, relations=100000, authors=None, seed=0,
+                 batch_size=5000, progress=None):
+        self.books = books
+        self.users = users
+        self.relations = relations
+        self.authors = authors or max(1, books // 20)
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def run(self):
+        user_ids = self.create_users()
+        book_ids = self.create_books(user_ids)
+        created = self.create_relations(user_ids, book_ids)
+        for batch in batched(book_ids, self.batch_size):
+            recount_books(batch)
+        return {'users': len(user_ids), 'books': len(book_ids), 'relations': created}
+
+    def report(self, stage, done, total):
+        if self.progress is not None:
+            self.progress(stage, done, total)
+
+    def create_users(self):
+        ids = []
+        names = (f'{BENCH_PREFIX}{index}' for index in range(self.users))
+        for batch in batched(names, self.batch_size):
+            users = User.objects.bulk_create([
+                User(username=name, first_name=name.title(), last_name='Bench', password='!') for name in batch
+            ], ignore_conflicts=True)
+            ids += [user.pk for user in users]
+            self.report('users', len(ids), self.users)
+        if not ids or ids[0] is None:
+            ids = list(User.objects.filter(username__startswith=BENCH_PREFIX).order_by('id').values_list('id', flat=True))
+        return ids
+
+    def create_books(self, user_ids):
+        ids = []
+        authors = [f'{BENCH_PREFIX}author {index}' for index in range(self.authors)]
+        author_weights = zipf_weights(len(authors))
+        now = timezone.now()
+        for batch in batched(range(self.books), self.batch_size):
+            books = []
+            for index in batch:
+                title = ' '.join(self.random.sample(WORDS, 2)).capitalize()
+                books.append(Book(
+                    name=f'{title} {index}',
+                    price=round(self.random.lognormvariate(3, 0.6), 2),
+                    author_name=self.random.choices(authors, cum_weights=author_weights)[0],
+                    owner_id=self.random.choice(user_ids) if user_ids else None,
+                    updated_at=now,
+                ))
+            ids += [book.pk for book in Book.objects.bulk_create(books, ignore_conflicts=True)]
+            self.report('books', len(ids), self.books)
+        if not ids or ids[0] is None:
+            ids = list(Book.objects.filter(author_name__startswith=BENCH_PREFIX).order_by('id').values_list('id', flat=True))
+        return ids
+
+    def relations_per_user(self, user_count):
+        weights = [1 / (rank ** 0.8) for rank in range(1, user_count + 1)]
+        total = sum(weights)
+        return [round(self.relations * weight / total) for weight in weights]
+
+    def iter_relations(self, user_ids, book_ids):
+        book_weights = zipf_weights(len(book_ids))
+        rates, rate_weights = zip(*RATE_WEIGHTS)
+        rate_weights = list(accumulate(rate_weights))
+        for user_id, count in zip(user_ids, self.relations_per_user(len(user_ids))):
+            count = min(count, len(book_ids))
+            seen = set()
+            # Zipf sampling repeats popular books; draw a bounded number of
+            # times rather than insisting on exactly `count` distinct books.
+            for position in self.random.choices(range(len(book_ids)), cum_weights=book_weights, k=count * 2):
+                if len(seen) >= count:
+                    break
+                if position in seen:
+                    continue
+                seen.add(position)
+                yield UserBookRelation(
+                    user_id=user_id, book_id=book_ids[position],
+                    like=self.random.random() < 0.3,
+                    in_bookmarks=self.random.random() < 0.1,
+                    rate=self.random.choices(rates, cum_weights=rate_weights)[0],
+                )
+
+    def create_relations(self, user_ids, book_ids):
+        created = 0
+        if not user_ids or not book_ids:
+            return created
+        for batch in batched(self.iter_relations(user_ids, book_ids), self.batch_size):
+            # bulk_create skips UserBookRelation.save(); the book counters are
+            # recomputed once at the end by run().
+            with transaction.atomic():
+                UserBookRelation.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+            self.report('relations', created, self.relations)
+        return created
+
+    @staticmethod
+    def clear():
+        deleted_books = Book.objects.filter(author_name__startswith=BENCH_PREFIX).delete()[0]
+        users = User.objects.filter(username__startswith=BENCH_PREFIX)
+        # Relations of generated users on real books are counted on those books.
+        touched = set(UserBookRelation.objects.filter(user__in=users).values_list('book_id', flat=True))
+        deleted_users = users.delete()[0]
+        for batch in batched(sorted(touched), 1000):
+            recount_books(batch)
+        return deleted_books, deleted_users
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def timed(func, iterations):
+    # The last result and the mean time of one call in milliseconds.
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = func()
+    return result, round((time.perf_counter() - started) / iterations * 1000, 3)
+
+
+def benchmark_formats(data, iterations=50):
+    # Size and encode time of one payload per wire format. The compressed
+    # variants add the compression time to the encode time.
+    renderers = {'json': JSONRenderer()}
+    if orjson is not None:
+        renderers['json-orjson'] = FastJSONRenderer()
+    if msgpack is not None:
+        renderers['msgpack'] = MessagePackRenderer()
+
+    results = {}
+    for name, renderer in renderers.items():
+        body, encode_ms = timed(lambda: renderer.render(data), iterations)
+        results[name] = {'bytes': len(body), 'encode_ms': encode_ms}
+        for coding, (compress, compress_sequence) in CODINGS.items():
+            compressed, compress_ms = timed(lambda: compress(body), iterations)
+            results[f'{name}+{coding}'] = {'bytes': len(compressed), 'encode_ms': round(encode_ms + compress_ms, 3)}
+    return results
+
+
+class BenchmarkRunner:
+    # Replays API requests through django.test.Client, i.e. the full
+    # middleware/URL/DRF stack without a network hop. Latencies come from an
+    # untraced pass; peak memory from a separate, shorter tracemalloc pass
+    # because tracing slows every allocation down.
+    def __init__(self, iterations=200, warmup=20, memory_iterations=20, use_cache=False, seed=0,
+                 host='localhost'):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.memory_iterations = memory_iterations
+        self.use_cache = use_cache
+        self.random = random.Random(seed)
+        # REMOTE_ADDR outside INTERNAL_IPS keeps the debug toolbar out of the
+        # measurements.
+        self.client = Client(HTTP_HOST=host, REMOTE_ADDR='192.0.2.1')
+
+    def run(self, scenarios=SCENARIOS):
+        book_ids = list(Book.objects.order_by('id').values_list('id', flat=True)[:10000])
+        if not book_ids:
+            raise ValueError('The catalogue is empty; run generate_dataset first.')
+        # relation_patch writes relations, so they go to a generated user
+        # rather than a real one.
+        user = User.objects.filter(username__startswith=BENCH_PREFIX).order_by('id').first()
+        if user is None:
+            user = User.objects.get_or_create(username=f'{BENCH_PREFIX}runner', defaults={'password': '!'})[0]
+        self.client.force_login(user)
+
+        prices = list(Book.objects.filter(id__in=book_ids[:100]).values_list('price', flat=True))
+        self.requests = {
+            'list': lambda: self.client.get(reverse('book-list'), {'page_size': 100}),
+            'retrieve': lambda: self.client.get(reverse('book-detail', args=(self.random.choice(book_ids),))),
+            'search': lambda: self.client.get(reverse('book-list'), {'search': self.random.choice(WORDS),
+                                                                       'page_size': 100}),
+            'filter': lambda: self.client.get(reverse('book-list'), {'price': self.random.choice(prices),
+                                                                       'page_size': 100}),
+            'relation_patch': lambda: self.client.patch(
+                reverse('user-book-relation-detail', args=(self.random.choice(book_ids),)),
+                json.dumps({'like': self.random.random() < 0.5, 'rate': self.random.randint(1, 5)}),
+                content_type='application/json'),
+        }
+
+        # The benchmark client is one user sending as fast as it can, which
+        # is exactly what throttling is there to stop.
+        cache_settings = {'STORE_THROTTLE_RATES': None}
+        if not self.use_cache:
+            cache_settings['STORE_RESPONSE_CACHE'] = None
+        with override_settings(**cache_settings):
+            results = {name: self.run_scenario(self.requests[name]) for name in scenarios}
+        return {'meta': self.meta(), 'scenarios': results}
+
+    def run_formats(self, page_size=100):
+        # Encodes a list page with readers, the largest payload we serve.
+        with override_settings(STORE_RESPONSE_CACHE=None, STORE_THROTTLE_RATES=None):
+            response = self.client.get(reverse('book-list'), {'page_size': page_size})
+        self.check(response)
+        return benchmark_formats(response.data, iterations=self.iterations)
+
+    def run_scenario(self, send):
+        for _ in range(self.warmup):
+            self.check(send())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.check(send())
+
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(self.iterations):
+            start = time.perf_counter()
+            self.check(send())
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        try:
+            for _ in range(self.memory_iterations):
+                self.check(send())
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'iterations': self.iterations,
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+            'p90_ms': round(percentile(latencies, 0.9) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'throughput_rps': round(self.iterations / elapsed, 1),
+            'peak_memory_bytes': peak,
+            'queries': len(queries),
+        }
+
+    def check(self, response):
+        if response.status_code >= 400:
+            raise ValueError(f'{response.request["REQUEST_METHOD"]} {response.request["PATH_INFO"]} '
+                             f'returned {response.status_code}.')
+
+    def meta(self):
+        return {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'books': Book.objects.count(),
+            'relations': UserBookRelation.objects.count(),
+            'response_cache': self.use_cache,
+        }
+
+
+def compare_results(current, baseline, tolerance=0.2):
+    # Returns a line per metric that got worse than baseline * (1 + tolerance);
+    # throughput is compared the other way round.
+    regressions = []
+    for name, metrics in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric in base and metrics[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f'{name}.{metric}: {metrics[metric]} > {base[metric]} (+{tolerance:.0%})')
+        if 'throughput_rps' in base and metrics['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f'{name}.throughput_rps: {metrics["throughput_rps"]} < '
+                               f'{base["throughput_rps"]} (-{tolerance:.0%})')
+    return regressions
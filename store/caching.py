@@ -0,0 +1,330 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+from .db_router import primary_reads
+
+
+class CacheMetrics:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'sets': self.sets,
+            'evictions': self.evictions,
+            'coalesced': self.coalesced,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class LocMemLRUBackend:
+    # Per-process store bounded by the total size of the pickled payloads.
+    # The catalogue version is per-process too, so only use it when every
+    # write goes through the same process (tests, single worker deployments).
+    def __init__(self, max_bytes=64 * 1024 * 1024, timeout=300):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.metrics = CacheMetrics()
+        self._data = OrderedDict()
+        self._size = 0
+        self._version = 1
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            payload, expires_at = item
+            if expires_at < time.monotonic():
+                self._delete(key)
+                return None
+            self._data.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            self._delete(key)
+            self._data[key] = (payload, time.monotonic() + self.timeout)
+            self._size += len(payload)
+            while self._size > self.max_bytes:
+                self._delete(next(iter(self._data)))
+                self.metrics.evictions += 1
+
+    def _delete(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._size -= len(item[0])
+
+    def get_version(self):
+        return self._version
+
+    def bump_version(self):
+        with self._lock:
+            self._version += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+
+class SharedBackend:
+    # Stores payloads and the catalogue version in a Django cache (e.g. Redis
+    # or Memcached) so that every worker sees the same version.
+    def __init__(self, alias='default', timeout=300, key_prefix='store:response'):
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self.version_key = f'{key_prefix}:version'
+        self.metrics = CacheMetrics()
+
+    def get(self, key):
+        return self.cache.get(f'{self.key_prefix}:{key}')
+
+    def set(self, key, payload):
+        self.cache.set(f'{self.key_prefix}:{key}', payload, self.timeout)
+
+    def get_version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, 1, None)
+            version = self.cache.get(self.version_key, 1)
+        return version
+
+    def bump_version(self):
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.add(self.version_key, 2, None)
+
+    def clear(self):
+        self.bump_version()
+
+    # The lock that lets one worker compute a missing response while the
+    # others poll for it. cache.add is atomic on Redis, Memcached and the
+    # database cache (where the cache table doubles as the lock table); the
+    # timeout frees the key if its holder dies.
+    def lock(self, key, timeout):
+        return self.cache.add(f'{self.key_prefix}:{key}:lock', 1, timeout)
+
+    def unlock(self, key):
+        self.cache.delete(f'{self.key_prefix}:{key}:lock')
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _backend
+    config = getattr(settings, 'STORE_RESPONSE_CACHE', None)
+    if not config:
+        return None
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_class = import_string(config.get('BACKEND', 'store.caching.LocMemLRUBackend'))
+                _backend = backend_class(timeout=config.get('TIMEOUT', 300), **config.get('OPTIONS', {}))
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_response_cache(setting, **kwargs):
+    global _backend
+    if setting == 'STORE_RESPONSE_CACHE':
+        _backend = None
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload = None
+
+
+class SingleFlight:
+    # Concurrent misses for the same key in this process wait for the first
+    # one instead of running the same queries again.
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        # Returns the flight for `key` and whether the caller leads it.
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def land(self, key, flight, payload):
+        flight.payload = payload
+        with self._lock:
+            self._flights.pop(key, None)
+        flight.done.set()
+
+
+single_flight = SingleFlight()
+
+
+def bump_catalogue_version():
+    backend = get_response_cache()
+    if backend is None:
+        return
+    # Bump now for the writer's own subsequent reads, and again on commit so
+    # a response computed from pre-commit data by a concurrent reader cannot
+    # stay cached under the new version.
+    backend.bump_version()
+    transaction.on_commit(backend.bump_version)
+
+
+class CachedResponseMixin:
+    # On a miss, identical requests arriving while the response is computed
+    # wait up to STORE_SINGLE_FLIGHT_WAIT seconds for it instead of running
+    # the queries themselves: in this process always, across processes when
+    # the backend has a shared lock (SharedBackend). A waiter that times out
+    # or whose leader failed looks in the cache once more and only then
+    # computes the response on its own. The shared lock outlives the wait
+    # (single_flight_lock_timeout), so a slow leader keeps it and requests
+    # arriving meanwhile wait rather than start another computation.
+    #
+    # Cached responses are computed from the primary: a lagging replica
+    # would otherwise store pre-write data under the version the write just
+    # bumped, and serve it to everyone, the writer included, for the TTL.
+    cached_actions = ('list', 'retrieve')
+    single_flight_poll = 0.05
+    single_flight_lock_timeout = 60
+
+    def get_response_cache_key(self, request, version):
+        params = sorted((key, request.query_params.getlist(key)) for key in request.query_params)
+        raw = repr((self.basename, self.action, sorted(self.kwargs.items()), params,
+                    request.accepted_media_type))
+        return f'{self.basename}:{version}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        backend = get_response_cache()
+        if backend is None or self.action not in self.cached_actions:
+            return handler(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request, backend.get_version())
+        payload = backend.get(key)
+        if payload is not None:
+            backend.metrics.hits += 1
+            return self.payload_response(payload, 'HIT')
+
+        backend.metrics.misses += 1
+        wait = getattr(settings, 'STORE_SINGLE_FLIGHT_WAIT', 0)
+        if not wait:
+            return self.compute_response(backend, key, handler, request, *args, **kwargs)[0]
+
+        flight, leader = single_flight.join(key)
+        if not leader:
+            flight.done.wait(wait)
+            payload = flight.payload or backend.get(key)
+            if payload is not None:
+                return self.coalesced_response(backend, payload)
+            return self.compute_response(backend, key, handler, request, *args, **kwargs)[0]
+
+        payload = None
+        try:
+            response, payload = self.lead_flight(backend, key, wait, handler, request, *args, **kwargs)
+            return response
+        finally:
+            single_flight.land(key, flight, payload)
+
+    def lead_flight(self, backend, key, wait, handler, request, *args, **kwargs):
+        if not hasattr(backend, 'lock'):
+            return self.compute_response(backend, key, handler, request, *args, **kwargs)
+        if backend.lock(key, self.get_single_flight_lock_timeout(wait)):
+            try:
+                return self.compute_response(backend, key, handler, request, *args, **kwargs)
+            finally:
+                backend.unlock(key)
+        # Another process holds the lock.
+        payload = self.wait_for_payload(backend, key, wait)
+        if payload is not None:
+            return self.coalesced_response(backend, payload), payload
+        return self.compute_response(backend, key, handler, request, *args, **kwargs)
+
+    def compute_response(self, backend, key, handler, request, *args, **kwargs):
+        payload = None
+        with primary_reads('cache_fill'):
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                payload, response.validators = self.make_payload(request, response)
+        if payload is not None:
+            backend.set(key, payload)
+            backend.metrics.sets += 1
+        response['X-Cache'] = 'MISS'
+        return response, payload
+
+    def get_single_flight_lock_timeout(self, wait):
+        return max(self.single_flight_lock_timeout, 2 * wait)
+
+    def wait_for_payload(self, backend, key, wait):
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(min(self.single_flight_poll, max(deadline - time.monotonic(), 0)))
+            payload = backend.get(key)
+            if payload is not None:
+                return payload
+        return None
+
+    def coalesced_response(self, backend, payload):
+        backend.metrics.coalesced += 1
+        return self.payload_response(payload, 'COALESCED')
+
+    def get_response_validators(self, request, response, payload=None):
+        # Overridden by ConditionalGetMixin; whatever it returns is cached
+        # with the data so hits can be validated without a query.
+        return None
+
+    def make_payload(self, request, response):
+        data = pickle.dumps(response.data, pickle.HIGHEST_PROTOCOL)
+        validators = self.get_response_validators(request, response, data)
+        return dump_payload(data, validators), validators
+
+    def payload_response(self, payload, cache_status):
+        data, validators = load_payload(payload)
+        response = Response(data)
+        response.validators = validators
+        response['X-Cache'] = cache_status
+        return response
+
+
+# A payload is the pickled response data, pickled again together with its
+# validators, so the ETag can be taken from the pickled data alone.
+def dump_payload(data, validators):
+    return pickle.dumps((data, validators), pickle.HIGHEST_PROTOCOL)
+
+
+def load_payload(payload):
+    data, validators = pickle.loads(payload)
+    return pickle.loads(data), validators
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Response compression, a drop-in for django.middleware.gzip.GZipMiddleware
+# that also speaks zstd (when the optional zstandard package from
+# requirements-optional.txt is installed) and only compresses bodies of at
+# least STORE_COMPRESSION_MIN_SIZE bytes.
+# Streaming responses (e.g. /book/export/) are compressed chunk by chunk.
+
+
+def zstd_compress(data, level=3):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def zstd_compress_sequence(sequence, level=3):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    for item in sequence:
+        # Flush every chunk so a slow stream still reaches the client.
+        data = compressor.compress(item) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+CODINGS = {
+    'gzip': (compress_string, compress_sequence),
+}
+if zstandard is not None:
+    CODINGS['zstd'] = (zstd_compress, zstd_compress_sequence)
+
+# Best first.
+PREFERENCE = ('zstd', 'gzip')
+
+
+def accepted_codings(header):
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def choose_coding(header):
+    accepted = accepted_codings(header)
+    candidates = [coding for coding in PREFERENCE if coding in CODINGS and accepted.get(coding, 0) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda coding: accepted[coding])
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        min_size = getattr(settings, 'STORE_COMPRESSION_MIN_SIZE', 1024)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = choose_coding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        compress, compress_stream = CODINGS[coding]
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # A strong ETag must not survive a change of encoding (RFC 7232 2.1).
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = coding
+        return response
@@ -0,0 +1,196 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger('store.db_router')
+
+STICKY_COOKIE = 'store_primary_until'
+
+
+class RoutingState:
+    def __init__(self, sticky=False):
+        # Pinned to the primary because this client wrote recently.
+        self.sticky = sticky
+        self.use_replicas = False
+        self.wrote = False
+        # Set while reads must see the primary, with the reason for metrics.
+        self.primary_reason = None
+
+
+routing_state = ContextVar('store_routing_state', default=None)
+
+
+@contextmanager
+def primary_reads(reason='primary'):
+    # Reads inside the block go to the primary even in a replica-read
+    # request, e.g. to compute a response that is cached and then served to
+    # every client, including one that just wrote.
+    state = routing_state.get()
+    if state is None:
+        yield
+        return
+    previous, state.primary_reason = state.primary_reason, reason
+    try:
+        yield
+    finally:
+        state.primary_reason = previous
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, alias, reason):
+        with self.lock:
+            self.counts[(alias, reason)] += 1
+        logger.debug('read routed to %s (%s)', alias, reason)
+
+    def as_dict(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+route_metrics = RouteMetrics()
+
+
+class ReplicaHealth:
+    # A replica is used only if it answered a connection check within the
+    # last STORE_REPLICA_HEALTH_INTERVAL seconds; a failing one is retried
+    # after the same interval.
+    def __init__(self):
+        self.checked = {}
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, 'STORE_REPLICA_HEALTH_INTERVAL', 5)
+        checked_at, healthy = self.checked.get(alias, (None, False))
+        now = time.monotonic()
+        if checked_at is None or now - checked_at >= interval:
+            healthy = self.check(alias)
+            self.checked[alias] = (now, healthy)
+        return healthy
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            healthy = connection.is_usable()
+        except DatabaseError:
+            healthy = False
+        if not healthy:
+            logger.warning('Replica %s failed its health check.', alias)
+            connection.close()
+        return healthy
+
+    def clear(self):
+        self.checked.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    # Reads go to a healthy replica from STORE_READ_REPLICAS only inside a
+    # safe request to a view marked `replica_reads = True`, and only if the
+    # client has not written within STORE_REPLICA_STICKY_SECONDS and the
+    # request itself has not written yet. Everything else uses the primary.
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if state is None or not state.use_replicas:
+            return None
+        if state.primary_reason is not None:
+            route_metrics.record(DEFAULT_DB_ALIAS, state.primary_reason)
+            return DEFAULT_DB_ALIAS
+        if state.sticky or state.wrote:
+            route_metrics.record(DEFAULT_DB_ALIAS, 'sticky')
+            return DEFAULT_DB_ALIAS
+
+        replicas = [alias for alias in getattr(settings, 'STORE_READ_REPLICAS', [])
+                    if replica_health.is_healthy(alias)]
+        if not replicas:
+            route_metrics.record(DEFAULT_DB_ALIAS, 'no_replica')
+            return DEFAULT_DB_ALIAS
+        alias = random.choice(replicas)
+        route_metrics.record(alias, 'replica')
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in getattr(settings, 'STORE_READ_REPLICAS', []):
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    # Holds the routing state of a request and gives the client a short-lived
+    # cookie after it writes, so its next reads see its own writes.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        state = self.get_state(request)
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        state = self.get_state(request)
+        token = routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.process_response(state, response)
+
+    def get_state(self, request):
+        try:
+            primary_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            primary_until = 0
+        return RoutingState(sticky=primary_until > time.time())
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = routing_state.get()
+        view = getattr(view_func, 'cls', view_func)
+        if state is not None and request.method in SAFE_METHODS and getattr(view, 'replica_reads', False):
+            state.use_replicas = True
+
+    def process_response(self, state, response):
+        sticky_seconds = getattr(settings, 'STORE_REPLICA_STICKY_SECONDS', 5)
+        if state.wrote and sticky_seconds and getattr(settings, 'STORE_READ_REPLICAS', []):
+            response.set_cookie(STICKY_COOKIE, str(time.time() + sticky_seconds), max_age=sticky_seconds,
+                                httponly=True, samesite='Lax')
+        return response
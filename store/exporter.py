@@ -0,0 +1,53 @@
+import csv
+import json
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('name', 'name'),
+    ('price', 'price'),
+    ('author_name', 'author_name'),
+    ('annotated_likes', 'likes_count'),
+    ('rating', 'rating'),
+    ('owner_name', 'owner__username'),
+)
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_rows(queryset, chunk_size=2000):
+    # values_list() + iterator() streams plain tuples through a server-side
+    # cursor instead of materializing model instances and prefetches.
+    names = [name for name, field in EXPORT_COLUMNS]
+    queryset = queryset.select_related(None).prefetch_related(None).values_list(
+        *[field for name, field in EXPORT_COLUMNS])
+    for row in queryset.iterator(chunk_size=chunk_size):
+        row = dict(zip(names, row))
+        row['price'] = str(row['price'])
+        row['rating'] = None if row['rating'] is None else str(row['rating'])
+        row['owner_name'] = row['owner_name'] or ''
+        yield row
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, field in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row.values()])
+
+
+def render_export(queryset, export_format, chunk_size=2000):
+    rows = export_rows(queryset, chunk_size=chunk_size)
+    return render_csv(rows) if export_format == 'csv' else render_ndjson(rows)
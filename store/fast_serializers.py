@@ -0,0 +1,177 @@
+import decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import router
+from django.http import Http404
+from rest_framework import fields
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .models import UserBookRelation
+from .library import own_relation_data
+from .readers_process import top_reader_rows
+from .serializers import BookOwnerSerializer, BooksSerializer
+
+
+def compile_converter(field):
+    # Precomputes what DRF's field.to_representation() works out on every
+    # call. Fields without a shortcut keep their own to_representation.
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if isinstance(field, fields.DecimalField) and coerce_to_string and not field.localize \
+            and field.decimal_places is not None:
+        quantum = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        rounding = field.rounding
+
+        def convert_decimal(value):
+            if not isinstance(value, decimal.Decimal):
+                value = decimal.Decimal(str(value).strip())
+            return '{:f}'.format(value.quantize(quantum, rounding=rounding, context=context))
+
+        return convert_decimal
+    if type(field) is fields.IntegerField:
+        return int
+    if type(field) is fields.CharField:
+        return str
+    return field.to_representation
+
+
+class FastBooksSerializer:
+    # Read-only stand-in for BooksSerializer over `.values()` rows. Output is
+    # identical to BooksSerializer's; test_fast_serializers guards that, and
+    # STORE_FAST_BOOK_SERIALIZER = False switches back to the DRF path.
+    serializer_class = BooksSerializer
+    method_fields = ('readers_count', 'readers')
+    _columns = None
+
+    def __init__(self, instance=None, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @classmethod
+    def columns(cls):
+        # (output name, values() key, converter, default) in field order.
+        if cls._columns is None:
+            columns = []
+            for name, field in cls.serializer_class().fields.items():
+                if name in cls.method_fields:
+                    continue
+                default = None if field.default is fields.empty else field.default
+                columns.append((name, field.source.replace('.', '__'), compile_converter(field), default))
+            cls._columns = columns
+        return cls._columns
+
+    @classmethod
+    def values_fields(cls, fieldset=None):
+        fields = [source for name, source, convert, default in cls.columns()
+                  if fieldset is None or fieldset.includes(name)]
+        if fieldset is not None and fieldset.expands('owner'):
+            fields += [f'owner__{name}' for name in BookOwnerSerializer.Meta.fields]
+        return fields
+
+    @property
+    def data(self):
+        return self.to_representation(self.instance)
+
+    def to_representation(self, instance):
+        rows = list(instance) if self.many else [instance]
+        fieldset = self.context.get('fieldset')
+        columns = self.columns()
+        if fieldset is not None:
+            columns = [column for column in columns if fieldset.includes(column[0])]
+        if fieldset is None or fieldset.includes(*self.method_fields):
+            readers = self.get_readers(rows)
+        else:
+            readers = None
+        data = [self.row_to_representation(row, columns, readers, fieldset) for row in rows]
+        return data if self.many else data[0]
+
+    def get_readers(self, rows):
+        readers = {row['id']: (0, []) for row in rows}
+        limit = self.serializer_class.readers_limit
+        using = router.db_for_read(UserBookRelation)
+        for book_id, total, user_id, first_name, last_name in top_reader_rows(set(readers), limit, using=using):
+            count, sample = readers[book_id]
+            if len(sample) < limit:
+                sample.append({'first_name': first_name, 'last_name': last_name})
+            readers[book_id] = (total, sample)
+        return readers
+
+    def row_to_representation(self, row, columns, readers, fieldset=None):
+        data = {}
+        for name, source, convert, default in columns:
+            value = row[source]
+            if value is None:
+                data[name] = default
+            else:
+                data[name] = convert(value)
+        if readers is not None:
+            readers_count, sample = readers[row['id']]
+            if fieldset is None or fieldset.includes('readers_count'):
+                data['readers_count'] = readers_count
+            if fieldset is None or fieldset.includes('readers'):
+                data['readers'] = sample
+        if fieldset is not None and fieldset.expands('owner'):
+            data['owner'] = None if row['owner_id'] is None else {
+                name: row[f'owner__{name}'] for name in BookOwnerSerializer.Meta.fields}
+        if 'own_like' in row:
+            data['own_relation'] = own_relation_data(row)
+        return data
+
+
+def fast_book_serializer_enabled():
+    return getattr(settings, 'STORE_FAST_BOOK_SERIALIZER', True)
+
+
+class FastBookReadMixin:
+    # list/retrieve read `.values()` rows and serialize them with
+    # FastBooksSerializer, skipping model and DRF field instantiation.
+    fast_serializer_class = FastBooksSerializer
+
+    def get_fieldset(self):
+        return None
+
+    def book_values(self, queryset):
+        extra = [name for name in queryset.query.annotations if name not in ('readers_count', 'top_readers')]
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            # Keyset pages read the ordering key of the last row.
+            extra += ['id', *(name.lstrip('-') for name in queryset.query.order_by
+                              if isinstance(name, str) and name != '?')]
+        fields = [*self.fast_serializer_class.values_fields(fieldset), 'owner_id', *extra]
+        return queryset.values(*dict.fromkeys(fields))
+
+    def list(self, request, *args, **kwargs):
+        if not fast_book_serializer_enabled():
+            return super().list(request, *args, **kwargs)
+
+        rows = self.book_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.get_fast_serializer(page, many=True).data)
+        return Response(self.get_fast_serializer(rows, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not fast_book_serializer_enabled():
+            return super().retrieve(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            row = self.book_values(queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})).get()
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        # Object permissions only look at the owner of the book.
+        self.check_object_permissions(request, queryset.model(id=row['id'], owner_id=row['owner_id']))
+        return Response(self.get_fast_serializer(row).data)
+
+    def get_fast_serializer(self, *args, **kwargs):
+        serializer = self.fast_serializer_class(*args, context=self.get_serializer_context(), **kwargs)
+        # Let InstrumentedViewMixin time it like any other serializer.
+        if hasattr(self, 'instrument_serializer'):
+            serializer = self.instrument_serializer(serializer)
+        return serializer
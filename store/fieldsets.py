@@ -0,0 +1,62 @@
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+class Fieldset:
+    # What a client asked for with ?fields=a,b and ?expand=c. `fields` is
+    # None when the output is not restricted; expanded relations are added
+    # on top of the selected fields.
+    def __init__(self, fields=None, expand=()):
+        self.fields = None if fields is None else frozenset(fields)
+        self.expand = frozenset(expand)
+
+    def includes(self, *names):
+        return self.fields is None or not self.fields.isdisjoint(names)
+
+    def expands(self, name):
+        return name in self.expand
+
+
+def split_param(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_fieldset(request, available, expandable):
+    params = request.query_params
+    if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+        return None
+
+    errors = {}
+    fields = split_param(params[FIELDS_PARAM]) if FIELDS_PARAM in params else None
+    unknown = [name for name in fields or () if name not in available]
+    if unknown:
+        errors[FIELDS_PARAM] = [f'Unknown field(s): {", ".join(unknown)}. Expected any of: {", ".join(available)}.']
+    expand = split_param(params.get(EXPAND_PARAM, ''))
+    unknown = [name for name in expand if name not in expandable]
+    if unknown:
+        errors[EXPAND_PARAM] = [f'Cannot expand: {", ".join(unknown)}. Expected any of: {", ".join(expandable)}.']
+    if errors:
+        raise ValidationError(errors)
+    return Fieldset(fields, expand)
+
+
+class SparseFieldsMixin:
+    # ?fields= and ?expand= on the read actions, passed to the serializers as
+    # context['fieldset'] (None when the client asked for everything).
+    sparse_actions = ('list', 'retrieve', 'leaderboard')
+
+    def get_fieldset(self):
+        if self.action not in self.sparse_actions:
+            return None
+        if not hasattr(self, '_fieldset'):
+            serializer_class = self.get_serializer_class()
+            self._fieldset = parse_fieldset(self.request, serializer_class.Meta.fields,
+                                            serializer_class.expandable_fields)
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
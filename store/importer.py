@@ -0,0 +1,165 @@
+import csv
+import json
+import time
+
+from django.utils import timezone
+
+from .caching import bump_catalogue_version
+from .models import Book
+from .permissions import WRITABLE_ANNOTATION, annotate_writable
+from .serializers import BooksSerializer
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+
+class ImportBookSerializer(BooksSerializer):
+    def validate(self, attrs):
+        # Rows matching an existing (name, author_name) update that book.
+        return attrs
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.started_at = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'updated': self.updated,
+            'rejected': self.rejected,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def guess_import_format(filename):
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def read_rows(stream, file_format):
+    if file_format == 'csv':
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            yield line, row
+    else:
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                yield line, json.loads(text)
+            except ValueError as e:
+                yield line, ValueError(str(e))
+
+
+class UnreadableFile(Exception):
+    # The input stopped being readable (bad encoding, broken CSV) after
+    # `report.processed` rows; the rows before it have been imported.
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+class BookImporter:
+    # Rows are upserted by (name, author_name), the unique key of Book, in
+    # chunks of `chunk_size`, so memory is bounded by one chunk whatever the
+    # size of the input. A later row for the same book in the same chunk is
+    # rejected; across chunks the later row wins.
+    def __init__(self, owner=None, chunk_size=1000, on_reject=None, progress=None):
+        self.owner = owner
+        self.chunk_size = chunk_size
+        self.on_reject = on_reject
+        self.progress = progress
+
+    def run(self, stream, file_format):
+        report = ImportReport()
+        chunk = {}
+        try:
+            for line, row in read_rows(stream, file_format):
+                report.processed += 1
+                data = self.validate(line, row, report)
+                if data is not None:
+                    key = (data['name'], data['author_name'])
+                    if key in chunk:
+                        self.reject(line, row, {'non_field_errors': [
+                            f'Line {chunk[key][0]} has the same name and author_name.']}, report)
+                    else:
+                        chunk[key] = (line, data)
+                if len(chunk) >= self.chunk_size:
+                    self.write_chunk(chunk, report)
+                    chunk = {}
+        except (UnicodeDecodeError, csv.Error) as e:
+            error = UnreadableFile(f'Cannot read the file after row {report.processed}: {e}', report)
+        else:
+            error = None
+        if chunk:
+            self.write_chunk(chunk, report)
+        report.elapsed = time.monotonic() - report.started_at
+        if error is not None:
+            raise error
+        return report
+
+    def validate(self, line, row, report):
+        if isinstance(row, Exception):
+            self.reject(line, None, {'non_field_errors': [str(row)]}, report)
+            return None
+        if not isinstance(row, dict):
+            self.reject(line, row, {'non_field_errors': ['Expected an object.']}, report)
+            return None
+
+        serializer = ImportBookSerializer(data=row)
+        if not serializer.is_valid():
+            self.reject(line, row, serializer.errors, report)
+            return None
+        return serializer.validated_data
+
+    def reject(self, line, row, errors, report):
+        report.rejected += 1
+        if self.on_reject is not None:
+            self.on_reject({'line': line, 'row': row, 'errors': errors})
+
+    def write_chunk(self, chunk, report):
+        names = {name for name, author_name in chunk}
+        authors = {author_name for name, author_name in chunk}
+        existing = Book.objects.filter(name__in=names, author_name__in=authors).only(
+            'id', 'name', 'author_name', 'owner_id')
+        if self.owner is not None:
+            existing = annotate_writable(existing, self.owner)
+
+        now = timezone.now()
+        to_update = []
+        for book in existing:
+            key = (book.name, book.author_name)
+            if key not in chunk:
+                continue
+            line, data = chunk.pop(key)
+            if not getattr(book, WRITABLE_ANNOTATION, True):
+                self.reject(line, {'name': book.name, 'author_name': book.author_name},
+                            {'non_field_errors': ['You do not own this book.']}, report)
+                continue
+            to_update.append(Book(owner=self.owner, updated_at=now, **data))
+
+        to_create = [Book(owner=self.owner, updated_at=now, **data) for line, data in chunk.values()]
+        # One upsert; a book created by someone else since the lookup above is
+        # updated rather than failing the whole chunk.
+        Book.objects.bulk_create(to_update + to_create, update_conflicts=True,
+                                 unique_fields=['name', 'author_name'], update_fields=['price', 'updated_at'])
+        bump_catalogue_version()
+
+        report.updated += len(to_update)
+        report.created += len(to_create)
+        report.elapsed = time.monotonic() - report.started_at
+        if self.progress is not None:
+            self.progress(report)
@@ -0,0 +1,275 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .db_router import route_metrics
+
+logger = logging.getLogger('store.instrumentation')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    metrics = {
+        'store_request_duration_seconds': DURATION_BUCKETS,
+        'store_db_queries': QUERY_BUCKETS,
+        'store_db_time_seconds': DURATION_BUCKETS,
+        'store_serializer_time_seconds': DURATION_BUCKETS,
+        'store_response_size_bytes': SIZE_BUCKETS,
+    }
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.metrics[name])
+            histogram.observe(value)
+
+    def get(self, name, labels):
+        return self.histograms.get((name, labels))
+
+    def render(self):
+        lines = []
+        with self.lock:
+            items = sorted(self.histograms.items())
+        current = None
+        for (name, labels), histogram in items:
+            if name != current:
+                lines.append(f'# TYPE {name} histogram')
+                current = name
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            for bound, total in histogram.cumulative():
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {total}')
+            lines.append(f'{name}_sum{{{label_text}}} {histogram.sum}')
+            lines.append(f'{name}_count{{{label_text}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+
+
+registry = MetricsRegistry()
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+
+current_stats = ContextVar('store_request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every connection when it is created. The stats travel in a
+    # context variable, so queries that async views run through
+    # sync_to_async() in another thread are counted against their request.
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, duration):
+        match = request.resolver_match
+        endpoint = match.view_name if match else 'unresolved'
+        labels = (('endpoint', endpoint), ('method', request.method))
+        size = None if response.streaming else len(response.content)
+
+        registry.observe('store_request_duration_seconds', labels, duration)
+        registry.observe('store_db_queries', labels, stats.queries)
+        registry.observe('store_db_time_seconds', labels, stats.db_time)
+        registry.observe('store_serializer_time_seconds', labels, stats.serializer_time)
+        if size is not None:
+            registry.observe('store_response_size_bytes', labels, size)
+
+        logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'db_queries': stats.queries,
+            'db_time_ms': round(stats.db_time * 1000, 2),
+            'serializer_time_ms': round(stats.serializer_time * 1000, 2),
+            'response_bytes': size,
+        }))
+
+
+class InstrumentedViewMixin:
+    # `query_budget` maps a viewset action to the number of queries the view
+    # itself may issue. Going over raises QueryBudgetExceeded when
+    # STORE_QUERY_BUDGET_RAISE is on (the test suite) and logs a warning
+    # otherwise.
+    query_budget = {}
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Authentication and permission checks are not the view's to budget.
+        stats = current_stats.get()
+        self.queries_at_start = stats.queries if stats else 0
+
+    @contextmanager
+    def unbudgeted(self):
+        # Queries run on behalf of earlier requests are not the view's either.
+        stats = current_stats.get()
+        queries = stats.queries if stats else 0
+        try:
+            yield
+        finally:
+            if stats:
+                self.queries_at_start = getattr(self, 'queries_at_start', 0) + stats.queries - queries
+
+    def get_serializer(self, *args, **kwargs):
+        return self.instrument_serializer(super().get_serializer(*args, **kwargs))
+
+    def instrument_serializer(self, serializer):
+        stats = current_stats.get()
+        if stats is None:
+            return serializer
+
+        to_representation = serializer.to_representation
+
+        def timed_to_representation(instance):
+            # Lazy querysets are evaluated inside to_representation; that time
+            # is already counted as DB time.
+            start, db_time = time.perf_counter(), stats.db_time
+            try:
+                return to_representation(instance)
+            finally:
+                stats.serializer_time += time.perf_counter() - start - (stats.db_time - db_time)
+
+        serializer.to_representation = timed_to_representation
+        return serializer
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        stats = current_stats.get()
+        budget = self.query_budget.get(getattr(self, 'action', None))
+        if stats is None or budget is None:
+            return response
+
+        queries = stats.queries - getattr(self, 'queries_at_start', 0)
+        if queries > budget:
+            message = f'{type(self).__name__}.{self.action} issued {queries} queries, budget is {budget}.'
+            if getattr(settings, 'STORE_QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+def metrics(request):
+    remote_addr = request.META.get('REMOTE_ADDR')
+    if remote_addr not in settings.INTERNAL_IPS and not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    from store.caching import get_response_cache
+    from store.throttling import throttle_metrics
+
+    body = registry.render()
+    backend = get_response_cache()
+    if backend is not None:
+        body += '# TYPE store_response_cache_total counter\n'
+        for name, value in backend.metrics.as_dict().items():
+            if name != 'hit_ratio':
+                body += f'store_response_cache_total{{result="{name}"}} {value}\n'
+
+    routes = route_metrics.as_dict()
+    if routes:
+        body += '# TYPE store_db_read_route_total counter\n'
+        for (alias, reason), count in sorted(routes.items()):
+            body += f'store_db_read_route_total{{alias="{alias}",reason="{reason}"}} {count}\n'
+
+    throttles = throttle_metrics()
+    if throttles:
+        body += '# TYPE store_throttle_requests_total counter\n'
+        for (scope, kind, result), count in sorted(throttles.items()):
+            body += f'store_throttle_requests_total{{scope="{scope}",kind="{kind}",result="{result}"}} {count}\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4')
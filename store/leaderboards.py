@@ -0,0 +1,21 @@
+from django.db.models import Q
+
+# Leaderboards rank books by the denormalized Book.rating and
+# Book.likes_count, which UserBookRelation updates incrementally on every
+# rate and like change (with STORE_RATING_MODE = 'deferred', ratings move
+# once process_rating_queue has run). The partial indexes on Book keep the
+# ranked books in order, so a page of K books is an index range scan of K
+# rows whatever the size of the catalogue.
+LEADERBOARDS = {
+    'top-rated': ('rating', Q(rating__isnull=False)),
+    'most-liked': ('likes_count', Q(likes_count__gt=0)),
+}
+
+
+def leaderboard_queryset(queryset, board, author=None):
+    field, condition = LEADERBOARDS[board]
+    queryset = queryset.filter(condition)
+    if author is not None:
+        queryset = queryset.filter(author_name=author)
+    # Both keys descending, so the indexes are read backwards without a sort.
+    return queryset.order_by(f'-{field}', '-id')
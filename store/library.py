@@ -0,0 +1,39 @@
+from django.db.models import F, FilteredRelation, Q
+from rest_framework.filters import BaseFilterBackend
+
+# Shelves of /me/library/<shelf>/, newest relation first. Each one is backed
+# by a partial (user, id) index on UserBookRelation.
+SHELVES = {
+    'bookmarks': Q(in_bookmarks=True),
+    'likes': Q(like=True),
+    'rated': Q(rate__isnull=False),
+}
+
+OWN_RELATION_PARAM = 'own_relation'
+OWN_RELATION_FIELDS = ('like', 'in_bookmarks', 'rate')
+
+
+def own_relation_requested(request):
+    # Anonymous callers have no relations, the flag is ignored for them.
+    return request.query_params.get(OWN_RELATION_PARAM, '').lower() in ('1', 'true', 'yes') and \
+        request.user.is_authenticated
+
+
+def own_relation_data(values):
+    # `values` maps own_<field> to the LEFT JOINed relation columns; no
+    # relation row means every column is NULL.
+    if values.get('own_like') is None:
+        return None
+    return {field: values[f'own_{field}'] for field in OWN_RELATION_FIELDS}
+
+
+class OwnRelationFilter(BaseFilterBackend):
+    # ?own_relation=true adds the caller's like/in_bookmarks/rate to every
+    # book through a LEFT JOIN restricted to their relation, so the list
+    # stays a single query.
+    def filter_queryset(self, request, queryset, view):
+        if not own_relation_requested(request):
+            return queryset
+        return queryset.annotate(own=FilteredRelation('userbookrelation', condition=Q(
+            userbookrelation__user=request.user))).annotate(
+            **{f'own_{field}': F(f'own__{field}') for field in OWN_RELATION_FIELDS})
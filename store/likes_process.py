@@ -0,0 +1,38 @@
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .caching import bump_catalogue_version
+from .models import Book, UserBookRelation
+
+
+def likes_delta(old_like, new_like):
+    delta = bool(new_like) - bool(old_like)
+    if not delta:
+        return {}
+    return {'likes_count': F('likes_count') + delta}
+
+
+def set_likes(book):
+    book.likes_count = UserBookRelation.objects.filter(book=book, like=True).count()
+    Book.objects.filter(pk=book.pk).update(likes_count=book.likes_count, updated_at=timezone.now())
+    bump_catalogue_version()
+
+
+def find_likes_drift(batch_size=1000):
+    drift = []
+    books = Book.objects.order_by('id').annotate(
+        actual_likes=Count('userbookrelation', filter=Q(userbookrelation__like=True)))
+    last_id = 0
+    while True:
+        batch = list(books.filter(id__gt=last_id).values_list('id', 'likes_count', 'actual_likes')[:batch_size])
+        if not batch:
+            return drift
+        last_id = batch[-1][0]
+        drift += [row for row in batch if row[1] != row[2]]
+
+
+def fix_likes_drift(drift):
+    now = timezone.now()
+    books = [Book(id=book_id, likes_count=actual, updated_at=now) for book_id, stored, actual in drift]
+    Book.objects.bulk_update(books, ['likes_count', 'updated_at'])
+    bump_catalogue_version()
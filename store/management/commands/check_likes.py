@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.likes_process import find_likes_drift, fix_likes_drift
+
+
+class Command(BaseCommand):
+    help = 'Compare Book.likes_count against the live like aggregate.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Overwrite drifted counters with the live value.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drift = find_likes_drift(batch_size=options['batch_size'])
+        for book_id, stored, actual in drift:
+            self.stdout.write(f'Book {book_id}: likes_count={stored}, actual={actual}')
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('likes_count is consistent.'))
+        elif options['fix']:
+            fix_likes_drift(drift)
+            self.stdout.write(self.style.SUCCESS(f'Fixed likes_count of {len(drift)} book(s).'))
+        else:
+            raise CommandError(f'{len(drift)} book(s) have a drifted likes_count.')
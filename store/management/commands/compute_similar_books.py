@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import recommendations
+from store.recommendations import SimilarityJob
+
+
+class Command(BaseCommand):
+    help = 'Compute the "readers also liked" neighbours of every book (needs numpy and scipy).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='Neighbours kept per book.')
+        parser.add_argument('--min-support', type=int, default=2,
+                            help='Readers two books must share to count as similar.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Books per worker task.')
+        parser.add_argument('--processes', type=int, default=None, help='Defaults to the number of CPUs.')
+        parser.add_argument('--batch-size', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        if recommendations.sparse is None:
+            raise CommandError('compute_similar_books requires numpy and scipy.')
+        if min(options['limit'], options['min_support'], options['chunk_size'], options['batch_size']) < 1:
+            raise CommandError('Sizes must be positive.')
+
+        def progress(stage, done, total):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{stage}: {done}/{total}')
+
+        job = SimilarityJob(limit=options['limit'], min_support=options['min_support'],
+                            chunk_size=options['chunk_size'], processes=options['processes'],
+                            batch_size=options['batch_size'], progress=progress)
+        result = job.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {result["neighbours"]} neighbour(s) for {result["books"]} book(s).'))
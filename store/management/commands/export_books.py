@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpRequest, QueryDict
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from store.exporter import EXPORT_FORMATS, render_export
+from store.views import BookViewSet
+
+
+class Command(BaseCommand):
+    help = 'Stream the book catalogue as NDJSON or CSV, honouring the /book/ filter, search and ordering params.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson', dest='export_format')
+        parser.add_argument('--output', help='Output file, stdout by default.')
+        parser.add_argument('--param', action='append', default=[], metavar='KEY=VALUE',
+                            help='Query parameter as accepted by /book/, e.g. --param search=Aitmatov.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        params = QueryDict(mutable=True)
+        for param in options['param']:
+            key, sep, value = param.partition('=')
+            if not sep:
+                raise CommandError(f'Expected KEY=VALUE, got "{param}".')
+            params.appendlist(key, value)
+
+        try:
+            queryset = self.get_queryset(params)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+
+        chunks = render_export(queryset, options['export_format'], chunk_size=options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(chunks)
+
+    def get_queryset(self, params):
+        http_request = HttpRequest()
+        http_request.method = 'GET'
+        http_request.GET = params
+        view = BookViewSet(request=Request(http_request), action='list', format_kwarg=None, kwargs={})
+        return view.filter_queryset(view.get_queryset())
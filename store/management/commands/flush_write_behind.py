@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.write_behind import LocalBuffer, get_write_buffer
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered like/bookmark toggles (STORE_WRITE_BEHIND) to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=float, default=None, metavar='SECONDS',
+                            help='Keep flushing every SECONDS instead of once.')
+
+    def handle(self, *args, **options):
+        buffer = get_write_buffer()
+        if buffer is None:
+            raise CommandError('STORE_WRITE_BEHIND is not enabled.')
+        if isinstance(buffer, LocalBuffer):
+            raise CommandError('LocalBuffer lives in the memory of each web process and can only be flushed '
+                               'there; use SharedBuffer to flush from a separate process.')
+
+        while True:
+            flushed = buffer.flush()
+            while flushed:
+                self.stdout.write(f'Flushed {flushed} relation(s).')
+                flushed = buffer.flush()
+            if options['loop'] is None:
+                return
+            time.sleep(options['loop'])
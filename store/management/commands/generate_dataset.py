@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.benchmarks import DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic catalogue (bench_* users and authors) for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--relations', type=int, default=100000)
+        parser.add_argument('--authors', type=int, default=None, help='Defaults to one author per 20 books.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Delete a previously generated dataset first.')
+
+    def handle(self, *args, **options):
+        if min(options['books'], options['users'], options['relations'], options['batch_size']) < 0:
+            raise CommandError('Sizes must not be negative.')
+
+        if options['clear']:
+            books, users = DatasetGenerator.clear()
+            self.stdout.write(f'Deleted {books} book(s) and {users} user(s).')
+
+        def progress(stage, done, total):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{stage}: {done}/{total}')
+
+        generator = DatasetGenerator(books=options['books'], users=options['users'],
+                                     relations=options['relations'], authors=options['authors'],
+                                     seed=options['seed'], batch_size=options['batch_size'], progress=progress)
+        created = generator.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created["users"]} user(s), {created["books"]} book(s) and '
+            f'{created["relations"]} relation(s).'))
@@ -0,0 +1,52 @@
+import json
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from store.importer import IMPORT_FORMATS, BookImporter, UnreadableFile, guess_import_format
+
+
+class Command(BaseCommand):
+    help = 'Stream books from a CSV or NDJSON file into the catalogue, upserting by (name, author_name).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, or - for stdin.')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, dest='file_format')
+        parser.add_argument('--owner', help='Username that owns the created books.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--rejected', help='Write rejected rows as NDJSON to this file.')
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or guess_import_format(options['path'])
+        if file_format is None:
+            raise CommandError('Cannot guess the input format, pass --format.')
+
+        owner = None
+        if options['owner']:
+            try:
+                owner = User.objects.get(username=options['owner'])
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["owner"]}" does not exist.')
+
+        rejected = open(options['rejected'], 'w') if options['rejected'] else None
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        try:
+            on_reject = (lambda record: rejected.write(json.dumps(record) + '\n')) if rejected else None
+            importer = BookImporter(owner=owner, chunk_size=options['chunk_size'], on_reject=on_reject,
+                                    progress=self.report_progress)
+            report = importer.run(stream, file_format)
+        except UnreadableFile as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejected is not None:
+                rejected.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {processed} rows: {created} created, {updated} updated, {rejected} rejected '
+            'in {elapsed}s ({rows_per_second} rows/s).'.format(**report.as_dict())))
+
+    def report_progress(self, report):
+        self.stderr.write('{processed} rows processed ({rows_per_second} rows/s)'.format(**report.as_dict()))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.rating_process import process_rating_queue
+
+
+class Command(BaseCommand):
+    help = 'Recompute the ratings of books queued in deferred rating mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', type=float, default=None, metavar='SECONDS',
+                            help='Keep polling the queue every SECONDS once it is drained.')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            batch = process_rating_queue(batch_size=options['batch_size'])
+            while batch:
+                processed += batch
+                batch = process_rating_queue(batch_size=options['batch_size'])
+            if processed or options['verbosity'] > 1:
+                self.stdout.write(self.style.SUCCESS(f'Recomputed the rating of {processed} book(s).'))
+            if options['loop'] is None:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.rating_process import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the rating_sum/rating_count counters of every book from its relations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = rebuild_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Fixed rating counters of {fixed} book(s).'))
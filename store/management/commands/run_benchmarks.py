@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.benchmarks import SCENARIOS, BenchmarkRunner, compare_results
+
+
+class Command(BaseCommand):
+    help = 'Measure API latency percentiles, throughput and peak memory against the current database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios',
+                            help='Repeat to run several; defaults to all.')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--memory-iterations', type=int, default=20)
+        parser.add_argument('--use-cache', action='store_true', help='Keep the response cache enabled.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--formats', action='store_true',
+                            help='Also measure payload size and encode time per wire format.')
+        parser.add_argument('--output', help='Write the JSON results to this file.')
+        parser.add_argument('--baseline', help='Compare against the JSON results in this file.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative slowdown before a metric counts as a regression.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+
+        runner = BenchmarkRunner(iterations=options['iterations'], warmup=options['warmup'],
+                                 memory_iterations=options['memory_iterations'], use_cache=options['use_cache'],
+                                 seed=options['seed'], host=options['host'])
+        try:
+            results = runner.run(options['scenarios'] or SCENARIOS)
+            if options['formats']:
+                results['formats'] = runner.run_formats()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare_results(results, baseline, tolerance=options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
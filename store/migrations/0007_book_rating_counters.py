@@ -0,0 +1,35 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:08
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_rating_counters(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    UserBookRelation = apps.get_model('store', 'UserBookRelation')
+    totals = UserBookRelation.objects.filter(rate__isnull=False).values('book_id').annotate(
+        rating_sum=Sum('rate'), rating_count=Count('rate')).order_by()
+    for row in totals.iterator():
+        Book.objects.filter(pk=row['book_id']).update(
+            rating_sum=row['rating_sum'], rating_count=row['rating_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_book_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_counters, migrations.RunPython.noop),
+    ]
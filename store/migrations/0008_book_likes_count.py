@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:09
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_likes_count(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    UserBookRelation = apps.get_model('store', 'UserBookRelation')
+    totals = UserBookRelation.objects.filter(like=True).values('book_id').annotate(
+        likes_count=Count('id')).order_by()
+    for row in totals.iterator():
+        Book.objects.filter(pk=row['book_id']).update(likes_count=row['likes_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_book_rating_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_likes_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:12
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+FORWARD_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION store_book_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.author_name, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER store_book_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, author_name ON store_book
+    FOR EACH ROW EXECUTE FUNCTION store_book_search_vector_update()
+    """,
+    "UPDATE store_book SET name = name",
+    "CREATE INDEX store_book_search_vector_gin ON store_book USING gin (search_vector)",
+    "CREATE INDEX store_book_name_trgm ON store_book USING gin (name gin_trgm_ops)",
+    "CREATE INDEX store_book_author_name_trgm ON store_book USING gin (author_name gin_trgm_ops)",
+]
+
+BACKWARD_SQL = [
+    "DROP INDEX IF EXISTS store_book_author_name_trgm",
+    "DROP INDEX IF EXISTS store_book_name_trgm",
+    "DROP INDEX IF EXISTS store_book_search_vector_gin",
+    "DROP TRIGGER IF EXISTS store_book_search_vector_trigger ON store_book",
+    "DROP FUNCTION IF EXISTS store_book_search_vector_update()",
+]
+
+
+def run_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_book_updated_at'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_postgresql(FORWARD_SQL), run_postgresql(BACKWARD_SQL)),
+    ]
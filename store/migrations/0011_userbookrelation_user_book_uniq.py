@@ -0,0 +1,50 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:17
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Q, Sum
+
+
+def remove_duplicate_relations(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    UserBookRelation = apps.get_model('store', 'UserBookRelation')
+    duplicates = UserBookRelation.objects.values('user_id', 'book_id').annotate(
+        relations=Count('id'), keep_id=Min('id')).filter(relations__gt=1).order_by()
+    book_ids = set()
+    for row in duplicates.iterator():
+        UserBookRelation.objects.filter(user_id=row['user_id'], book_id=row['book_id']).exclude(
+            id=row['keep_id']).delete()
+        book_ids.add(row['book_id'])
+
+    # 0007 and 0008 counted the duplicates, and these deletes fire no
+    # signals, so the counters of the affected books are recomputed from the
+    # relations that are left.
+    book_ids = sorted(book_ids)
+    for start in range(0, len(book_ids), 1000):
+        batch = book_ids[start:start + 1000]
+        totals = UserBookRelation.objects.filter(book_id__in=batch).values('book_id').annotate(
+            likes_count=Count('id', filter=Q(like=True)), rating_sum=Sum('rate'), rating_count=Count('rate')).order_by()
+        for row in totals:
+            rating_sum, rating_count = row['rating_sum'] or 0, row['rating_count']
+            # Rounded half up to two places, as store.rating_process does.
+            rating = None
+            if rating_count:
+                rating = Decimal((rating_sum * 200 + rating_count) // (rating_count * 2)).scaleb(-2)
+            Book.objects.filter(pk=row['book_id']).update(
+                likes_count=row['likes_count'], rating_sum=rating_sum, rating_count=rating_count, rating=rating)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_book_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_relations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userbookrelation',
+            constraint=models.UniqueConstraint(fields=('user', 'book'), name='store_userbookrelation_user_book_uniq'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_userbookrelation_user_book_uniq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingQueue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enqueued_at', models.DateTimeField(db_index=True)),
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.book')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_book_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('rating__isnull', False)), fields=['rating', 'id'], name='store_book_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('likes_count__gt', 0)), fields=['likes_count', 'id'], name='store_book_likes_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('rating__isnull', False)), fields=['author_name', 'rating', 'id'], name='store_book_author_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('likes_count__gt', 0)), fields=['author_name', 'likes_count', 'id'], name='store_book_author_likes_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_book_leaderboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(db_index=True)),
+                ('book', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.book')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='store.book')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='similarbook',
+            constraint=models.UniqueConstraint(fields=('book', 'rank'), name='store_similarbook_book_rank_uniq'),
+        ),
+    ]
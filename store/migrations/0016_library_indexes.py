@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_similar_book'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userbookrelation',
+            index=models.Index(condition=models.Q(('in_bookmarks', True)), fields=['user', 'id'], name='store_ubr_user_bookmarks_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbookrelation',
+            index=models.Index(condition=models.Q(('like', True)), fields=['user', 'id'], name='store_ubr_user_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbookrelation',
+            index=models.Index(condition=models.Q(('rate__isnull', False)), fields=['user', 'id'], name='store_ubr_user_rated_idx'),
+        ),
+    ]
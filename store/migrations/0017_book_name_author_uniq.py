@@ -0,0 +1,33 @@
+# Generated by Django 4.1.7 on 2026-10-18 21:04
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def rename_duplicate_books(apps, schema_editor):
+    # Books are not merged (their relations and counters would have to be);
+    # every duplicate but the oldest gets its id appended to the name.
+    Book = apps.get_model('store', 'Book')
+    duplicates = Book.objects.values('name', 'author_name').annotate(
+        books=Count('id'), keep_id=Min('id')).filter(books__gt=1).order_by()
+    for row in duplicates.iterator():
+        for book in Book.objects.filter(name=row['name'], author_name=row['author_name']).exclude(
+                id=row['keep_id']).only('id', 'name'):
+            suffix = f' (#{book.id})'
+            book.name = book.name[:255 - len(suffix)] + suffix
+            book.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_library_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_books, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(fields=('name', 'author_name'), name='store_book_name_author_uniq'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.7 on 2026-10-18 20:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_book_name_author_uniq'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ratingqueue',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.book'),
+        ),
+        migrations.AlterField(
+            model_name='ratingqueue',
+            name='enqueued_at',
+            field=models.DateTimeField(),
+        ),
+    ]
@@ -1,5 +1,35 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import bump_catalogue_version
+
+
+class BookQuerySet(models.QuerySet):
+    top_readers_limit = None
+
+    def with_top_readers(self, limit):
+        # Attaches `readers_count` and the first `limit` readers to every
+        # fetched book with one windowed query instead of prefetching them all.
+        clone = self._chain()
+        clone.top_readers_limit = limit
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.top_readers_limit = self.top_readers_limit
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and self.top_readers_limit is not None and self._iterable_class is models.query.ModelIterable:
+            from store.readers_process import attach_top_readers
+
+            attach_top_readers(self._result_cache, self.top_readers_limit, using=self.db)
 
 
 class Book(models.Model):
@@ -9,9 +39,50 @@ class Book(models.Model):
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='my_books')
     readers = models.ManyToManyField(User, through='UserBookRelation', related_name='fav_books')
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=None, null=True)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    likes_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Maintained by a database trigger on PostgreSQL, see migration 0010.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # The key the importer upserts by, see store/importer.py.
+            models.UniqueConstraint(fields=['name', 'author_name'], name='store_book_name_author_uniq'),
+        ]
+        indexes = [
+            # Keyset pages of BookViewSet ordered/filtered by price or author.
+            models.Index(fields=['price', 'id'], name='store_book_price_id_idx'),
+            models.Index(fields=['author_name', 'id'], name='store_book_author_name_id_idx'),
+            # Leaderboards, global and per author, see store/leaderboards.py.
+            models.Index(fields=['rating', 'id'], condition=models.Q(rating__isnull=False),
+                         name='store_book_rating_id_idx'),
+            models.Index(fields=['likes_count', 'id'], condition=models.Q(likes_count__gt=0),
+                         name='store_book_likes_id_idx'),
+            models.Index(fields=['author_name', 'rating', 'id'], condition=models.Q(rating__isnull=False),
+                         name='store_book_author_rating_idx'),
+            models.Index(fields=['author_name', 'likes_count', 'id'], condition=models.Q(likes_count__gt=0),
+                         name='store_book_author_likes_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_catalogue_version()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        bump_catalogue_version()
+        return result
+
+
+COUNTED_FIELDS = ('like', 'rate')
+
 
 class UserBookRelation(models.Model):
     RATE_CHOICES = (
@@ -27,17 +98,125 @@ class UserBookRelation(models.Model):
     in_bookmarks = models.BooleanField(default=False)
     rate = models.PositiveSmallIntegerField(choices=RATE_CHOICES, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], name='store_userbookrelation_user_book_uniq'),
+        ]
+        indexes = [
+            # Readers of a book in relation order (readers sample and endpoint).
+            models.Index(fields=['book', 'id'], name='store_ubr_book_id_idx'),
+            # Per-book like and rating aggregates only touch these rows.
+            models.Index(fields=['book'], condition=models.Q(like=True), name='store_ubr_book_liked_idx'),
+            models.Index(fields=['book', 'rate'], condition=models.Q(rate__isnull=False),
+                         name='store_ubr_book_rated_idx'),
+            # Shelves of /me/library/, see store/library.py.
+            models.Index(fields=['user', 'id'], condition=models.Q(in_bookmarks=True),
+                         name='store_ubr_user_bookmarks_idx'),
+            models.Index(fields=['user', 'id'], condition=models.Q(like=True), name='store_ubr_user_likes_idx'),
+            models.Index(fields=['user', 'id'], condition=models.Q(rate__isnull=False),
+                         name='store_ubr_user_rated_idx'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Stored values of the fields the book counters follow, kept in step
+        # by from_db(), refresh_from_db() and the save/delete receivers below.
+        self.stored = {}
+
     def __str__(self):
         return f'{self.user.username}: rated "{self.book.name}" as "{self.rate}"'
 
-    def save(self, *args, **kwargs):
-        from store.rating_process import set_rating
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        relation = super().from_db(db, field_names, values)
+        relation.remember_stored()
+        return relation
 
-        creating = not self.pk
-        old_rating = self.rate
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.remember_stored(fields)
 
-        super().save(*args, **kwargs)
+    def remember_stored(self, fields=None):
+        # Deferred fields are left out and read back when they are needed.
+        for field in COUNTED_FIELDS:
+            if (fields is None or field in fields) and field in self.__dict__:
+                self.stored[field] = self.__dict__[field]
+
+    def stored_values(self, using=None):
+        missing = [field for field in COUNTED_FIELDS if field not in self.stored]
+        if missing and self.pk is not None:
+            row = UserBookRelation.objects.using(using or self._state.db).filter(pk=self.pk).values(*missing).first()
+            self.stored.update(row or {})
+        return self.stored.get('like', False), self.stored.get('rate')
+
+    def update_book_counters(self, old_rating, new_rating, old_like, new_like, readers_changed=False):
+        from store.rating_process import enqueue_rating, rating_delta, rating_mode
+        from store.likes_process import likes_delta
+
+        changes = likes_delta(old_like, new_like)
+        if rating_mode() == 'deferred':
+            if old_rating != new_rating:
+                enqueue_rating(self.book_id)
+        else:
+            changes.update(rating_delta(old_rating, new_rating))
+        if changes or readers_changed:
+            Book.objects.filter(pk=self.book_id).update(updated_at=timezone.now(), **changes)
+        bump_catalogue_version()
+
+
+# The book counters follow relations through signals rather than save() and
+# delete(), so queryset deletes and cascades (a deleted user) are counted too.
+@receiver(pre_save, sender=UserBookRelation)
+def remember_relation_before_save(sender, instance, using, raw, **kwargs):
+    instance.saved_over = (False, None) if instance._state.adding else instance.stored_values(using)
+
+
+@receiver(post_save, sender=UserBookRelation)
+def count_saved_relation(sender, instance, created, raw, update_fields, **kwargs):
+    if raw:
+        return
+    old_like, old_rate = instance.saved_over
+    # Fields left out of update_fields keep their stored values.
+    instance.remember_stored(update_fields)
+    new_like, new_rate = instance.stored_values()
+    instance.update_book_counters(old_rate, new_rate, old_like, new_like, readers_changed=created)
+
+
+@receiver(pre_delete, sender=UserBookRelation)
+def remember_relation_before_delete(sender, instance, using, **kwargs):
+    # Deferred fields can no longer be read once the row is gone.
+    instance.stored_values(using)
+
+
+@receiver(post_delete, sender=UserBookRelation)
+def count_deleted_relation(sender, instance, using, origin=None, **kwargs):
+    if isinstance(origin, Book) or (isinstance(origin, models.QuerySet) and origin.model is Book):
+        # Cascading from the book itself, nothing left to count.
+        return
+    old_like, old_rate = instance.stored_values(using)
+    instance.update_book_counters(old_rate, None, old_like, False, readers_changed=True)
+
+
+class RatingQueue(models.Model):
+    # Books whose rating waits for `manage.py process_rating_queue`
+    # (STORE_RATING_MODE = 'deferred'). Every rate change appends a row, so
+    # raters of the same book never wait on each other's queue write; the
+    # rows of a book coalesce when a batch is drained.
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    enqueued_at = models.DateTimeField()
+
+
+class SimilarBook(models.Model):
+    # Top-N "readers also liked" neighbours of a book, written by
+    # `manage.py compute_similar_books`, see store/recommendations.py.
+    # The (book, rank) constraint below doubles as the lookup index.
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+', db_index=False)
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommended_for')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField(db_index=True)
 
-        new_rating = self.rate
-        if old_rating != new_rating or creating:
-            set_rating(self.book)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='store_similarbook_book_rank_uniq'),
+        ]
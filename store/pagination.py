@@ -0,0 +1,173 @@
+import base64
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Forward-only keyset pagination. The page boundary is the ordering key of
+    # the last row, so every page is a `WHERE (key, id) > (...) LIMIT n` query
+    # and page N costs the same as page 1. The response stays unpaginated
+    # unless the client asks for a page size or passes a cursor.
+    page_size = None
+    default_page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    tiebreak_field = 'id'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    def get_page_queryset(self, queryset, request):
+        # Split from paginate_queryset so async views can fetch the page
+        # themselves and hand the rows to set_page().
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = self.decode_cursor(request, queryset)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(cursor))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param in request.query_params:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        if self.cursor_query_param in request.query_params:
+            return self.page_size or self.default_page_size
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = []
+        for field in queryset.query.order_by:
+            if not isinstance(field, str) or field.lstrip('-') in ('?', 'pk'):
+                continue
+            ordering.append(field)
+            if field.lstrip('-') == self.tiebreak_field:
+                return ordering
+        ordering.append(self.tiebreak_field)
+        return ordering
+
+    def get_keyset_filter(self, values):
+        # (a, b, id) > (x, y, z) expanded into
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z),
+        # honouring the direction of each ordering field.
+        keyset = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            keyset |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        # Redundant bound on the leading key so the planner can use an
+        # index range scan instead of evaluating the OR on every row.
+        first = self.ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}) & keyset
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            ordering, values = payload['o'], payload['v']
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if ordering != self.ordering or not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # The values come from the client, so they are typed here rather
+        # than failing once the filter reaches the database.
+        try:
+            return [self.get_ordering_field(queryset, field.lstrip('-')).to_python(value)
+                    for field, value in zip(ordering, values)]
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_ordering_field(self, queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def encode_cursor(self, values):
+        payload = json.dumps({'o': self.ordering, 'v': values}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor([self.get_key_value(last, field.lstrip('-')) for field in self.ordering])
+
+    def get_key_value(self, item, name):
+        value = item[name] if isinstance(item, dict) else getattr(item, name)
+        if isinstance(value, Decimal):
+            return str(value)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
+
+
+class ReadersPagination(KeysetPagination):
+    page_size = 100
+
+
+class LeaderboardPagination(KeysetPagination):
+    page_size = 20
+    max_page_size = 100
+
+
+class LibraryPagination(KeysetPagination):
+    page_size = 50
+    max_page_size = 500
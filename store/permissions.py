@@ -1,10 +1,47 @@
+from django.db.models import Case, Q, Value, When
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .models import Book
+
+# Who may modify a book: its owner or staff. Everything here compares
+# Book.owner_id with the user's pk, so the owner row is never loaded.
+WRITABLE_ANNOTATION = 'user_can_write'
+
+
+def can_write_book(user, book):
+    return bool(user and user.is_authenticated and (user.is_staff or book.owner_id == user.pk))
+
+
+def writable_condition(user):
+    if not user or not user.is_authenticated:
+        return None
+    if user.is_staff:
+        return Q()
+    return Q(owner_id=user.pk)
+
+
+def annotate_writable(queryset, user):
+    # Adds `user_can_write` to every book, computed by the database in the
+    # query that loads them.
+    condition = writable_condition(user)
+    if condition is None or not condition:
+        return queryset.annotate(**{WRITABLE_ANNOTATION: Value(condition is not None)})
+    return queryset.annotate(**{WRITABLE_ANNOTATION: Case(When(condition, then=Value(True)), default=Value(False))})
+
+
+def writable_book_ids(user, book_ids):
+    # The subset of `book_ids` the user may modify, in one indexed query.
+    condition = writable_condition(user)
+    if condition is None:
+        return set()
+    return set(Book.objects.filter(condition, id__in=book_ids).values_list('id', flat=True))
+
 
 class IsOwnerOrStaffOrReadOnly(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return bool(
-            request.method in SAFE_METHODS or
-            request.user and
-            request.user.is_authenticated and (obj.owner == request.user or request.user.is_staff)
-        )
\ No newline at end of file
+        if request.method in SAFE_METHODS:
+            return True
+        writable = getattr(obj, WRITABLE_ANNOTATION, None)
+        if writable is not None and request.user and request.user.is_authenticated:
+            return bool(writable)
+        return can_write_book(request.user, obj)
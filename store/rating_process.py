@@ -1,9 +1,130 @@
-from django.db.models import Avg
+from decimal import Decimal
 
-from .models import UserBookRelation
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, FloatField, Sum
+from django.db.models.functions import Cast, NullIf
+from django.utils import timezone
+
+from .caching import bump_catalogue_version
+from .models import Book, RatingQueue, UserBookRelation
 
 
 def set_rating(book):
-    rating = UserBookRelation.objects.filter(book=book).aggregate(rating_of_book=Avg('rate')).get('rating_of_book')
-    book.rating = rating
-    book.save()
\ No newline at end of file
+    rating = UserBookRelation.objects.filter(book=book).aggregate(rating_sum=Sum('rate'), rating_count=Count('rate'))
+    book.rating_sum = rating.get('rating_sum') or 0
+    book.rating_count = rating.get('rating_count')
+    book.rating = compute_rating(book.rating_sum, book.rating_count)
+    Book.objects.filter(pk=book.pk).update(
+        rating=book.rating, rating_sum=book.rating_sum, rating_count=book.rating_count, updated_at=timezone.now())
+    bump_catalogue_version()
+
+
+def rating_delta(old_rate, new_rate):
+    sum_delta = (new_rate or 0) - (old_rate or 0)
+    count_delta = (new_rate is not None) - (old_rate is not None)
+    if not sum_delta and not count_delta:
+        return {}
+
+    rating_sum = F('rating_sum') + sum_delta
+    rating_count = F('rating_count') + count_delta
+    return {
+        'rating_sum': rating_sum,
+        'rating_count': rating_count,
+        'rating': rating_expression(rating_sum, rating_count),
+    }
+
+
+# The average rating is rounded half up to two places the same way in SQL and
+# in Python: in whole hundredths, with integer arithmetic, so neither float
+# nor SQLite's integer NUMERIC casts can tip a .xx5 average either way.
+def rating_expression(rating_sum, rating_count):
+    hundredths = (rating_sum * 200 + rating_count) / NullIf(rating_count * 2, 0)
+    return Cast(Cast(hundredths, FloatField()) / 100, DecimalField(max_digits=3, decimal_places=2))
+
+
+def update_rating(book_id, old_rate, new_rate):
+    changes = rating_delta(old_rate, new_rate)
+    if changes:
+        Book.objects.filter(pk=book_id).update(updated_at=timezone.now(), **changes)
+        bump_catalogue_version()
+
+
+def compute_rating(rating_sum, rating_count):
+    if not rating_count:
+        return None
+    return Decimal((rating_sum * 200 + rating_count) // (rating_count * 2)).scaleb(-2)
+
+
+def rating_totals(book_ids):
+    return {
+        row['book_id']: (row['rating_sum'], row['rating_count'])
+        for row in UserBookRelation.objects.filter(book_id__in=book_ids, rate__isnull=False)
+        .values('book_id').annotate(rating_sum=Sum('rate'), rating_count=Count('rate')).order_by()
+    }
+
+
+def rebuild_ratings(batch_size=1000):
+    fixed = 0
+    book_ids = Book.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while True:
+        batch = list(book_ids.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            if fixed:
+                bump_catalogue_version()
+            return fixed
+        last_id = batch[-1]
+
+        totals = rating_totals(batch)
+        drifted = []
+        for book in Book.objects.filter(id__in=batch).only('id', 'rating', 'rating_sum', 'rating_count'):
+            rating_sum, rating_count = totals.get(book.id, (0, 0))
+            rating = compute_rating(rating_sum, rating_count)
+            if (book.rating_sum, book.rating_count, book.rating) != (rating_sum, rating_count, rating):
+                book.rating_sum, book.rating_count, book.rating = rating_sum, rating_count, rating
+                book.updated_at = timezone.now()
+                drifted.append(book)
+        Book.objects.bulk_update(drifted, ['rating', 'rating_sum', 'rating_count', 'updated_at'])
+        fixed += len(drifted)
+
+
+def rating_mode():
+    return getattr(settings, 'STORE_RATING_MODE', 'inline')
+
+
+def enqueue_rating(book_id):
+    # A plain insert: no unique row per book that concurrent raters would
+    # have to queue up behind.
+    RatingQueue.objects.create(book_id=book_id, enqueued_at=timezone.now())
+
+
+def process_rating_queue(batch_size=1000):
+    # Recomputes the books of one batch of queue rows with a single grouped
+    # aggregate and returns how many books were recomputed. Claimed rows are
+    # locked (SKIP LOCKED where supported), so several workers can drain the
+    # queue side by side. Two workers can still claim rows of the same book,
+    # so the books are locked in id order before the aggregate and the later
+    # one recomputes from what the earlier one saw at the least.
+    with transaction.atomic():
+        claimed = list(RatingQueue.objects.select_for_update(skip_locked=True).order_by('id')
+                       .values_list('id', 'book_id')[:batch_size])
+        if not claimed:
+            return 0
+
+        book_ids = {book_id for _, book_id in claimed}
+        locked = list(Book.objects.select_for_update().filter(id__in=book_ids).order_by('id')
+                      .values_list('id', flat=True))
+        totals = rating_totals(locked)
+        now = timezone.now()
+        books = []
+        for book_id in locked:
+            rating_sum, rating_count = totals.get(book_id, (0, 0))
+            books.append(Book(id=book_id, rating=compute_rating(rating_sum, rating_count), rating_sum=rating_sum,
+                              rating_count=rating_count, updated_at=now))
+        Book.objects.bulk_update(books, ['rating', 'rating_sum', 'rating_count', 'updated_at'])
+
+        # Rows appended since the claim are left for the next batch.
+        RatingQueue.objects.filter(id__in=[row_id for row_id, _ in claimed]).delete()
+    bump_catalogue_version()
+    return len(book_ids)
@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from .models import UserBookRelation
+
+
+def top_reader_rows(book_ids, limit, using='default'):
+    # Yields (book_id, readers_total, user_id, first_name, last_name) for the
+    # first `limit` readers of every book, ordered by book and position.
+    if not book_ids:
+        return
+
+    sql, params = top_reader_sql(book_ids, limit, using)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        yield from cursor.fetchall()
+
+
+def top_reader_sql(book_ids, limit, using='default'):
+    relations = UserBookRelation.objects.using(using).filter(book_id__in=book_ids).annotate(
+        reader_position=Window(RowNumber(), partition_by=F('book_id'), order_by=F('id').asc()),
+        readers_total=Window(Count('id'), partition_by=F('book_id')),
+    ).values('book_id', 'user_id', 'reader_position', 'readers_total')
+    relations_sql, params = relations.query.sql_with_params()
+
+    qn = connections[using].ops.quote_name
+    # Django 4.1 cannot filter on window functions, so the ROW_NUMBER() cut
+    # happens in an outer query around the ORM-built one.
+    sql = (
+        f'SELECT r.book_id, r.readers_total, u.id, u.first_name, u.last_name '
+        f'FROM ({relations_sql}) r INNER JOIN {qn(User._meta.db_table)} u ON u.id = r.user_id '
+        f'WHERE r.reader_position <= %s ORDER BY r.book_id, r.reader_position'
+    )
+    return sql, (*params, max(limit, 1))
+
+
+def attach_top_readers(books, limit, using='default'):
+    books = [book for book in books if book is not None]
+    for book in books:
+        book.top_readers = []
+        book.readers_count = 0
+
+    by_id = {book.pk: book for book in books}
+    for book_id, total, *user in top_reader_rows(set(by_id), limit, using=using):
+        book = by_id[book_id]
+        book.readers_count = total
+        if len(book.top_readers) < limit:
+            book.top_readers.append(User.from_db(using, ['id', 'first_name', 'last_name'], user))
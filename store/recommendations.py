@@ -0,0 +1,164 @@
+import multiprocessing
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import bump_catalogue_version
+from .models import Book, SimilarBook, UserBookRelation
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+# "Readers also liked" recommendations (optional, needs numpy and scipy from
+# requirements-optional.txt).
+#
+# A relation is a positive signal when the user liked the book or rated it
+# POSITIVE_RATE or higher. With X the binary user x book matrix of those
+# signals, the similarity of books i and j is the cosine
+#     (X[:, i] . X[:, j]) / sqrt(|X[:, i]| * |X[:, j]|)
+# that is, the readers who liked both, normalised by how popular each book
+# is. Pairs sharing fewer than `min_support` readers are ignored.
+#
+# The signals are loaded once into a numpy array (16 bytes per positive
+# relation, read from the database in keyset batches of `batch_size`). Worker processes then
+# compute X[:, chunk].T @ X for `chunk_size` books at a time, so each worker
+# only holds one chunk of co-occurrence counts. The top `limit` neighbours
+# of a chunk replace the stored ones for those books in one transaction, so
+# readers never see a half-written list. Books that lost all their
+# neighbours are cleared at the end.
+
+POSITIVE_RATE = 4
+
+_worker = {}
+
+
+def load_signals(batch_size=100000):
+    # (user_id, book_id) of every positive relation, written batch by batch
+    # into one array sized by a COUNT rather than collected and concatenated.
+    relations = UserBookRelation.objects.filter(Q(like=True) | Q(rate__gte=POSITIVE_RATE)).order_by('id')
+    signals = np.empty((relations.count(), 2), dtype=np.int64)
+    size, last_id = 0, 0
+    while True:
+        batch = list(relations.filter(id__gt=last_id).values_list('id', 'user_id', 'book_id')[:batch_size])
+        if not batch:
+            return signals[:size]
+        last_id = batch[-1][0]
+        if size + len(batch) > len(signals):
+            # Relations added since the count.
+            grown = np.empty((size + len(batch), 2), dtype=np.int64)
+            grown[:size] = signals[:size]
+            signals = grown
+        signals[size:size + len(batch)] = np.array(batch, dtype=np.int64)[:, 1:]
+        size += len(batch)
+
+
+def build_matrix(signals):
+    # Returns the book ids of the matrix columns and X in both layouts: CSC
+    # for slicing a chunk of books, CSR for the right-hand side.
+    user_ids, users = np.unique(signals[:, 0], return_inverse=True)
+    book_ids, books = np.unique(signals[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix((np.ones(len(signals), dtype=np.float32), (users, books)),
+                               shape=(len(user_ids), len(book_ids)))
+    return book_ids, matrix.tocsc(), matrix
+
+
+def init_worker(columns, rows, limit, min_support):
+    norms = np.sqrt(np.asarray(columns.sum(axis=0), dtype=np.float64).ravel())
+    _worker.update(columns=columns, rows=rows, norms=norms, limit=limit, min_support=min_support)
+
+
+def similar_chunk(bounds):
+    # Top neighbours of books start..stop-1 (matrix column numbers) as a list
+    # of (book, neighbours, scores), best first.
+    start, stop = bounds
+    norms, limit = _worker['norms'], _worker['limit']
+    counts = (_worker['columns'][:, start:stop].T @ _worker['rows']).tocsr()
+
+    books = start + np.repeat(np.arange(stop - start), np.diff(counts.indptr))
+    scores = counts.data / (norms[books] * norms[counts.indices])
+    scores[(counts.indices == books) | (counts.data < _worker['min_support'])] = 0
+
+    result = []
+    for offset in range(stop - start):
+        begin, end = counts.indptr[offset], counts.indptr[offset + 1]
+        neighbours, book_scores = counts.indices[begin:end], scores[begin:end]
+        keep = book_scores > 0
+        neighbours, book_scores = neighbours[keep], book_scores[keep]
+        if len(neighbours) > limit:
+            top = np.argpartition(-book_scores, limit - 1)[:limit]
+            neighbours, book_scores = neighbours[top], book_scores[top]
+        # Ties go to the lower book id, column order follows the ids.
+        order = np.lexsort((neighbours, -book_scores))
+        result.append((start + offset, neighbours[order], book_scores[order]))
+    return start, stop, result
+
+
+class SimilarityJob:
+    def __init__(self, limit=20, min_support=2, chunk_size=2000, processes=None, batch_size=100000,
+                 progress=None):
+        self.limit = limit
+        self.min_support = min_support
+        self.chunk_size = chunk_size
+        self.processes = processes or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def run(self):
+        if sparse is None:
+            raise ImproperlyConfigured('Computing similar books requires numpy and scipy.')
+        computed_at = timezone.now()
+        book_ids, columns, rows = build_matrix(load_signals(self.batch_size))
+        bounds = [(start, min(start + self.chunk_size, len(book_ids)))
+                  for start in range(0, len(book_ids), self.chunk_size)]
+
+        stored = 0
+        for done, (start, stop, result) in enumerate(self.map_chunks(bounds, columns, rows), 1):
+            stored += self.store_chunk(book_ids, start, stop, result, computed_at)
+            self.report('books', min(done * self.chunk_size, len(book_ids)), len(book_ids))
+
+        SimilarBook.objects.filter(computed_at__lt=computed_at).delete()
+        bump_catalogue_version()
+        return {'books': len(book_ids), 'neighbours': stored}
+
+    def report(self, stage, done, total):
+        if self.progress is not None:
+            self.progress(stage, done, total)
+
+    def map_chunks(self, bounds, columns, rows):
+        initargs = (columns, rows, self.limit, self.min_support)
+        if self.processes == 1 or len(bounds) < 2:
+            init_worker(*initargs)
+            yield from map(similar_chunk, bounds)
+            return
+        # With fork the workers share the matrix pages instead of receiving a
+        # pickled copy each. They never touch the database.
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        with multiprocessing.get_context(start_method).Pool(self.processes, init_worker, initargs) as pool:
+            yield from pool.imap_unordered(similar_chunk, bounds)
+
+    def store_chunk(self, book_ids, start, stop, result, computed_at):
+        chunk_ids = [int(book_id) for book_id in book_ids[start:stop]]
+        neighbour_ids = {int(book_ids[neighbour]) for book, neighbours, scores in result for neighbour in neighbours}
+        # Books deleted since the signals were loaded.
+        existing = set(Book.objects.filter(id__in=neighbour_ids.union(chunk_ids)).values_list('id', flat=True))
+
+        similar = []
+        for book, neighbours, scores in result:
+            book_id = int(book_ids[book])
+            if book_id not in existing:
+                continue
+            ranked = ((int(book_ids[neighbour]), float(score)) for neighbour, score in zip(neighbours, scores))
+            ranked = [(similar_id, score) for similar_id, score in ranked if similar_id in existing]
+            similar += [SimilarBook(book_id=book_id, similar_id=similar_id, rank=rank, score=score,
+                                    computed_at=computed_at)
+                        for rank, (similar_id, score) in enumerate(ranked, 1)]
+
+        with transaction.atomic():
+            SimilarBook.objects.filter(book_id__in=chunk_ids).delete()
+            SimilarBook.objects.bulk_create(similar, batch_size=5000)
+        return len(similar)
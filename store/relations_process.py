@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .caching import bump_catalogue_version
+from .models import Book, UserBookRelation
+from .rating_process import compute_rating
+from .serializers import UserBookRelationBulkItemSerializer
+
+RELATION_FIELDS = ('like', 'in_bookmarks', 'rate')
+
+
+def recount_books(book_ids):
+    # The counters are written as absolute values, so the books stay locked
+    # from the aggregate until commit (in id order, so two recounts cannot
+    # deadlock); F() updates of the same books wait and apply on top.
+    with transaction.atomic():
+        book_ids = list(Book.objects.select_for_update().filter(id__in=book_ids).order_by('id')
+                        .values_list('id', flat=True))
+        totals = {
+            row['book_id']: row
+            for row in UserBookRelation.objects.filter(book_id__in=book_ids).values('book_id').annotate(
+                rating_sum=Sum('rate'), rating_count=Count('rate'),
+                likes_count=Count('id', filter=Q(like=True))).order_by()
+        }
+        now = timezone.now()
+        books = []
+        for book_id in book_ids:
+            row = totals.get(book_id, {})
+            rating_sum, rating_count = row.get('rating_sum') or 0, row.get('rating_count', 0)
+            books.append(Book(id=book_id, rating=compute_rating(rating_sum, rating_count), rating_sum=rating_sum,
+                              rating_count=rating_count, likes_count=row.get('likes_count', 0), updated_at=now))
+        Book.objects.bulk_update(books, ['rating', 'rating_sum', 'rating_count', 'likes_count', 'updated_at'])
+    bump_catalogue_version()
+
+
+def bulk_update_relations(user, items):
+    results = [None] * len(items)
+    changes = {}
+    for index, item in enumerate(items):
+        serializer = UserBookRelationBulkItemSerializer(data=item)
+        if not serializer.is_valid():
+            results[index] = {'status': 'error', 'errors': serializer.errors}
+            continue
+        data = dict(serializer.validated_data)
+        book_id = data.pop('book_id')
+        results[index] = {'book': book_id, 'status': 'ok', **data}
+        # Later items for the same book override earlier ones field by field.
+        changes.setdefault(book_id, {}).update(data)
+
+    existing = set(Book.objects.filter(id__in=changes).values_list('id', flat=True))
+    for result in results:
+        if result['status'] == 'ok' and result['book'] not in existing:
+            result.update(status='error', errors={'book': ['Book not found.']})
+    changes = {book_id: fields for book_id, fields in changes.items() if book_id in existing}
+    if not changes:
+        return results
+
+    groups = {}
+    for book_id, fields in changes.items():
+        groups.setdefault(tuple(sorted(fields)), []).append(
+            UserBookRelation(user=user, book_id=book_id, **fields))
+
+    with transaction.atomic():
+        for fields, relations in groups.items():
+            if fields:
+                UserBookRelation.objects.bulk_create(relations, update_conflicts=True,
+                                                     unique_fields=['user', 'book'], update_fields=list(fields))
+            else:
+                UserBookRelation.objects.bulk_create(relations, ignore_conflicts=True)
+        recount_books(sorted(changes))
+    return results
@@ -0,0 +1,74 @@
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Optional faster and more compact formats. Both libraries are optional
+# (requirements-optional.txt):
+# without orjson FastJSONRenderer is DRF's JSONRenderer, without msgpack the
+# MessagePack renderer and parser are simply not offered.
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    # Same bytes as JSONRenderer for compact output, encoded by orjson. Types
+    # orjson does not know (Decimal, lazy strings, ...) and datetimes go
+    # through DRF's encoder so they are formatted the same way.
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact or \
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default,
+                               option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Values msgpack has no type for are converted like in JSON.
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except ValueError as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
+
+
+class CompactFormatsMixin:
+    # Offers MessagePack next to the configured renderers and, where JSON is
+    # accepted, parsers, when msgpack is installed.
+    def get_renderers(self):
+        renderer_list = super().get_renderers()
+        if msgpack is not None:
+            renderer_list.append(MessagePackRenderer())
+        return renderer_list
+
+    def get_parsers(self):
+        parser_list = super().get_parsers()
+        if msgpack is not None and any(isinstance(parser, JSONParser) for parser in parser_list):
+            parser_list.append(MessagePackParser())
+        return parser_list
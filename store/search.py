@@ -0,0 +1,62 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Greatest
+from rest_framework.filters import OrderingFilter, SearchFilter
+
+
+class BookSearchFilter(SearchFilter):
+    # On PostgreSQL `search` is answered from the precomputed, GIN-indexed
+    # Book.search_vector (prefix matching) OR'ed with trigram word similarity
+    # on name/author_name (typo tolerance, GIN trigram indexes). Other
+    # backends fall back to SearchFilter's icontains lookups. Either way the
+    # queryset gets a `search_rank` annotation usable as `ordering=-search_rank`.
+    rank_field = 'search_rank'
+    vector_field = 'search_vector'
+    trigram_fields = ('name', 'author_name')
+    config = 'simple'
+    trigram_min_length = 3
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        words = [word for term in terms for word in re.findall(r'\w+', term)]
+        if not words or connections[queryset.db].vendor != 'postgresql':
+            queryset = super().filter_queryset(request, queryset, view)
+            return queryset.annotate(**{self.rank_field: Value(0.0, output_field=FloatField())})
+        return self.filter_postgresql(queryset, words)
+
+    def filter_postgresql(self, queryset, words):
+        # Like SearchFilter, every word has to match: either as a prefix of a
+        # lexeme in the search vector or as a near-miss of a word in a field.
+        for word in words:
+            condition = Q(**{self.vector_field: self.prefix_query(word)})
+            if len(word) >= self.trigram_min_length:
+                for field in self.trigram_fields:
+                    condition |= Q(**{f'{field}__trigram_word_similar': word})
+            queryset = queryset.filter(condition)
+
+        query = self.prefix_query(*words)
+        text = ' '.join(words)
+        similarity = Greatest(*[TrigramWordSimilarity(text, field) for field in self.trigram_fields])
+        return queryset.annotate(**{self.rank_field: SearchRank(F(self.vector_field), query) + similarity})
+
+    def prefix_query(self, *words):
+        return SearchQuery(' & '.join(f'{word}:*' for word in words), config=self.config, search_type='raw')
+
+
+class BookOrderingFilter(OrderingFilter):
+    # `search_rank` only exists when a search was applied; drop it otherwise.
+    # Ties are broken by id so unpaginated responses are stable whichever
+    # index the database picks.
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and BookSearchFilter.rank_field not in queryset.query.annotations:
+            ordering = [term for term in ordering if term.lstrip('-') != BookSearchFilter.rank_field] or None
+        if ordering and not any(term.lstrip('-') in ('id', 'pk') for term in ordering):
+            ordering = [*ordering, 'id']
+        return ordering
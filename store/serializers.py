@@ -1,8 +1,10 @@
 from rest_framework.serializers import ModelSerializer
-from rest_framework.serializers import IntegerField, DecimalField, CharField
+from rest_framework.serializers import IntegerField, DecimalField, CharField, FloatField, SerializerMethodField
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
 
 from .models import Book, UserBookRelation
+from .library import own_relation_data
 
 
 class BookReadersSerializer(ModelSerializer):
@@ -11,23 +13,110 @@ class BookReadersSerializer(ModelSerializer):
         fields = ('first_name', 'last_name')
 
 
+class BookOwnerSerializer(ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('id', 'username')
+
+
 class BooksSerializer(ModelSerializer):
     # likes_count = SerializerMethodField()
-    annotated_likes = IntegerField(read_only=True)
+    annotated_likes = IntegerField(source='likes_count', read_only=True)
     rating = DecimalField(max_digits=3, decimal_places=2, read_only=True)
     owner_name = CharField(source='owner.username', default='', read_only=True)
-    readers = BookReadersSerializer(many=True, read_only=True)
+    readers_count = SerializerMethodField()
+    readers = SerializerMethodField()
+
+    readers_limit = 10
+    # Added on request with ?expand=, see store/fieldsets.py.
+    expandable_fields = ('owner',)
 
     class Meta:
         model = Book
         fields = ('id', 'name', 'price', 'author_name', 'annotated_likes',
-                  'rating', 'owner_name', 'readers')
+                  'rating', 'owner_name', 'readers_count', 'readers')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fieldset = self.context.get('fieldset')
+        if fieldset is not None:
+            for name in list(self.fields):
+                if not fieldset.includes(name):
+                    self.fields.pop(name)
+            if fieldset.expands('owner'):
+                self.fields['owner'] = BookOwnerSerializer(read_only=True)
+
+    def validate(self, attrs):
+        # DRF builds no validator from Book's UniqueConstraint. Checked only
+        # when the key is written, so a price change costs no query.
+        if 'name' in attrs or 'author_name' in attrs:
+            key = {field: attrs.get(field, getattr(self.instance, field, None)) for field in ('name', 'author_name')}
+            books = Book.objects.filter(**key)
+            if self.instance is not None:
+                books = books.exclude(pk=self.instance.pk)
+            if books.exists():
+                raise ValidationError({'non_field_errors': ['A book with this name and author_name already exists.']},
+                                      code='unique')
+        return attrs
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if hasattr(instance, 'own_like'):
+            data['own_relation'] = own_relation_data(instance.__dict__)
+        return data
+
+    def get_readers_count(self, instance):
+        if hasattr(instance, 'readers_count'):
+            return instance.readers_count
+        return instance.readers.count()
+
+    def get_readers(self, instance):
+        if hasattr(instance, 'top_readers'):
+            readers = instance.top_readers
+        else:
+            readers = instance.readers.all()[:self.readers_limit]
+        return BookReadersSerializer(readers, many=True).data
     
     # def get_likes_count(self, instance):
     #     return UserBookRelation.objects.filter(book=instance, like=True).count()
 
 
+class BookSummarySerializer(ModelSerializer):
+    annotated_likes = IntegerField(source='likes_count', read_only=True)
+    rating = DecimalField(max_digits=3, decimal_places=2, read_only=True)
+
+    # Model fields the representation reads, for `.only()`.
+    model_fields = ('id', 'name', 'price', 'author_name', 'likes_count', 'rating')
+
+    class Meta:
+        model = Book
+        fields = ('id', 'name', 'price', 'author_name', 'annotated_likes', 'rating')
+
+
+class SimilarBooksSerializer(BookSummarySerializer):
+    score = FloatField(read_only=True)
+
+    class Meta(BookSummarySerializer.Meta):
+        fields = BookSummarySerializer.Meta.fields + ('score',)
+
+
+class LibrarySerializer(ModelSerializer):
+    book = BookSummarySerializer(read_only=True)
+
+    class Meta:
+        model = UserBookRelation
+        fields = ('book', 'like', 'in_bookmarks', 'rate')
+
+
 class UserBookRelationSerializer(ModelSerializer):
     class Meta:
         model = UserBookRelation
         fields = ('book', 'like', 'in_bookmarks', 'rate')
+
+
+class UserBookRelationBulkItemSerializer(ModelSerializer):
+    book = IntegerField(source='book_id')
+
+    class Meta:
+        model = UserBookRelation
+        fields = ('book', 'like', 'in_bookmarks', 'rate')
@@ -73,6 +73,26 @@ class BookApiTestCase(APITestCase):
         self.assertEqual(self.user, Book.objects.last().owner)
 
 
+    def test_create_existing_name_and_author(self):
+        url = reverse('book-list')
+        data = {'name': self.book_2.name, 'price': 500, 'author_name': self.book_2.author_name}
+        self.client.force_login(self.user)
+        response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual(['A book with this name and author_name already exists.'],
+                         response.data['non_field_errors'])
+        self.assertEqual(3, Book.objects.all().count())
+
+    def test_update_to_existing_name_and_author(self):
+        url = reverse('book-detail', args=(self.book_1.id,))
+        self.client.force_login(self.user)
+        data = {'name': self.book_3.name, 'author_name': self.book_3.author_name}
+        response = self.client.patch(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        # The book's own key is not a conflict.
+        response = self.client.patch(url, data=json.dumps({'name': self.book_1.name}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
     def test_update_owner(self):
         url = reverse('book-detail', args=(self.book_1.id,))
         data =  {
@@ -177,3 +197,110 @@ class BooksRelationTestCase(APITestCase):
         self.client.force_login(self.user1)
         response = self.client.patch(url, data=json_data, content_type='application/json')
         self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+
+class BooksRelationBulkTestCase(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='test_username_1')
+        self.user2 = User.objects.create(username='test_username_2')
+        self.book_1 = Book.objects.create(name='Test Book 1', price=25, author_name='Author 1', owner=self.user1)
+        self.book_2 = Book.objects.create(name='Test Book 2', price=55, author_name='Author 2')
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, like=True, rate=2)
+        UserBookRelation.objects.create(user=self.user1, book=self.book_2, in_bookmarks=True, rate=3)
+        self.url = reverse('user-book-relation-bulk')
+
+    def post(self, data):
+        self.client.force_login(self.user1)
+        return self.client.post(self.url, data=json.dumps(data), content_type='application/json')
+
+    def test_bulk(self):
+        response = self.post([
+            {'book': self.book_1.id, 'like': True, 'rate': 4},
+            {'book': self.book_2.id, 'like': True},
+        ])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([
+            {'book': self.book_1.id, 'status': 'ok', 'like': True, 'rate': 4},
+            {'book': self.book_2.id, 'status': 'ok', 'like': True},
+        ], response.data)
+
+        relation = UserBookRelation.objects.get(user=self.user1, book=self.book_2)
+        self.assertTrue(relation.like)
+        self.assertTrue(relation.in_bookmarks)
+        self.assertEqual(3, relation.rate)
+
+        self.book_1.refresh_from_db()
+        self.book_2.refresh_from_db()
+        self.assertEqual(('3.00', 2, 2), (str(self.book_1.rating), self.book_1.likes_count, self.book_1.rating_count))
+        self.assertEqual(('3.00', 1), (str(self.book_2.rating), self.book_2.likes_count))
+
+    def test_bulk_locks_books(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.post([{'book': self.book_2.id, 'like': True}, {'book': self.book_1.id, 'like': True}])
+        locks = [query['sql'] for query in queries if 'FROM "store_book"' in query['sql'] and 'ORDER BY' in query['sql']
+                 and query['sql'].startswith('SELECT "store_book"."id"')]
+        self.assertEqual(1, len(locks))
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', locks[0])
+
+    def test_bulk_same_book_merged(self):
+        self.post([
+            {'book': self.book_1.id, 'rate': 1},
+            {'book': self.book_1.id, 'in_bookmarks': True},
+            {'book': self.book_1.id, 'rate': 5},
+        ])
+        relation = UserBookRelation.objects.get(user=self.user1, book=self.book_1)
+        self.assertEqual((5, True, False), (relation.rate, relation.in_bookmarks, relation.like))
+        self.book_1.refresh_from_db()
+        self.assertEqual('3.50', str(self.book_1.rating))
+
+    def test_bulk_errors(self):
+        response = self.post([
+            {'book': self.book_1.id, 'rate': 6},
+            {'book': 100, 'like': True},
+            {'book': self.book_2.id, 'rate': None},
+        ])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(['error', 'error', 'ok'], [result['status'] for result in response.data])
+        self.assertIn('rate', response.data[0]['errors'])
+        self.assertIn('book', response.data[1]['errors'])
+        self.assertFalse(UserBookRelation.objects.filter(user=self.user1, book=self.book_1).exists())
+        self.book_2.refresh_from_db()
+        self.assertIsNone(self.book_2.rating)
+
+    def test_bulk_not_list(self):
+        response = self.post({'book': self.book_1.id})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_bulk_anonymous(self):
+        response = self.client.post(self.url, data='[]', content_type='application/json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+
+class BookReadersApiTestCase(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(name='Test Book 1', price=25, author_name='Author 1')
+        self.users = [User.objects.create(username=f'user{i}', first_name=f'Name{i}', last_name='L')
+                      for i in range(5)]
+        for user in self.users:
+            UserBookRelation.objects.create(user=user, book=self.book)
+
+    def test_readers(self):
+        url = reverse('book-readers', args=(self.book.id,))
+        response = self.client.get(url, data={'page_size': 3})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(['Name0', 'Name1', 'Name2'], [reader['first_name'] for reader in response.data['results']])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(['Name3', 'Name4'], [reader['first_name'] for reader in response.data['results']])
+        self.assertIsNone(response.data['next'])
+
+    def test_list_is_bounded(self):
+        for i in range(5, 12):
+            UserBookRelation.objects.create(user=User.objects.create(username=f'user{i}'), book=self.book)
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(12, response.data[0]['readers_count'])
+        self.assertEqual(BooksSerializer.readers_limit, len(response.data[0]['readers']))
+
+    def test_missing_book(self):
+        response = self.client.get(reverse('book-readers', args=(100,)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
@@ -0,0 +1,176 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.utils.json import json
+from django.contrib.auth.models import User
+
+from store.async_views import cached_data, get_book_view
+from store.caching import get_response_cache
+from store.instrumentation import registry
+from store.models import Book, UserBookRelation
+from store.views import BookViewSet
+
+
+@override_settings(STORE_RESPONSE_CACHE=None)
+class AsyncBookApiTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username', first_name='Tom', last_name='TT')
+        self.book_1 = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.user)
+        self.book_2 = Book.objects.create(name='Test book 2', price=55, author_name='Author 5')
+        self.book_3 = Book.objects.create(name='Test book Author 1', price=55, author_name='Author 2')
+        UserBookRelation.objects.create(user=self.user, book=self.book_1, like=True, rate=5)
+
+    async def assertSameAsSync(self, async_url, sync_url, params=None):
+        response = await self.async_client.get(async_url, params)
+        expected = await self.async_client.get(sync_url, params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        # Pagination links point back at the endpoint that was called.
+        self.assertEqual(expected.content.replace(b'/book/', b'/async/book/'), response.content)
+        return response
+
+    async def test_list(self):
+        await self.assertSameAsSync(reverse('async-book-list'), reverse('book-list'))
+
+    async def test_list_filter_search_order(self):
+        await self.assertSameAsSync(reverse('async-book-list'), reverse('book-list'), {'price': 55})
+        await self.assertSameAsSync(reverse('async-book-list'), reverse('book-list'), {'search': 'Author 1'})
+        await self.assertSameAsSync(reverse('async-book-list'), reverse('book-list'), {'ordering': '-price'})
+        await self.assertSameAsSync(reverse('async-book-list'), reverse('book-list'),
+                                    {'fields': 'id,name', 'expand': 'owner'})
+
+    async def test_list_paginated(self):
+        response = await self.assertSameAsSync(reverse('async-book-list'), reverse('book-list'), {'page_size': 2})
+        next_link = json.loads(response.content)['next']
+        self.assertIn('/async/book/', next_link)
+        response = await self.async_client.get(next_link)
+        self.assertEqual([self.book_3.id], [book['id'] for book in json.loads(response.content)['results']])
+
+    async def test_list_own_relation(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.assertSameAsSync(reverse('async-book-list'), reverse('book-list'),
+                                               {'own_relation': 'true'})
+        self.assertEqual({'like': True, 'in_bookmarks': False, 'rate': 5},
+                         json.loads(response.content)[0]['own_relation'])
+        await self.assertSameAsSync(reverse('async-book-detail', args=(self.book_2.id,)),
+                                    reverse('book-detail', args=(self.book_2.id,)), {'own_relation': 'true'})
+
+    @override_settings(STORE_FAST_BOOK_SERIALIZER=False)
+    async def test_model_serializer(self):
+        with mock.patch.object(BookViewSet, 'get_fast_serializer', side_effect=AssertionError('fast serializer')):
+            await self.assertSameAsSync(reverse('async-book-list'), reverse('book-list'))
+            await self.assertSameAsSync(reverse('async-book-list'), reverse('book-list'), {'page_size': 2})
+            await self.assertSameAsSync(reverse('async-book-list'), reverse('book-list'),
+                                        {'fields': 'id,name', 'expand': 'owner'})
+            await self.assertSameAsSync(reverse('async-book-detail', args=(self.book_1.id,)),
+                                        reverse('book-detail', args=(self.book_1.id,)))
+            response = await self.async_client.get(reverse('async-book-detail', args=(0,)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    async def test_invalid_cursor(self):
+        response = await self.async_client.get(reverse('async-book-list'), {'cursor': 'broken'})
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    async def test_retrieve(self):
+        await self.assertSameAsSync(reverse('async-book-detail', args=(self.book_1.id,)),
+                                    reverse('book-detail', args=(self.book_1.id,)))
+
+    async def test_retrieve_not_found(self):
+        response = await self.async_client.get(reverse('async-book-detail', args=(0,)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        self.assertEqual({'detail': 'Not found.'}, json.loads(response.content))
+
+    async def test_instrumented(self):
+        registry.clear()
+        await self.async_client.get(reverse('async-book-list'))
+        labels = (('endpoint', 'async-book-list'), ('method', 'GET'))
+        self.assertEqual(2, registry.get('store_db_queries', labels).sum)
+
+    async def test_method_not_allowed(self):
+        response = await self.async_client.post(reverse('async-book-list'))
+        self.assertEqual(status.HTTP_405_METHOD_NOT_ALLOWED, response.status_code)
+
+
+@override_settings(STORE_RESPONSE_CACHE={'BACKEND': 'store.caching.LocMemLRUBackend'}, STORE_SINGLE_FLIGHT_WAIT=1)
+class AsyncCachingTestCase(TestCase):
+    def setUp(self):
+        get_response_cache().clear()
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+
+    async def test_hit(self):
+        url = reverse('async-book-list')
+        response = await self.async_client.get(url)
+        self.assertEqual('MISS', response['X-Cache'])
+        registry.clear()
+        cached = await self.async_client.get(url)
+        self.assertEqual('HIT', cached['X-Cache'])
+        self.assertEqual(0, registry.get('store_db_queries', (('endpoint', 'async-book-list'), ('method', 'GET'))).sum)
+        self.assertEqual(response.content, cached.content)
+        # The sync endpoint's payload has other pagination links.
+        self.assertEqual('MISS', (await self.async_client.get(reverse('book-list')))['X-Cache'])
+
+        await Book.objects.filter(pk=self.book.pk).aupdate(price=30)
+        await sync_to_async(get_response_cache().bump_version)()
+        response = await self.async_client.get(reverse('async-book-detail', args=(self.book.id,)))
+        self.assertEqual(('MISS', '30.00'), (response['X-Cache'], json.loads(response.content)['price']))
+
+    async def test_errors_are_not_cached(self):
+        url = reverse('async-book-detail', args=(0,))
+        sets = get_response_cache().metrics.sets
+        self.assertEqual(status.HTTP_404_NOT_FOUND, (await self.async_client.get(url)).status_code)
+        self.assertEqual(status.HTTP_404_NOT_FOUND, (await self.async_client.get(url)).status_code)
+        self.assertEqual(sets, get_response_cache().metrics.sets)
+
+    async def test_coalesces_misses(self):
+        request = RequestFactory().get(reverse('async-book-list'))
+        request.user = await sync_to_async(lambda: User.objects.create(username='user1'))()
+        view = get_book_view(request, 'list')
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {'id': 1}
+
+        results = await asyncio.gather(cached_data(view, compute), cached_data(view, compute))
+        self.assertEqual(1, len(calls))
+        self.assertEqual([({'id': 1}, 'MISS'), ({'id': 1}, 'COALESCED')], sorted(results, key=lambda r: r[1] != 'MISS'))
+
+
+class AsyncRelationApiTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+
+    async def test_patch(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        url = reverse('async-user-book-relation-detail', args=(self.book.id,))
+        response = await self.async_client.patch(url, json.dumps({'like': True, 'rate': 4}),
+                                                 content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'book': self.book.id, 'like': True, 'in_bookmarks': False, 'rate': 4},
+                         json.loads(response.content))
+
+        book = await Book.objects.aget(pk=self.book.pk)
+        self.assertEqual((1, 1, 4), (book.likes_count, book.rating_count, book.rating_sum))
+
+    async def test_patch_invalid(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        url = reverse('async-user-book-relation-detail', args=(self.book.id,))
+        response = await self.async_client.patch(url, json.dumps({'rate': 9}), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn('rate', json.loads(response.content))
+
+    async def test_patch_unknown_book(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        url = reverse('async-user-book-relation-detail', args=(0,))
+        response = await self.async_client.patch(url, json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    async def test_patch_anonymous(self):
+        url = reverse('async-user-book-relation-detail', args=(self.book.id,))
+        response = await self.async_client.patch(url, json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
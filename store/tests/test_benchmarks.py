@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from store.benchmarks import DatasetGenerator, compare_results
+from store.likes_process import find_likes_drift
+from store.models import Book, UserBookRelation
+from store.rating_process import rebuild_ratings
+
+
+class DatasetGeneratorTestCase(TestCase):
+    def test_generate(self):
+        created = DatasetGenerator(books=50, users=10, relations=200, batch_size=17).run()
+        self.assertEqual(50, Book.objects.count())
+        self.assertEqual(10, User.objects.filter(username__startswith='bench_').count())
+        self.assertEqual(created['relations'], UserBookRelation.objects.count())
+        self.assertGreater(created['relations'], 100)
+        self.assertEqual(0, rebuild_ratings())
+        self.assertEqual([], find_likes_drift())
+
+    def test_skewed(self):
+        DatasetGenerator(books=100, users=20, relations=500).run()
+        counts = sorted((book.userbookrelation_set.count() for book in Book.objects.all()), reverse=True)
+        self.assertGreater(sum(counts[:10]), sum(counts[-50:]))
+
+    def test_seeded(self):
+        DatasetGenerator(books=20, users=5, relations=50, seed=3).run()
+        first = list(Book.objects.order_by('id').values_list('name', 'price', 'author_name'))
+        DatasetGenerator.clear()
+        DatasetGenerator(books=20, users=5, relations=50, seed=3).run()
+        second = list(Book.objects.order_by('id').values_list('name', 'price', 'author_name'))
+        self.assertEqual(first, second)
+
+    def test_run_again_without_clear(self):
+        DatasetGenerator(books=20, users=5, relations=50).run()
+        created = DatasetGenerator(books=30, users=5, relations=50).run()
+        self.assertEqual((30, 5), (created['books'], created['users']))
+        self.assertEqual(30, Book.objects.count())
+        self.assertEqual(0, rebuild_ratings())
+        self.assertEqual([], find_likes_drift())
+
+    def test_clear(self):
+        user = User.objects.create(username='reader')
+        book = Book.objects.create(name='Real book', price=10, author_name='Author', owner=user)
+        DatasetGenerator(books=10, users=3, relations=20).run()
+        bench_user = User.objects.get(username='bench_0')
+        UserBookRelation.objects.create(user=bench_user, book=book, rate=5, like=True)
+
+        DatasetGenerator.clear()
+        self.assertEqual([book], list(Book.objects.all()))
+        self.assertEqual([user], list(User.objects.all()))
+        book.refresh_from_db()
+        self.assertEqual((0, 0), (book.rating_count, book.likes_count))
+
+
+class RunBenchmarksCommandTestCase(TestCase):
+    def setUp(self):
+        DatasetGenerator(books=30, users=5, relations=60).run()
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            call_command('run_benchmarks', iterations=3, warmup=1, memory_iterations=1, host='testserver',
+                         output=path)
+            with open(path) as f:
+                results = json.load(f)
+
+            self.assertEqual(30, results['meta']['books'])
+            self.assertEqual({'list', 'retrieve', 'search', 'filter', 'relation_patch'}, set(results['scenarios']))
+            for metrics in results['scenarios'].values():
+                self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+                self.assertGreater(metrics['peak_memory_bytes'], 0)
+
+            call_command('run_benchmarks', scenarios=['retrieve'], iterations=3, warmup=1, memory_iterations=1,
+                         host='testserver', baseline=path, tolerance=1000, stdout=StringIO())
+
+    def test_formats(self):
+        output = StringIO()
+        call_command('run_benchmarks', scenarios=['retrieve'], iterations=2, warmup=0, memory_iterations=1,
+                     host='testserver', formats=True, stdout=output)
+        formats = json.loads(output.getvalue())['formats']
+        self.assertIn('json+gzip', formats)
+        self.assertLess(formats['json+gzip']['bytes'], formats['json']['bytes'])
+
+    def test_without_users(self):
+        User.objects.all().delete()
+        call_command('run_benchmarks', scenarios=['relation_patch'], iterations=2, warmup=0, memory_iterations=1,
+                     host='testserver', stdout=StringIO())
+        self.assertEqual(['bench_runner'], list(User.objects.values_list('username', flat=True)))
+
+    def test_empty_catalogue(self):
+        Book.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('run_benchmarks', iterations=1, host='testserver', stdout=StringIO())
+
+
+class CompareResultsTestCase(TestCase):
+    def test_compare(self):
+        baseline = {'scenarios': {'list': {'p50_ms': 10, 'p99_ms': 20, 'queries': 3, 'throughput_rps': 100}}}
+        current = {'scenarios': {'list': {'p50_ms': 11, 'p90_ms': 15, 'p99_ms': 30, 'peak_memory_bytes': 1,
+                                          'queries': 3, 'throughput_rps': 70}}}
+        self.assertEqual(['list.p99_ms: 30 > 20 (+20%)', 'list.throughput_rps: 70 < 100 (-20%)'],
+                         compare_results(current, baseline))
+        self.assertEqual([], compare_results(current, baseline, tolerance=1))
@@ -0,0 +1,240 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, APITestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.utils.json import json
+from django.contrib.auth.models import User
+
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from store.caching import CachedResponseMixin, LocMemLRUBackend, get_response_cache
+from store.models import Book, UserBookRelation
+
+
+class LocMemLRUBackendTestCase(TestCase):
+    def test_evicts_least_recently_used(self):
+        backend = LocMemLRUBackend(max_bytes=10)
+        backend.set('a', b'1234')
+        backend.set('b', b'1234')
+        backend.get('a')
+        backend.set('c', b'1234')
+        self.assertEqual(b'1234', backend.get('a'))
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(b'1234', backend.get('c'))
+        self.assertEqual(1, backend.metrics.evictions)
+
+    def test_skips_oversized_payload(self):
+        backend = LocMemLRUBackend(max_bytes=3)
+        backend.set('a', b'1234')
+        self.assertIsNone(backend.get('a'))
+
+    def test_expires(self):
+        backend = LocMemLRUBackend(timeout=-1)
+        backend.set('a', b'1')
+        self.assertIsNone(backend.get('a'))
+
+    def test_version(self):
+        backend = LocMemLRUBackend()
+        version = backend.get_version()
+        backend.bump_version()
+        self.assertEqual(version + 1, backend.get_version())
+
+
+class CachedBookApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.book_1 = Book.objects.create(name='Test Book 1', price=25, author_name='Author 1', owner=self.user)
+        self.book_2 = Book.objects.create(name='Test Book 2', price=55, author_name='Author 5')
+
+    def test_hit(self):
+        url = reverse('book-list')
+        first = self.client.get(url, data={'price': 55})
+        self.assertEqual('MISS', first['X-Cache'])
+        with self.assertNumQueries(0):
+            second = self.client.get(url, data={'price': 55})
+        self.assertEqual('HIT', second['X-Cache'])
+        self.assertEqual(first.data, second.data)
+
+        other = self.client.get(url, data={'price': 25})
+        self.assertEqual('MISS', other['X-Cache'])
+        self.assertEqual(1, len(other.data))
+
+    def test_invalidated_by_book_write(self):
+        url = reverse('book-detail', args=(self.book_1.id,))
+        self.client.get(url)
+        self.book_1.price = 30
+        self.book_1.save()
+        response = self.client.get(url)
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual('30.00', response.data['price'])
+
+    def test_invalidated_by_relation_update(self):
+        url = reverse('book-list')
+        self.client.get(url)
+        self.client.force_login(self.user)
+        self.client.patch(reverse('user-book-relation-detail', args=(self.book_1.id,)),
+                          data=json.dumps({'like': True, 'rate': 4}), content_type='application/json')
+        response = self.client.get(url)
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual(1, response.data[0]['annotated_likes'])
+        self.assertEqual('4.00', response.data[0]['rating'])
+
+    def test_invalidated_by_delete(self):
+        url = reverse('book-list')
+        self.client.get(url)
+        UserBookRelation.objects.create(user=self.user, book=self.book_2)
+        self.book_2.delete()
+        response = self.client.get(url)
+        self.assertEqual(1, len(response.data))
+
+    def test_metrics(self):
+        backend = get_response_cache()
+        hits, misses = backend.metrics.hits, backend.metrics.misses
+        self.client.get(reverse('book-list'))
+        self.client.get(reverse('book-list'))
+        self.assertEqual(hits + 1, backend.metrics.hits)
+        self.assertEqual(misses + 1, backend.metrics.misses)
+
+    @override_settings(STORE_RESPONSE_CACHE={'BACKEND': 'store.caching.SharedBackend'})
+    def test_shared_backend(self):
+        url = reverse('book-list')
+        self.assertEqual('MISS', self.client.get(url)['X-Cache'])
+        self.assertEqual('HIT', self.client.get(url)['X-Cache'])
+        self.book_2.delete()
+        response = self.client.get(url)
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual(1, len(response.data))
+
+    @override_settings(STORE_RESPONSE_CACHE=None)
+    def test_disabled(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertFalse(response.has_header('X-Cache'))
+
+
+class CoalescedView(CachedResponseMixin):
+    basename = 'book'
+    action = 'list'
+    kwargs = {}
+    single_flight_poll = 0.01
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def handler(self, request):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return Response({'calls': self.calls})
+
+    def get(self, results):
+        request = Request(APIRequestFactory().get('/book/'))
+        request.accepted_media_type = 'application/json'
+        results.append(self.cached_response(self.handler, request))
+
+
+@override_settings(STORE_RESPONSE_CACHE={'BACKEND': 'store.caching.LocMemLRUBackend'}, STORE_SINGLE_FLIGHT_WAIT=5)
+class SingleFlightTestCase(TestCase):
+    def setUp(self):
+        get_response_cache().clear()
+
+    def test_coalesces_concurrent_misses(self):
+        view, results = CoalescedView(), []
+        coalesced = get_response_cache().metrics.coalesced
+        leader = threading.Thread(target=view.get, args=(results,))
+        leader.start()
+        view.started.wait(5)
+        follower = threading.Thread(target=view.get, args=(results,))
+        follower.start()
+        time.sleep(0.1)
+        view.release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(1, view.calls)
+        self.assertEqual(['MISS', 'COALESCED'], [response['X-Cache'] for response in results])
+        self.assertEqual([{'calls': 1}] * 2, [response.data for response in results])
+        self.assertEqual(coalesced + 1, get_response_cache().metrics.coalesced)
+
+    @override_settings(STORE_SINGLE_FLIGHT_WAIT=0.2)
+    def test_waiter_retries_cache(self):
+        view, results = CoalescedView(), []
+        leader = threading.Thread(target=view.get, args=([],))
+        leader.start()
+        view.started.wait(5)
+        # Stored by another process while this one's leader is still busy.
+        request = Request(APIRequestFactory().get('/book/'))
+        request.accepted_media_type = 'application/json'
+        backend = get_response_cache()
+        payload = view.make_payload(request, Response({'calls': 0}))[0]
+        timer = threading.Timer(0.05, backend.set, (view.get_response_cache_key(request, backend.get_version()), payload))
+        timer.start()
+        view.get(results)
+        timer.join()
+        view.release.set()
+        leader.join()
+
+        self.assertEqual(1, view.calls)
+        self.assertEqual(('COALESCED', {'calls': 0}), (results[0]['X-Cache'], results[0].data))
+
+    @override_settings(STORE_SINGLE_FLIGHT_WAIT=0)
+    def test_disabled(self):
+        view, results = CoalescedView(), []
+        view.release.set()
+        view.get(results)
+        self.assertEqual('MISS', results[0]['X-Cache'])
+
+
+@override_settings(STORE_RESPONSE_CACHE={'BACKEND': 'store.caching.SharedBackend'}, STORE_SINGLE_FLIGHT_WAIT=1)
+class SharedSingleFlightTestCase(TestCase):
+    def setUp(self):
+        self.view = CoalescedView()
+        self.view.release.set()
+        self.backend = get_response_cache()
+        self.backend.clear()
+        self.request = Request(APIRequestFactory().get('/book/'))
+        self.request.accepted_media_type = 'application/json'
+        self.key = self.view.get_response_cache_key(self.request, self.backend.get_version())
+
+    def tearDown(self):
+        self.backend.unlock(self.key)
+
+    def test_waits_for_other_process(self):
+        # Another worker holds the lock and stores the response shortly after.
+        self.assertTrue(self.backend.lock(self.key, 5))
+        payload = self.view.make_payload(self.request, Response({'calls': 0}))[0]
+        timer = threading.Timer(0.05, self.backend.set, (self.key, payload))
+        timer.start()
+        results = []
+        self.view.get(results)
+        timer.join()
+        self.assertEqual(0, self.view.calls)
+        self.assertEqual(('COALESCED', {'calls': 0}), (results[0]['X-Cache'], results[0].data))
+
+    def test_other_process_too_slow(self):
+        self.assertTrue(self.backend.lock(self.key, 5))
+        with override_settings(STORE_SINGLE_FLIGHT_WAIT=0.05):
+            results = []
+            self.view.get(results)
+        self.assertEqual((1, 'MISS'), (self.view.calls, results[0]['X-Cache']))
+
+    def test_lock_outlives_wait(self):
+        with mock.patch.object(self.backend, 'lock', wraps=self.backend.lock) as lock:
+            self.view.get([])
+        self.assertEqual(self.view.single_flight_lock_timeout, lock.call_args[0][1])
+        with override_settings(STORE_SINGLE_FLIGHT_WAIT=40), \
+                mock.patch.object(self.backend, 'lock', wraps=self.backend.lock) as lock:
+            self.backend.clear()
+            self.view.get([])
+        self.assertEqual(80, lock.call_args[0][1])
+
+    def test_releases_lock(self):
+        self.view.get([])
+        self.assertTrue(self.backend.lock(self.key, 5))
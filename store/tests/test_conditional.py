@@ -0,0 +1,85 @@
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+from django.contrib.auth.models import User
+
+from store.models import Book, UserBookRelation
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.book_1 = Book.objects.create(name='Test Book 1', price=25, author_name='Author 1', owner=self.user)
+        self.book_2 = Book.objects.create(name='Test Book 2', price=55, author_name='Author 5')
+
+    def test_list_not_modified(self):
+        url = reverse('book-list')
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        # Validated against the ETag stored with the cached response.
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(b'', response.content)
+
+    @override_settings(STORE_RESPONSE_CACHE=None)
+    def test_list_not_modified_without_cache(self):
+        url = reverse('book-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(etag, response['ETag'])
+
+    def test_list_etag_depends_on_params(self):
+        url = reverse('book-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, data={'price': 55}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_list_etag_changes_on_like(self):
+        url = reverse('book-list')
+        etag = self.client.get(url)['ETag']
+        UserBookRelation.objects.create(user=self.user, book=self.book_2, like=True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
+    def test_list_etag_changes_on_delete(self):
+        url = reverse('book-list')
+        etag = self.client.get(url)['ETag']
+        self.book_1.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_detail(self):
+        url = reverse('book-detail', args=(self.book_1.id,))
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+        self.book_1.price = 30
+        self.book_1.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_detail_rating_change(self):
+        url = reverse('book-detail', args=(self.book_1.id,))
+        etag = self.client.get(url)['ETag']
+        UserBookRelation.objects.create(user=self.user, book=self.book_1, rate=3)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('3.00', response.data['rating'])
+
+    def test_detail_missing(self):
+        response = self.client.get(reverse('book-detail', args=(100,)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        response = self.client.get('/book/abc/')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
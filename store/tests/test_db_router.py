@@ -0,0 +1,129 @@
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework.utils.json import json
+from django.contrib.auth.models import User
+
+from store.caching import get_response_cache
+from store.db_router import STICKY_COOKIE, ReplicaHealth, ReplicaRouter, replica_health, route_metrics
+from store.models import Book
+
+
+class ReplicaRouterTestCase(TestCase):
+    def test_outside_requests(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Book))
+        self.assertEqual('default', router.db_for_write(Book))
+
+    @override_settings(STORE_READ_REPLICAS=['replica_0'])
+    def test_no_migrations_on_replicas(self):
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate('replica_0', 'store'))
+        self.assertIsNone(router.allow_migrate('default', 'store'))
+
+
+# 'default' stands in for the replica here so the routing can be observed
+# without a second database.
+@override_settings(STORE_READ_REPLICAS=['default'], STORE_RESPONSE_CACHE=None)
+class ReplicaRoutingApiTestCase(APITestCase):
+    def setUp(self):
+        route_metrics.clear()
+        replica_health.clear()
+        self.user = User.objects.create(username='test_username')
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+
+    def test_reads_use_replica(self):
+        self.client.get(reverse('book-list'))
+        self.assertEqual({('default', 'replica'): 2}, route_metrics.as_dict())
+
+    def test_writes_are_sticky(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(reverse('user-book-relation-detail', args=(self.book.id,)),
+                                     data=json.dumps({'like': True}), content_type='application/json')
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual({}, route_metrics.as_dict())
+
+        self.client.get(reverse('book-list'))
+        self.assertEqual({('default', 'sticky'): 2}, route_metrics.as_dict())
+
+    def test_expired_cookie(self):
+        self.client.cookies[STICKY_COOKIE] = '1'
+        self.client.get(reverse('book-list'))
+        self.assertEqual({('default', 'replica'): 2}, route_metrics.as_dict())
+
+    def test_unhealthy_replica(self):
+        with mock.patch.object(ReplicaHealth, 'check', return_value=False) as check:
+            self.client.get(reverse('book-list'))
+            self.client.get(reverse('book-list'))
+        self.assertEqual(1, check.call_count)
+        self.assertEqual({('default', 'no_replica'): 4}, route_metrics.as_dict())
+
+    def test_metrics(self):
+        self.client.get(reverse('book-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertIn('store_db_read_route_total{alias="default",reason="replica"} 2', response.content.decode())
+
+
+@override_settings(STORE_READ_REPLICAS=['default'],
+                   STORE_RESPONSE_CACHE={'BACKEND': 'store.caching.LocMemLRUBackend'})
+class CachedReplicaRoutingApiTestCase(APITestCase):
+    def setUp(self):
+        route_metrics.clear()
+        replica_health.clear()
+        get_response_cache().clear()
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+
+    def test_cache_filled_from_primary(self):
+        url = reverse('book-detail', args=(self.book.id,))
+        self.assertEqual('MISS', self.client.get(url)['X-Cache'])
+        self.assertEqual({('default', 'cache_fill'): 3}, route_metrics.as_dict())
+        self.assertEqual('HIT', self.client.get(url)['X-Cache'])
+        self.assertEqual({('default', 'cache_fill'): 3}, route_metrics.as_dict())
+
+    def test_uncached_reads_use_replica(self):
+        self.client.get(reverse('book-readers', args=(self.book.id,)))
+        self.assertEqual({('default', 'replica')}, set(route_metrics.as_dict()))
+
+    def test_if_modified_since_on_primary(self):
+        url = reverse('book-detail', args=(self.book.id,))
+        last_modified = self.client.get(url)['Last-Modified']
+        route_metrics.clear()
+        self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual({('default', 'validators'): 1}, route_metrics.as_dict())
+
+
+REPLICA = next(iter(getattr(settings, 'STORE_REPLICA_DATABASES', [])), None)
+
+
+@skipUnless(REPLICA, 'needs a second database, set DB_REPLICA_HOSTS')
+@override_settings(STORE_READ_REPLICAS=[REPLICA], STORE_RESPONSE_CACHE=None)
+class ReplicaDatabaseTestCase(APITestCase):
+    databases = {'default', REPLICA} if REPLICA else {'default'}
+
+    def setUp(self):
+        replica_health.clear()
+        self.user = User.objects.create(username='test_username')
+        self.book = Book.objects.create(name='Primary book', price=25, author_name='Author 1')
+        Book.objects.using(REPLICA).create(name='Replica book', price=25, author_name='Author 1')
+
+    def names(self):
+        response = self.client.get(reverse('book-list'))
+        return [book['name'] for book in response.data]
+
+    def test_read_your_writes(self):
+        self.assertEqual(['Replica book'], self.names())
+
+        self.client.force_authenticate(self.user)
+        self.client.patch(reverse('user-book-relation-detail', args=(self.book.id,)),
+                          data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(['Primary book'], self.names())
+
+    def test_writes_go_to_primary(self):
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('book-list'), data=json.dumps({'name': 'New', 'price': '1.00', 'author_name': 'A'}),
+                         content_type='application/json')
+        self.assertTrue(Book.objects.using('default').filter(name='New').exists())
+        self.assertFalse(Book.objects.using(REPLICA).filter(name='New').exists())
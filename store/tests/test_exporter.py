@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.models import Book, UserBookRelation
+
+
+class BookExportTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.book_1 = Book.objects.create(name='Test Book 1', price=25, author_name='Author 1', owner=self.user)
+        self.book_2 = Book.objects.create(name='Test Book 2', price=55, author_name='Author 5')
+        self.book_3 = Book.objects.create(name='Test Book Author 1', price=55, author_name='Author 2')
+        UserBookRelation.objects.create(user=self.user, book=self.book_1, like=True, rate=5)
+
+    def export(self, **params):
+        response = self.client.get(reverse('book-export'), data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual(3, len(rows))
+        self.assertEqual({
+            'id': self.book_1.id,
+            'name': 'Test Book 1',
+            'price': '25.00',
+            'author_name': 'Author 1',
+            'annotated_likes': 1,
+            'rating': '5.00',
+            'owner_name': 'test_username',
+        }, rows[0])
+        self.assertEqual((None, ''), (rows[1]['rating'], rows[1]['owner_name']))
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(export_format='csv'))))
+        self.assertEqual(['Test Book 1', 'Test Book 2', 'Test Book Author 1'], [row['name'] for row in rows])
+        self.assertEqual('', rows[1]['rating'])
+
+    def test_filters(self):
+        rows = [json.loads(line) for line in self.export(price=55, ordering='-author_name').splitlines()]
+        self.assertEqual([self.book_2.id, self.book_3.id], [row['id'] for row in rows])
+        rows = [json.loads(line) for line in self.export(search='Author 1').splitlines()]
+        self.assertEqual([self.book_1.id, self.book_3.id], [row['id'] for row in rows])
+
+    def test_wrong_format(self):
+        response = self.client.get(reverse('book-export'), data={'export_format': 'xml'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_books', '--format', 'csv', '--param', 'price=55', stdout=out)
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual([str(self.book_2.id), str(self.book_3.id)], [row['id'] for row in rows])
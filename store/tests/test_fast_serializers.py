@@ -0,0 +1,83 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from django.contrib.auth.models import User
+
+from store.fast_serializers import FastBooksSerializer
+from store.models import Book, UserBookRelation
+from store.serializers import BooksSerializer
+
+
+def create_catalogue():
+    owner = User.objects.create(username='owner', first_name='Ann', last_name='AA')
+    books = [
+        Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=owner),
+        Book.objects.create(name='Test book 2', price='10.5', author_name='Author 2'),
+        Book.objects.create(name='Test book 3', price='99999.99', author_name='Author 1', owner=owner),
+    ]
+    for index in range(BooksSerializer.readers_limit + 2):
+        user = User.objects.create(username=f'reader{index}', first_name=f'First {index}', last_name='')
+        UserBookRelation.objects.create(user=user, book=books[0], like=index % 2 == 0, rate=index % 5 + 1)
+    UserBookRelation.objects.create(user=owner, book=books[1], rate=3)
+    return owner, books
+
+
+class FastBooksSerializerTestCase(TestCase):
+    def setUp(self):
+        create_catalogue()
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_list_identical(self):
+        queryset = Book.objects.all().order_by('id')
+        expected = BooksSerializer(queryset, many=True).data
+        rows = queryset.values(*FastBooksSerializer.values_fields())
+        self.assertEqual(self.render(expected), self.render(FastBooksSerializer(rows, many=True).data))
+
+    def test_single_identical(self):
+        book = Book.objects.get(name='Test book 2')
+        row = Book.objects.filter(pk=book.pk).values(*FastBooksSerializer.values_fields()).get()
+        self.assertEqual(self.render(BooksSerializer(book).data), self.render(FastBooksSerializer(row).data))
+
+    def test_columns_follow_serializer(self):
+        names = [name for name, source, convert, default in FastBooksSerializer.columns()]
+        self.assertEqual(list(BooksSerializer.Meta.fields), names + list(FastBooksSerializer.method_fields))
+
+
+class FastBookReadApiTestCase(APITestCase):
+    def setUp(self):
+        self.owner, self.books = create_catalogue()
+
+    def assertSameResponse(self, url, params=None):
+        responses = []
+        for enabled in (True, False):
+            with override_settings(STORE_FAST_BOOK_SERIALIZER=enabled, STORE_RESPONSE_CACHE=None):
+                response = self.client.get(url, params)
+            responses.append((response.status_code, response.content))
+        self.assertEqual(responses[0], responses[1])
+        return responses[0]
+
+    def test_list(self):
+        code, content = self.assertSameResponse(reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, code)
+
+    def test_filtered_ordered_page(self):
+        self.assertSameResponse(reverse('book-list'), {'price': '25.00', 'ordering': '-price'})
+        self.assertSameResponse(reverse('book-list'), {'search': 'Author 1', 'ordering': '-search_rank'})
+        code, content = self.assertSameResponse(reverse('book-list'), {'ordering': 'price', 'page_size': 2})
+        self.assertIn(b'"next"', content)
+
+    def test_retrieve(self):
+        for book in self.books:
+            self.assertSameResponse(reverse('book-detail', args=(book.id,)))
+
+    def test_retrieve_not_found(self):
+        code, content = self.assertSameResponse(reverse('book-detail', args=(0,)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, code)
+
+    def test_query_count(self):
+        with override_settings(STORE_RESPONSE_CACHE=None), self.assertNumQueries(2):
+            self.client.get(reverse('book-list'))
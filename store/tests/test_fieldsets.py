@@ -0,0 +1,87 @@
+from rest_framework.test import APITestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.utils.json import json
+from django.contrib.auth.models import User
+
+from store.models import Book, UserBookRelation
+
+
+@override_settings(STORE_RESPONSE_CACHE=None)
+class SparseFieldsApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username', first_name='Tom', last_name='TT')
+        self.book_1 = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.user)
+        self.book_2 = Book.objects.create(name='Test book 2', price=55, author_name='Author 5')
+        self.book_3 = Book.objects.create(name='Test book 3', price=10, author_name='Author 2')
+        UserBookRelation.objects.create(user=self.user, book=self.book_1, like=True, rate=5)
+
+    def get(self, url, data, queries=None):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, data=data)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        if queries is not None:
+            self.assertEqual(queries, len(captured))
+        return response, [query['sql'] for query in captured]
+
+    def test_slim_list(self):
+        response, queries = self.get(reverse('book-list'), {'fields': 'id,name,price'}, queries=1)
+        self.assertEqual([
+            {'id': self.book_1.id, 'name': 'Test book 1', 'price': '25.00'},
+            {'id': self.book_2.id, 'name': 'Test book 2', 'price': '55.00'},
+            {'id': self.book_3.id, 'name': 'Test book 3', 'price': '10.00'},
+        ], response.data)
+        self.assertNotIn('auth_user', queries[0])
+        self.assertNotIn('author_name', queries[0])
+
+    def test_owner_and_readers_on_request(self):
+        response, queries = self.get(reverse('book-list'), {'fields': 'id,owner_name,readers_count'}, queries=2)
+        self.assertEqual({'id': self.book_1.id, 'owner_name': 'test_username', 'readers_count': 1}, response.data[0])
+        self.assertIn('auth_user', queries[0])
+
+    def test_expand_owner(self):
+        response, queries = self.get(reverse('book-list'), {'fields': 'id', 'expand': 'owner'}, queries=1)
+        self.assertEqual({'id': self.book_1.id, 'owner': {'id': self.user.id, 'username': 'test_username'}},
+                         response.data[0])
+        self.assertEqual({'id': self.book_2.id, 'owner': None}, response.data[1])
+
+        response, queries = self.get(reverse('book-detail', args=(self.book_1.id,)), {'expand': 'owner'})
+        self.assertEqual({'id': self.user.id, 'username': 'test_username'}, response.data['owner'])
+        self.assertEqual(1, len(response.data['readers']))
+
+    def test_same_output_without_fast_serializer(self):
+        for params in ({'fields': 'id,name,price'}, {'fields': 'annotated_likes,rating,readers', 'expand': 'owner'},
+                       {'expand': 'owner'}, {'fields': 'id', 'ordering': '-price', 'page_size': 2}):
+            fast, queries = self.get(reverse('book-list'), params)
+            with override_settings(STORE_FAST_BOOK_SERIALIZER=False):
+                slow, queries = self.get(reverse('book-list'), params)
+            self.assertEqual(json.dumps(fast.data), json.dumps(slow.data))
+
+    def test_keyset_pages(self):
+        ids = []
+        url, data = reverse('book-list'), {'fields': 'id', 'ordering': 'price', 'page_size': 1}
+        while url:
+            response, queries = self.get(url, data)
+            ids += [book['id'] for book in response.data['results']]
+            url, data = response.data['next'], None
+        self.assertEqual([self.book_3.id, self.book_1.id, self.book_2.id], ids)
+
+    def test_leaderboard(self):
+        response, queries = self.get(reverse('book-leaderboard', args=('top-rated',)), {'fields': 'id,rating'},
+                                     queries=1)
+        self.assertEqual([{'id': self.book_1.id, 'rating': '5.00'}], response.data['results'])
+
+    def test_invalid(self):
+        response = self.client.get(reverse('book-list'), data={'fields': 'id,likes', 'expand': 'readers'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual({'fields', 'expand'}, set(response.data))
+
+    def test_writes_ignore_fields(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(reverse('book-detail', args=(self.book_1.id,)) + '?fields=id',
+                                     data=json.dumps({'price': '30.00'}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('30.00', response.data['price'])
@@ -0,0 +1,129 @@
+import io
+import json
+import os
+import tempfile
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.importer import BookImporter, UnreadableFile
+from store.models import Book
+
+CSV = '''name,price,author_name
+Jamila,10.50,Chingiz Aitmatov
+The White Ship,12,Chingiz Aitmatov
+Broken,abc,Nobody
+,5,Nobody
+Jamila,11,Chingiz Aitmatov
+'''
+
+
+class BookImporterTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user1')
+        self.other = User.objects.create(username='user2')
+
+    def test_csv(self):
+        rejected, progress = [], []
+        report = BookImporter(owner=self.user, chunk_size=2, on_reject=rejected.append,
+                              progress=progress.append).run(io.StringIO(CSV), 'csv')
+        self.assertEqual((5, 2, 1, 2), (report.processed, report.created, report.updated, report.rejected))
+        self.assertEqual([4, 5], [record['line'] for record in rejected])
+        self.assertIn('price', rejected[0]['errors'])
+        self.assertIn('name', rejected[1]['errors'])
+        self.assertEqual(2, len(progress))
+
+        jamila = Book.objects.get(name='Jamila')
+        self.assertEqual('11.00', str(jamila.price))
+        self.assertEqual(self.user, jamila.owner)
+        self.assertEqual(2, Book.objects.count())
+
+    def test_ndjson(self):
+        lines = [json.dumps({'name': 'Jamila', 'price': '10', 'author_name': 'Chingiz Aitmatov'}), '', 'not json',
+                 json.dumps([1, 2])]
+        rejected = []
+        report = BookImporter(on_reject=rejected.append).run(io.StringIO('\n'.join(lines)), 'ndjson')
+        self.assertEqual((3, 1, 2), (report.processed, report.created, report.rejected))
+        self.assertEqual([3, 4], [record['line'] for record in rejected])
+
+    def test_does_not_update_foreign_books(self):
+        Book.objects.create(name='Jamila', price=1, author_name='Chingiz Aitmatov', owner=self.other)
+        rejected = []
+        report = BookImporter(owner=self.user, on_reject=rejected.append).run(io.StringIO(CSV), 'csv')
+        self.assertEqual((1, 0, 4), (report.created, report.updated, report.rejected))
+        self.assertEqual('1.00', str(Book.objects.get(name='Jamila').price))
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'books.csv')
+            rejected_path = os.path.join(directory, 'rejected.ndjson')
+            with open(path, 'w') as f:
+                f.write(CSV)
+            out = io.StringIO()
+            call_command('import_books', path, owner='user1', rejected=rejected_path, stdout=out, stderr=io.StringIO())
+            with open(rejected_path) as f:
+                self.assertEqual(3, len(f.readlines()))
+        self.assertIn('2 created, 0 updated, 3 rejected', out.getvalue())
+
+    def test_duplicates_in_chunk(self):
+        rejected = []
+        report = BookImporter(on_reject=rejected.append).run(io.StringIO(CSV), 'csv')
+        self.assertEqual((2, 0, 3), (report.created, report.updated, report.rejected))
+        self.assertEqual([4, 5, 6], [record['line'] for record in rejected])
+        self.assertIn('Line 2', rejected[2]['errors']['non_field_errors'][0])
+        self.assertEqual('10.50', str(Book.objects.get(name='Jamila').price))
+
+    def test_updates_existing_book(self):
+        book = Book.objects.create(name='Jamila', price=1, author_name='Chingiz Aitmatov', owner=self.user)
+        report = BookImporter(owner=self.user, chunk_size=1).run(io.StringIO(CSV), 'csv')
+        self.assertEqual((1, 2, 2), (report.created, report.updated, report.rejected))
+        book.refresh_from_db()
+        self.assertEqual('11.00', str(book.price))
+        self.assertEqual(2, Book.objects.count())
+
+    def test_unreadable_csv(self):
+        # Past csv.field_size_limit().
+        rows = 'name,price,author_name\nJamila,10,Chingiz Aitmatov\n"%s",12,Chingiz Aitmatov\n' % ('x' * 200000)
+        with self.assertRaises(UnreadableFile) as context:
+            BookImporter().run(io.StringIO(rows), 'csv')
+        self.assertEqual(1, context.exception.report.created)
+        self.assertTrue(Book.objects.filter(name='Jamila').exists())
+
+
+class BookImportApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user1')
+        self.url = reverse('book-import')
+
+    def test_upload(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('books.csv', CSV.encode(), content_type='text/csv')
+        response = self.client.post(self.url, data={'file': upload}, format='multipart')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(2, response.data['created'])
+        self.assertEqual(3, len(response.data['rejected_rows']))
+        self.assertEqual(2, Book.objects.filter(owner=self.user).count())
+
+    def test_not_utf8(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('books.csv', 'name,price,author_name\nJämila,10,Aitmatov\n'.encode('latin-1'))
+        response = self.client.post(self.url, data={'file': upload}, format='multipart')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn('file', response.data)
+        self.assertFalse(Book.objects.exists())
+
+    def test_unknown_format(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('books.txt', CSV.encode())
+        response = self.client.post(self.url, data={'file': upload}, format='multipart')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_anonymous(self):
+        upload = SimpleUploadedFile('books.csv', CSV.encode())
+        response = self.client.post(self.url, data={'file': upload}, format='multipart')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
@@ -0,0 +1,81 @@
+import asyncio
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+from django.contrib.auth.models import User
+
+from store.db_router import ReplicaRoutingMiddleware
+from store.instrumentation import Histogram, InstrumentationMiddleware, QueryBudgetExceeded, registry
+from store.models import Book
+from store.views import BookViewSet
+
+
+class HistogramTestCase(TestCase):
+    def test_cumulative_buckets(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 10):
+            histogram.observe(value)
+        self.assertEqual([(1, 2), (5, 3), ('+Inf', 4)], list(histogram.cumulative()))
+        self.assertEqual(14, histogram.sum)
+        self.assertEqual(4, histogram.count)
+
+
+class MiddlewareModeTestCase(TestCase):
+    def test_follows_get_response(self):
+        async def get_response(request):
+            pass
+
+        for middleware in (InstrumentationMiddleware, ReplicaRoutingMiddleware):
+            # What Django 4.1's handler checks to pick the calling mode.
+            self.assertTrue(asyncio.iscoroutinefunction(middleware(get_response)))
+            self.assertFalse(asyncio.iscoroutinefunction(middleware(lambda request: None)))
+
+
+class InstrumentationApiTestCase(APITestCase):
+    def setUp(self):
+        registry.clear()
+        self.user = User.objects.create(username='test_username')
+        Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.user)
+
+    def test_records_request(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        labels = (('endpoint', 'book-list'), ('method', 'GET'))
+        self.assertEqual(2, registry.get('store_db_queries', labels).sum)
+        self.assertEqual(len(response.content), registry.get('store_response_size_bytes', labels).sum)
+        self.assertEqual(1, registry.get('store_serializer_time_seconds', labels).count)
+
+    def test_structured_log(self):
+        with self.assertLogs('store.instrumentation', 'INFO') as logs:
+            self.client.get(reverse('book-list'))
+        self.assertIn('"endpoint": "book-list"', logs.output[0])
+        self.assertIn('"db_queries": 2', logs.output[0])
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('book-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn('store_db_queries_count{endpoint="book-list",method="GET"} 1',
+                      response.content.decode())
+
+    def test_metrics_endpoint_forbidden(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    @override_settings(STORE_QUERY_BUDGET_RAISE=True)
+    def test_budget_exceeded_raises(self):
+        with mock.patch.object(BookViewSet, 'query_budget', {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('book-list'))
+
+    @override_settings(STORE_QUERY_BUDGET_RAISE=False)
+    def test_budget_exceeded_warns(self):
+        with mock.patch.object(BookViewSet, 'query_budget', {'list': 1}):
+            with self.assertLogs('store.instrumentation', 'WARNING') as logs:
+                response = self.client.get(reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn('BookViewSet.list issued 2 queries, budget is 1.', logs.output[0])
@@ -0,0 +1,72 @@
+from rest_framework.test import APITestCase
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.utils.json import json
+from django.contrib.auth.models import User
+
+from store.models import Book, UserBookRelation
+
+
+class LeaderboardApiTestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        self.books = [
+            Book.objects.create(name='Test Book 1', price=25, author_name='Author 1'),
+            Book.objects.create(name='Test Book 2', price=55, author_name='Author 2'),
+            Book.objects.create(name='Test Book 3', price=55, author_name='Author 1'),
+            Book.objects.create(name='Test Book 4', price=10, author_name='Author 1'),
+        ]
+        for user, rates in zip(self.users, [(5, 3, 5, None), (4, 3, None, None), (None, None, 4, None)]):
+            for book, rate in zip(self.books, rates):
+                if rate is not None:
+                    UserBookRelation.objects.create(user=user, book=book, rate=rate, like=rate >= 4)
+
+    def ids(self, board, data=None):
+        url = reverse('book-leaderboard', args=(board,))
+        ids = []
+        while url:
+            response = self.client.get(url, data=data)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            ids += [book['id'] for book in response.data['results']]
+            url, data = response.data['next'], None
+        return ids
+
+    def test_top_rated(self):
+        # Book 1 and 3 tie on 4.50, the newer book ranks first.
+        self.assertEqual([self.books[2].id, self.books[0].id, self.books[1].id], self.ids('top-rated'))
+
+    def test_most_liked(self):
+        self.assertEqual([self.books[2].id, self.books[0].id], self.ids('most-liked'))
+
+    def test_per_author(self):
+        self.assertEqual([self.books[2].id, self.books[0].id], self.ids('top-rated', {'author': 'Author 1'}))
+        self.assertEqual([], self.ids('most-liked', {'author': 'Author 2'}))
+
+    def test_cursor_pages(self):
+        response = self.client.get(reverse('book-leaderboard', args=('top-rated',)), data={'page_size': 1})
+        self.assertEqual([self.books[2].id], [book['id'] for book in response.data['results']])
+        self.assertEqual([self.books[2].id, self.books[0].id, self.books[1].id],
+                         self.ids('top-rated', {'page_size': 1}))
+
+    def test_same_rows_as_list(self):
+        response = self.client.get(reverse('book-leaderboard', args=('top-rated',)))
+        book = self.client.get(reverse('book-detail', args=(self.books[2].id,))).data
+        self.assertEqual(book, response.data['results'][0])
+
+    @override_settings(STORE_FAST_BOOK_SERIALIZER=False)
+    def test_model_serializer(self):
+        self.assertEqual([self.books[2].id, self.books[0].id, self.books[1].id], self.ids('top-rated'))
+
+    def test_follows_relation_changes(self):
+        self.client.get(reverse('book-leaderboard', args=('most-liked',)))
+        self.client.force_authenticate(self.users[2])
+        self.client.patch(reverse('user-book-relation-detail', args=(self.books[3].id,)),
+                          data=json.dumps({'like': True, 'rate': 5}), content_type='application/json')
+        self.client.force_authenticate(None)
+        self.assertEqual(self.books[3].id, self.ids('top-rated')[0])
+        self.assertIn(self.books[3].id, self.ids('most-liked'))
+
+    def test_unknown_board(self):
+        response = self.client.get('/book/leaderboard/cheapest/')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
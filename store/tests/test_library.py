@@ -0,0 +1,107 @@
+from rest_framework.test import APITestCase
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.utils.json import json
+from django.contrib.auth.models import User
+
+from store.models import Book, UserBookRelation
+
+
+class LibraryApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.other = User.objects.create(username='other_username')
+        self.books = [Book.objects.create(name=f'Test book {i}', price=25, author_name='Author 1') for i in range(4)]
+        UserBookRelation.objects.create(user=self.user, book=self.books[0], in_bookmarks=True, rate=4)
+        UserBookRelation.objects.create(user=self.user, book=self.books[1], like=True)
+        UserBookRelation.objects.create(user=self.user, book=self.books[2], in_bookmarks=True, like=True)
+        UserBookRelation.objects.create(user=self.other, book=self.books[3], in_bookmarks=True, like=True, rate=5)
+        self.client.force_authenticate(self.user)
+
+    def shelf(self, shelf, data=None):
+        url = reverse('library', args=(shelf,))
+        ids = []
+        while url:
+            response = self.client.get(url, data=data)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            ids += [item['book']['id'] for item in response.data['results']]
+            url, data = response.data['next'], None
+        return ids
+
+    def test_shelves(self):
+        self.assertEqual([self.books[2].id, self.books[0].id], self.shelf('bookmarks'))
+        self.assertEqual([self.books[2].id, self.books[1].id], self.shelf('likes'))
+        self.assertEqual([self.books[0].id], self.shelf('rated'))
+
+    def test_pages(self):
+        self.assertEqual([self.books[2].id, self.books[0].id], self.shelf('bookmarks', {'page_size': 1}))
+
+    def test_item(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('library', args=('rated',)))
+        self.assertEqual([{
+            'book': {'id': self.books[0].id, 'name': 'Test book 0', 'price': '25.00', 'author_name': 'Author 1',
+                     'annotated_likes': 0, 'rating': '4.00'},
+            'like': False, 'in_bookmarks': True, 'rate': 4,
+        }], response.data['results'])
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse('library', args=('likes',)))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+
+@override_settings(STORE_RESPONSE_CACHE={'BACKEND': 'store.caching.LocMemLRUBackend'})
+class OwnRelationApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.other = User.objects.create(username='other_username')
+        self.books = [Book.objects.create(name=f'Test book {i}', price=25, author_name='Author 1') for i in range(2)]
+        UserBookRelation.objects.create(user=self.user, book=self.books[0], in_bookmarks=True, rate=4)
+        UserBookRelation.objects.create(user=self.other, book=self.books[1], like=True)
+
+    def own_relations(self, url=None):
+        response = self.client.get(url or reverse('book-list'), data={'own_relation': 'true'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [book['own_relation'] for book in response.data]
+
+    def test_annotation(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(2):
+            relations = self.own_relations()
+        self.assertEqual([{'like': False, 'in_bookmarks': True, 'rate': 4}, None], relations)
+
+        response = self.client.get(reverse('book-detail', args=(self.books[0].id,)), data={'own_relation': '1'})
+        self.assertEqual({'like': False, 'in_bookmarks': True, 'rate': 4}, response.data['own_relation'])
+
+    @override_settings(STORE_FAST_BOOK_SERIALIZER=False)
+    def test_model_serializer(self):
+        self.client.force_authenticate(self.other)
+        self.assertEqual([None, {'like': True, 'in_bookmarks': False, 'rate': None}], self.own_relations())
+
+    def test_not_requested(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('book-list'))
+        self.assertNotIn('own_relation', response.data[0])
+
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse('book-list'), data={'own_relation': 'true'})
+        self.assertNotIn('own_relation', response.data[0])
+
+    def test_cached_per_user(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual({'like': False, 'in_bookmarks': True, 'rate': 4}, self.own_relations()[0])
+        self.client.force_authenticate(self.other)
+        self.assertEqual([None, {'like': True, 'in_bookmarks': False, 'rate': None}], self.own_relations())
+
+    def test_follows_own_changes(self):
+        self.client.force_authenticate(self.user)
+        first = self.client.get(reverse('book-list'), data={'own_relation': 'true'})
+        self.client.patch(reverse('user-book-relation-detail', args=(self.books[0].id,)),
+                          data=json.dumps({'in_bookmarks': False}), content_type='application/json')
+        # The ETag follows the body, so it changes with the caller's own relation.
+        response = self.client.get(reverse('book-list'), data={'own_relation': 'true'},
+                                   HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'like': False, 'in_bookmarks': False, 'rate': 4}, self.own_relations()[0])
@@ -0,0 +1,91 @@
+from io import StringIO
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from store.models import Book, UserBookRelation
+from store.likes_process import set_likes, find_likes_drift
+
+
+class LikesCountTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.book_1 = Book.objects.create(name='Test Book 1', price=100, author_name='Author 1')
+        self.book_2 = Book.objects.create(name='Test Book 2', price=200, author_name='Author 2')
+
+    def likes(self, book):
+        book.refresh_from_db()
+        return book.likes_count
+
+    def test_create_change_delete(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, like=True)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, like=False)
+        self.assertEqual(1, self.likes(self.book_1))
+
+        relation.like = False
+        relation.save()
+        self.assertEqual(0, self.likes(self.book_1))
+
+        relation.like = True
+        relation.rate = 4
+        with self.assertNumQueries(2):
+            relation.save()
+        self.assertEqual(1, self.likes(self.book_1))
+
+        relation.delete()
+        self.assertEqual(0, self.likes(self.book_1))
+        self.assertEqual(0, self.likes(self.book_2))
+
+    def test_set_likes(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, like=True)
+        Book.objects.filter(pk=self.book_1.pk).update(likes_count=7)
+        set_likes(self.book_1)
+        self.assertEqual(1, self.likes(self.book_1))
+
+    def test_check_likes(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, like=True)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, like=True)
+        self.assertEqual([], find_likes_drift())
+
+        Book.objects.filter(pk=self.book_1.pk).update(likes_count=0)
+        self.assertEqual([(self.book_1.id, 0, 2)], find_likes_drift(batch_size=1))
+        with self.assertRaises(CommandError):
+            call_command('check_likes', stdout=StringIO())
+
+        call_command('check_likes', '--fix', stdout=StringIO())
+        self.assertEqual(2, self.likes(self.book_1))
+        self.assertEqual([], find_likes_drift())
+
+    def test_queryset_delete_and_cascade(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, like=True)
+        UserBookRelation.objects.create(user=self.user1, book=self.book_2, like=True)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, like=True)
+
+        UserBookRelation.objects.filter(book=self.book_2).delete()
+        self.assertEqual(0, self.likes(self.book_2))
+        self.user1.delete()
+        self.assertEqual(1, self.likes(self.book_1))
+        self.assertEqual([], find_likes_drift())
+
+    def test_deferred_like(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, like=True)
+        relation = UserBookRelation.objects.only('id', 'book_id', 'in_bookmarks').get()
+        relation.like = False
+        relation.save()
+        self.assertEqual(0, self.likes(self.book_1))
+
+        relation = UserBookRelation.objects.defer('like').get()
+        relation.delete()
+        self.assertEqual(0, self.likes(self.book_1))
+
+    def test_refresh_from_db(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, like=True)
+        UserBookRelation.objects.filter(pk=relation.pk).update(like=False)
+        Book.objects.filter(pk=self.book_1.pk).update(likes_count=0)
+        relation.refresh_from_db()
+        relation.like = True
+        relation.save()
+        self.assertEqual(1, self.likes(self.book_1))
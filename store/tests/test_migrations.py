@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class RemoveDuplicateRelationsMigrationTestCase(TransactionTestCase):
+    migrate_from = [('store', '0010_book_search_vector')]
+    migrate_to = [('store', '0011_userbookrelation_user_book_uniq')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        if 'store' not in executor.loader.migrated_apps:
+            self.skipTest('store migrations are disabled')
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        User = apps.get_model('auth', 'User')
+        Book = apps.get_model('store', 'Book')
+        UserBookRelation = apps.get_model('store', 'UserBookRelation')
+
+        user_1 = User.objects.create(username='user1')
+        user_2 = User.objects.create(username='user2')
+        # Counters as 0007 and 0008 filled them, duplicate included.
+        book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', likes_count=2,
+                                   rating_sum=13, rating_count=3, rating=Decimal('4.33'))
+        other = Book.objects.create(name='Test book 2', price=55, author_name='Author 2', likes_count=1,
+                                    rating_sum=2, rating_count=1, rating=Decimal('2.00'))
+        UserBookRelation.objects.create(user=user_1, book=book, like=True, rate=5)
+        UserBookRelation.objects.create(user=user_1, book=book, like=True, rate=5)
+        UserBookRelation.objects.create(user=user_2, book=book, rate=4)
+        UserBookRelation.objects.create(user=user_1, book=other, like=True, rate=2)
+        self.book_id, self.other_id = book.id, other.id
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_recounts_affected_books(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        apps = executor.loader.project_state(self.migrate_to).apps
+        Book = apps.get_model('store', 'Book')
+        UserBookRelation = apps.get_model('store', 'UserBookRelation')
+
+        self.assertEqual(2, UserBookRelation.objects.filter(book_id=self.book_id).count())
+        fields = ('likes_count', 'rating_sum', 'rating_count', 'rating')
+        self.assertEqual((1, 9, 2, Decimal('4.50')), Book.objects.values_list(*fields).get(pk=self.book_id))
+        self.assertEqual((1, 2, 1, Decimal('2.00')), Book.objects.values_list(*fields).get(pk=self.other_id))
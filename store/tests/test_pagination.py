@@ -0,0 +1,80 @@
+import base64
+import json
+
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+
+from store.models import Book
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.books = [
+            Book.objects.create(name='Test Book 1', price=25, author_name='Author 1', owner=self.user),
+            Book.objects.create(name='Test Book 2', price=55, author_name='Author 5'),
+            Book.objects.create(name='Test Book 3', price=55, author_name='Author 2'),
+            Book.objects.create(name='Test Book 4', price=10, author_name='Author 3'),
+            Book.objects.create(name='Test Book 5', price=55, author_name='Author 4'),
+        ]
+
+    def walk(self, data):
+        url = reverse('book-list')
+        ids = []
+        while url:
+            response = self.client.get(url, data=data)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            ids += [book['id'] for book in response.data['results']]
+            url, data = response.data['next'], None
+        return ids
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(5, len(response.data))
+
+    def test_pages_by_id(self):
+        response = self.client.get(reverse('book-list'), data={'page_size': 2})
+        self.assertEqual([self.books[0].id, self.books[1].id],
+                         [book['id'] for book in response.data['results']])
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual([book.id for book in self.books], self.walk({'page_size': 2}))
+
+    def test_pages_with_ordering_ties(self):
+        expected = list(Book.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(expected, self.walk({'page_size': 2, 'ordering': 'price'}))
+
+        expected = list(Book.objects.order_by('-price', 'id').values_list('id', flat=True))
+        self.assertEqual(expected, self.walk({'page_size': 1, 'ordering': '-price'}))
+
+    def test_pages_with_filter_and_search(self):
+        expected = [self.books[1].id, self.books[2].id, self.books[4].id]
+        self.assertEqual(expected, self.walk({'page_size': 1, 'price': 55}))
+        self.assertEqual([self.books[0].id], self.walk({'page_size': 1, 'search': 'Author 1'}))
+
+    def test_page_query_count(self):
+        first = self.client.get(reverse('book-list'), data={'page_size': 2})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(first.data['next'])
+            self.assertEqual(2, len(queries))
+        self.assertEqual([self.books[2].id, self.books[3].id],
+                         [book['id'] for book in response.data['results']])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('book-list'), data={'cursor': 'garbage'})
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_ill_typed_cursor_value(self):
+        for ordering, values in ((['id'], ['abc']), (['price', 'id'], ['zz', 1]), (['price', 'id'], [[], 1])):
+            cursor = base64.urlsafe_b64encode(json.dumps({'o': ordering, 'v': values}).encode()).decode()
+            response = self.client.get(reverse('book-list'), data={'cursor': cursor, 'ordering': ordering[0]})
+            self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code, values)
+
+    def test_cursor_from_other_ordering(self):
+        first = self.client.get(reverse('book-list'), data={'page_size': 2, 'ordering': 'price'})
+        response = self.client.get(first.data['next'].replace('ordering=price', 'ordering=author_name'))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
@@ -0,0 +1,79 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework.utils.json import json
+from django.contrib.auth.models import AnonymousUser, User
+
+from store.models import Book
+from store.permissions import annotate_writable, can_write_book, writable_book_ids
+
+
+class WritableBooksTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        self.other = User.objects.create(username='other')
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.book_1 = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.owner)
+        self.book_2 = Book.objects.create(name='Test book 2', price=55, author_name='Author 2')
+        self.ids = [self.book_1.id, self.book_2.id, 0]
+
+    def test_can_write_book(self):
+        self.assertTrue(can_write_book(self.owner, self.book_1))
+        self.assertFalse(can_write_book(self.other, self.book_1))
+        self.assertTrue(can_write_book(self.staff, self.book_2))
+        self.assertFalse(can_write_book(AnonymousUser(), self.book_2))
+
+    def test_writable_book_ids(self):
+        with self.assertNumQueries(1):
+            self.assertEqual({self.book_1.id}, writable_book_ids(self.owner, self.ids))
+        self.assertEqual(set(), writable_book_ids(self.other, self.ids))
+        self.assertEqual({self.book_1.id, self.book_2.id}, writable_book_ids(self.staff, self.ids))
+        with self.assertNumQueries(0):
+            self.assertEqual(set(), writable_book_ids(AnonymousUser(), self.ids))
+
+    def test_annotate_writable(self):
+        for user, expected in ((self.owner, [True, False]), (self.other, [False, False]),
+                               (self.staff, [True, True]), (AnonymousUser(), [False, False])):
+            books = annotate_writable(Book.objects.order_by('id'), user)
+            self.assertEqual(expected, [book.user_can_write for book in books])
+
+
+class BookWritePermissionApiTestCase(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        self.other = User.objects.create(username='other')
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.owner)
+        self.url = reverse('book-detail', args=(self.book.id,))
+
+    def patch(self, data):
+        return self.client.patch(self.url, data=json.dumps(data), content_type='application/json')
+
+    def test_rejected_in_one_query(self):
+        self.client.force_authenticate(self.other)
+        with self.assertNumQueries(1):
+            response = self.patch({'price': '1.00'})
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(self.url)
+        self.assertEqual(1, len(queries))
+        self.assertNotIn('auth_user', queries[0]['sql'])
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        self.assertTrue(Book.objects.filter(id=self.book.id).exists())
+
+    def test_owner_update(self):
+        self.client.force_authenticate(self.owner)
+        with self.assertNumQueries(3):
+            response = self.patch({'price': '30.00'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(('30.00', 'owner', 0, []), (response.data['price'], response.data['owner_name'],
+                                                    response.data['readers_count'], response.data['readers']))
+
+    def test_owner_delete(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.delete(self.url)
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertFalse(Book.objects.filter(id=self.book.id).exists())
@@ -1,8 +1,12 @@
+from io import StringIO
+
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import IntegerField, Value
 
 from store.models import Book, UserBookRelation
-from store.rating_process import set_rating
+from store.rating_process import compute_rating, rating_expression, set_rating, rebuild_ratings
 
 
 class SetRatingTestCase(TestCase):
@@ -22,3 +26,64 @@ class SetRatingTestCase(TestCase):
         set_rating(self.book_1)
         self.book_1.refresh_from_db()
         self.assertEqual('3.50', str(self.book_1.rating))
+
+
+class UpdateRatingTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.book_1 = Book.objects.create(name='Test Book 1', price=100, author_name='Author 1')
+
+    def assertRating(self, rating, rating_sum, rating_count):
+        self.book_1.refresh_from_db()
+        self.assertEqual(rating, None if self.book_1.rating is None else str(self.book_1.rating))
+        self.assertEqual(rating_sum, self.book_1.rating_sum)
+        self.assertEqual(rating_count, self.book_1.rating_count)
+
+    def test_create_change_delete(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=4)
+        self.assertRating('4.00', 4, 1)
+
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, rate=1)
+        self.assertRating('2.50', 5, 2)
+
+        relation.rate = 5
+        relation.save()
+        self.assertRating('3.00', 6, 2)
+
+        relation.rate = None
+        relation.save()
+        self.assertRating('1.00', 1, 1)
+
+        UserBookRelation.objects.get(user=self.user2).delete()
+        self.assertRating(None, 0, 0)
+
+    def test_bookmark_does_not_touch_book(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=3)
+        relation.in_bookmarks = True
+        with self.assertNumQueries(1):
+            relation.save()
+
+    def test_rebuild(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=3)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, rate=4)
+        Book.objects.filter(pk=self.book_1.pk).update(rating=None, rating_sum=100, rating_count=1)
+
+        out = StringIO()
+        call_command('rebuild_ratings', stdout=out)
+        self.assertIn('1 book(s)', out.getvalue())
+        self.assertRating('3.50', 7, 2)
+
+        self.assertEqual(0, rebuild_ratings())
+
+
+class RatingRoundingTestCase(TestCase):
+    def test_sql_matches_python(self):
+        book = Book.objects.create(name='Test Book 1', price=100, author_name='Author 1')
+        # 107 / 40 = 2.675 is 2.67499... as a float; the rest end in 5 too.
+        for rating_sum, rating_count in [(107, 40), (21, 8), (5, 2), (10, 3), (11, 6), (4, 1), (1, 200), (0, 0)]:
+            rating = Book.objects.filter(pk=book.pk).annotate(value=rating_expression(
+                Value(rating_sum, IntegerField()), Value(rating_count, IntegerField()))).get().value
+            self.assertEqual(compute_rating(rating_sum, rating_count), rating, (rating_sum, rating_count))
+        self.assertEqual('2.68', str(compute_rating(107, 40)))
+        self.assertEqual('3.00', str(compute_rating(6, 2)))
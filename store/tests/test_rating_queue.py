@@ -0,0 +1,107 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.utils.json import json
+from django.contrib.auth.models import User
+
+from store.models import Book, RatingQueue, UserBookRelation
+from store.rating_process import enqueue_rating, process_rating_queue, rating_totals
+
+
+@override_settings(STORE_RATING_MODE='deferred')
+class RatingQueueTestCase(TestCase):
+    def setUp(self):
+        self.user_1 = User.objects.create(username='user1')
+        self.user_2 = User.objects.create(username='user2')
+        self.book_1 = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+        self.book_2 = Book.objects.create(name='Test book 2', price=55, author_name='Author 2')
+
+    def test_rates_are_appended(self):
+        relation = UserBookRelation.objects.create(user=self.user_1, book=self.book_1, rate=5, like=True)
+        relation.rate = 3
+        relation.save()
+        UserBookRelation.objects.create(user=self.user_2, book=self.book_1, rate=4)
+
+        self.book_1.refresh_from_db()
+        self.assertEqual((None, 0, 1), (self.book_1.rating, self.book_1.rating_count, self.book_1.likes_count))
+        self.assertEqual([self.book_1.id] * 3, list(RatingQueue.objects.values_list('book_id', flat=True)))
+
+    def test_rate_leaves_book_alone(self):
+        relation = UserBookRelation.objects.create(user=self.user_1, book=self.book_1, rate=5)
+        relation.rate = 3
+        with CaptureQueriesContext(connection) as queries:
+            relation.save()
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(2, len(statements), statements)
+        self.assertFalse([sql for sql in statements if 'store_book' in sql or 'CONFLICT' in sql], statements)
+
+    def test_like_is_not_queued(self):
+        UserBookRelation.objects.create(user=self.user_1, book=self.book_1, like=True)
+        self.assertFalse(RatingQueue.objects.exists())
+
+    def test_process(self):
+        UserBookRelation.objects.create(user=self.user_1, book=self.book_1, rate=5)
+        UserBookRelation.objects.create(user=self.user_2, book=self.book_1, rate=4)
+        relation = UserBookRelation.objects.create(user=self.user_1, book=self.book_2, rate=2)
+        relation.delete()
+
+        # savepoint, claim, lock books, aggregate, update, delete, release
+        with self.assertNumQueries(7):
+            self.assertEqual(2, process_rating_queue())
+        self.assertFalse(RatingQueue.objects.exists())
+
+        self.book_1.refresh_from_db()
+        self.book_2.refresh_from_db()
+        self.assertEqual(('4.50', 9, 2), (str(self.book_1.rating), self.book_1.rating_sum, self.book_1.rating_count))
+        self.assertEqual((None, 0, 0), (self.book_2.rating, self.book_2.rating_sum, self.book_2.rating_count))
+        self.assertEqual(0, process_rating_queue())
+
+    def test_batches(self):
+        UserBookRelation.objects.create(user=self.user_1, book=self.book_1, rate=5)
+        UserBookRelation.objects.create(user=self.user_1, book=self.book_2, rate=3)
+        self.assertEqual(1, process_rating_queue(batch_size=1))
+        self.assertEqual(1, RatingQueue.objects.count())
+
+    def test_requeued_while_processing(self):
+        UserBookRelation.objects.create(user=self.user_1, book=self.book_1, rate=5)
+
+        def rate_again(book_ids):
+            enqueue_rating(self.book_1.id)
+            return rating_totals(book_ids)
+
+        with mock.patch('store.rating_process.rating_totals', side_effect=rate_again):
+            process_rating_queue()
+        self.assertTrue(RatingQueue.objects.filter(book=self.book_1).exists())
+
+    def test_command(self):
+        UserBookRelation.objects.create(user=self.user_1, book=self.book_1, rate=5)
+        out = StringIO()
+        call_command('process_rating_queue', stdout=out)
+        self.assertIn('Recomputed the rating of 1 book(s).', out.getvalue())
+        self.book_1.refresh_from_db()
+        self.assertEqual('5.00', str(self.book_1.rating))
+
+
+@override_settings(STORE_RATING_MODE='deferred')
+class DeferredRatingApiTestCase(APITestCase):
+    def test_patch(self):
+        user = User.objects.create(username='test_username')
+        book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+        self.client.force_authenticate(user)
+        url = reverse('user-book-relation-detail', args=(book.id,))
+
+        response = self.client.patch(url, data=json.dumps({'rate': 4}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        book.refresh_from_db()
+        self.assertIsNone(book.rating)
+
+        process_rating_queue()
+        book.refresh_from_db()
+        self.assertEqual('4.00', str(book.rating))
@@ -0,0 +1,111 @@
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Q
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+
+from store import recommendations
+from store.models import Book, SimilarBook, UserBookRelation
+from store.recommendations import SimilarityJob, load_signals
+
+
+def similar_ids(book):
+    return list(SimilarBook.objects.filter(book=book).order_by('rank').values_list('similar_id', flat=True))
+
+
+@skipUnless(recommendations.sparse is not None, 'needs numpy and scipy')
+class SimilarityJobTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}') for i in range(4)]
+        self.books = [Book.objects.create(name=f'Test book {i}', price=25, author_name='Author 1') for i in range(5)]
+        signals = {
+            0: [(0, {'like': True}), (1, {'like': True}), (2, {'rate': 4})],
+            1: [(0, {'like': True}), (1, {'rate': 5}), (3, {'like': True})],
+            2: [(0, {'like': True}), (1, {'like': True}), (2, {'like': True}), (3, {'rate': 2})],
+            3: [(2, {'like': True}), (4, {'rate': 1})],
+        }
+        for user, relations in signals.items():
+            for book, fields in relations:
+                UserBookRelation.objects.create(user=self.users[user], book=self.books[book], **fields)
+
+    def test_neighbours(self):
+        result = SimilarityJob(min_support=1, processes=1).run()
+        self.assertEqual({'books': 4, 'neighbours': 10}, result)
+        # Book 0 shares all three readers with book 1, two with book 2 and one
+        # with book 3. Low rates are not signals, so book 4 has no readers.
+        self.assertEqual([self.books[1].id, self.books[2].id, self.books[3].id], similar_ids(self.books[0]))
+        self.assertEqual([self.books[0].id, self.books[1].id], similar_ids(self.books[2]))
+        self.assertEqual([], similar_ids(self.books[4]))
+
+        scores = SimilarBook.objects.filter(book=self.books[0]).order_by('rank').values_list('score', flat=True)
+        for score, expected in zip(scores, [1, 2 / 3, 1 / 3 ** 0.5]):
+            self.assertAlmostEqual(expected, score, places=6)
+
+    def test_min_support_and_limit(self):
+        SimilarityJob(limit=1, min_support=2, processes=1).run()
+        self.assertEqual([self.books[1].id], similar_ids(self.books[0]))
+        self.assertEqual([], similar_ids(self.books[3]))
+
+    def test_worker_processes(self):
+        SimilarityJob(min_support=1, processes=1).run()
+        expected = list(SimilarBook.objects.order_by('book', 'rank').values_list('book', 'similar', 'rank'))
+        SimilarityJob(min_support=1, chunk_size=1, processes=2).run()
+        self.assertEqual(expected, list(SimilarBook.objects.order_by('book', 'rank').values_list(
+            'book', 'similar', 'rank')))
+
+    def test_replaces_stale_neighbours(self):
+        SimilarityJob(min_support=1, processes=1).run()
+        UserBookRelation.objects.filter(book=self.books[3]).delete()
+        SimilarityJob(min_support=1, processes=1).run()
+        self.assertFalse(SimilarBook.objects.filter(book=self.books[3]).exists())
+        self.assertNotIn(self.books[3].id, similar_ids(self.books[0]))
+
+    def test_load_signals(self):
+        expected = sorted(UserBookRelation.objects.filter(Q(like=True) | Q(rate__gte=4)).values_list('user_id', 'book_id'))
+        for batch_size in (1, 2, 100):
+            self.assertEqual(expected, sorted(map(tuple, load_signals(batch_size).tolist())))
+
+    def test_command(self):
+        call_command('compute_similar_books', '--processes=1', '--min-support=1', verbosity=0)
+        self.assertEqual(10, SimilarBook.objects.count())
+
+
+@mock.patch.object(recommendations, 'sparse', None)
+class MissingDependenciesTestCase(TestCase):
+    def test_command(self):
+        with self.assertRaises(CommandError):
+            call_command('compute_similar_books', verbosity=0)
+
+
+class SimilarBooksApiTestCase(APITestCase):
+    def setUp(self):
+        self.books = [Book.objects.create(name=f'Test book {i}', price=25, author_name='Author 1') for i in range(3)]
+        now = timezone.now()
+        SimilarBook.objects.bulk_create([
+            SimilarBook(book=self.books[0], similar=self.books[2], rank=1, score=0.75, computed_at=now),
+            SimilarBook(book=self.books[0], similar=self.books[1], rank=2, score=0.5, computed_at=now),
+        ])
+
+    def test_get(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('book-similar', args=(self.books[0].id,)))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.books[2].id, self.books[1].id], [book['id'] for book in response.data])
+        self.assertEqual({'id': self.books[2].id, 'name': 'Test book 2', 'price': '25.00', 'author_name': 'Author 1',
+                          'annotated_likes': 0, 'rating': None, 'score': 0.75}, response.data[0])
+
+    def test_no_neighbours(self):
+        response = self.client.get(reverse('book-similar', args=(self.books[1].id,)))
+        self.assertEqual([], response.data)
+
+    def test_unknown_book(self):
+        response = self.client.get(reverse('book-similar', args=(0,)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        response = self.client.get(reverse('book-similar', args=('abc',)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
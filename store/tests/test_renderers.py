@@ -0,0 +1,110 @@
+import gzip
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+
+from store import compression, renderers
+from store.compression import choose_coding
+from store.models import Book, UserBookRelation
+from store.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTestCase(SimpleTestCase):
+    def test_same_bytes(self):
+        data = {'price': Decimal('25.00'), 'name': 'Ünïcode  ', 'score': 0.6666666666666666,
+                'when': timezone.now(), 'readers': [{'first_name': 'Tom'}], 'owner': None, 1: True}
+        self.assertEqual(JSONRenderer().render(data), FastJSONRenderer().render(data))
+
+    def test_indent(self):
+        self.assertEqual(b'{\n  "id": 1\n}', FastJSONRenderer().render({'id': 1}, 'application/json; indent=2'))
+
+    @mock.patch.object(renderers, 'orjson', None)
+    def test_without_orjson(self):
+        data = {'price': Decimal('25.00'), 'name': 'Ünïcode'}
+        self.assertEqual(JSONRenderer().render(data), FastJSONRenderer().render(data))
+
+
+class ChooseCodingTestCase(SimpleTestCase):
+    def test_choose(self):
+        self.assertEqual('gzip', choose_coding('gzip, deflate'))
+        self.assertIsNone(choose_coding('deflate, gzip;q=0'))
+        self.assertIsNone(choose_coding(''))
+        if compression.zstandard is not None:
+            self.assertEqual('zstd', choose_coding('gzip, zstd'))
+            self.assertEqual('gzip', choose_coding('gzip;q=1, zstd;q=0.5'))
+
+    def test_without_zstandard(self):
+        with mock.patch.dict(compression.CODINGS):
+            compression.CODINGS.pop('zstd', None)
+            self.assertEqual('gzip', choose_coding('zstd, gzip'))
+            self.assertIsNone(choose_coding('zstd'))
+
+
+@override_settings(STORE_RESPONSE_CACHE=None, STORE_COMPRESSION_MIN_SIZE=100)
+class FormatsApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username', first_name='Tom', last_name='TT')
+        self.books = [Book.objects.create(name=f'Test book {i}', price=25, author_name='Author 1', owner=self.user)
+                      for i in range(5)]
+        UserBookRelation.objects.create(user=self.user, book=self.books[0], like=True, rate=5)
+
+    def test_gzip(self):
+        plain = self.client.get(reverse('book-list'))
+        response = self.client.get(reverse('book-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(plain.content, gzip.decompress(response.content))
+
+    def test_small_responses_stay_plain(self):
+        response = self.client.get(reverse('book-detail', args=(self.books[1].id,)), {'fields': 'id'},
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_gzip_streaming_export(self):
+        response = self.client.get(reverse('book-export'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertEqual(5, len(gzip.decompress(b''.join(response.streaming_content)).splitlines()))
+
+    @skipUnless(compression.zstandard is not None, 'needs zstandard')
+    def test_zstd(self):
+        plain = self.client.get(reverse('book-list'))
+        response = self.client.get(reverse('book-list'), HTTP_ACCEPT_ENCODING='zstd, gzip')
+        self.assertEqual('zstd', response['Content-Encoding'])
+        decompressor = compression.zstandard.ZstdDecompressor()
+        self.assertEqual(plain.content, decompressor.decompressobj().decompress(response.content))
+
+    @skipUnless(renderers.msgpack is not None, 'needs msgpack')
+    def test_msgpack(self):
+        plain = self.client.get(reverse('book-list'))
+        response = self.client.get(reverse('book-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual('application/msgpack', response['Content-Type'])
+        self.assertEqual(plain.json(), renderers.msgpack.unpackb(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+
+    @skipUnless(renderers.msgpack is not None, 'needs msgpack')
+    def test_msgpack_request(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(reverse('user-book-relation-detail', args=(self.books[1].id,)),
+                                     data=renderers.msgpack.packb({'like': True, 'rate': 4}),
+                                     content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        data = renderers.msgpack.unpackb(response.content)
+        self.assertEqual((True, False, 4), (data['like'], data['in_bookmarks'], data['rate']))
+        self.assertEqual(4, UserBookRelation.objects.get(user=self.user, book=self.books[1]).rate)
+
+        response = self.client.patch(reverse('user-book-relation-detail', args=(self.books[1].id,)),
+                                     data=b'\xc1', content_type='application/msgpack')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    @mock.patch.object(renderers, 'msgpack', None)
+    def test_without_msgpack(self):
+        response = self.client.get(reverse('book-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(status.HTTP_406_NOT_ACCEPTABLE, response.status_code)
@@ -0,0 +1,48 @@
+from unittest import skipUnless
+
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.db import connection
+
+from store.models import Book
+
+
+class BookSearchTestCase(APITestCase):
+    def setUp(self):
+        self.book_1 = Book.objects.create(name='Warrior of the Steppe', price=25, author_name='Manas')
+        self.book_2 = Book.objects.create(name='Jamila', price=55, author_name='Chingiz Aitmatov')
+        self.book_3 = Book.objects.create(name='The White Ship', price=55, author_name='Chingiz Aitmatov')
+
+    def search(self, **params):
+        response = self.client.get(reverse('book-list'), data=params)
+        return [book['id'] for book in response.data]
+
+    def test_search(self):
+        self.assertEqual([self.book_2.id, self.book_3.id], self.search(search='Aitmatov'))
+        self.assertEqual([self.book_3.id], self.search(search='ship'))
+
+    def test_search_with_filter(self):
+        self.assertEqual([self.book_2.id, self.book_3.id], self.search(search='Chingiz', price=55))
+        self.assertEqual([], self.search(search='Chingiz', price=25))
+
+    def test_ordering_by_rank_without_search(self):
+        self.assertEqual([self.book_1.id, self.book_2.id, self.book_3.id], self.search(ordering='-search_rank'))
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL full-text search')
+    def test_prefix(self):
+        self.assertEqual([self.book_2.id, self.book_3.id], self.search(search='Aitma'))
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL trigram search')
+    def test_typo(self):
+        self.assertEqual([self.book_2.id, self.book_3.id], self.search(search='Aitmatof'))
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL full-text search')
+    def test_rank(self):
+        Book.objects.create(name='Aitmatov: a biography', price=10, author_name='Unknown')
+        self.assertEqual(self.book_2.id, self.search(search='Jamila Aitmatov', ordering='-search_rank')[0])
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL full-text search')
+    def test_vector_follows_rename(self):
+        self.book_1.name = 'Semetey'
+        self.book_1.save()
+        self.assertEqual([self.book_1.id], self.search(search='Semetey'))
@@ -37,6 +37,7 @@ class BookSerializerTestCase(TestCase):
                 'annotated_likes': 1,
                 'rating': '5.00',
                 'owner_name': 'user1',
+                'readers_count': 2,
                 'readers': [
                     {
                         'first_name': 'Tom',
@@ -56,6 +57,7 @@ class BookSerializerTestCase(TestCase):
                 'annotated_likes': 0,
                 'rating': '4.00',
                 'owner_name': '',
+                'readers_count': 1,
                 'readers': [
                     {
                         'first_name': 'John',
@@ -67,3 +69,26 @@ class BookSerializerTestCase(TestCase):
         print('********expect', expected_data)
         print('********data', data)
         self.assertEqual(expected_data, data)
+
+
+class BookTopReadersTestCase(TestCase):
+    def test_top_readers(self):
+        users = [User.objects.create(username=f'user{i}', first_name=f'Name{i}') for i in range(4)]
+        book_1 = Book.objects.create(name='Test Book 1', price=100, author_name='Author 1')
+        book_2 = Book.objects.create(name='Test Book 2', price=200, author_name='Author 2')
+        for user in users:
+            UserBookRelation.objects.create(user=user, book=book_1)
+        UserBookRelation.objects.create(user=users[3], book=book_2)
+
+        with self.assertNumQueries(2):
+            books = list(Book.objects.with_top_readers(2).order_by('id'))
+            data = BooksSerializer(books, many=True).data
+        self.assertEqual(4, data[0]['readers_count'])
+        self.assertEqual(['Name0', 'Name1'], [reader['first_name'] for reader in data[0]['readers']])
+        self.assertEqual(1, data[1]['readers_count'])
+        self.assertEqual(['Name3'], [reader['first_name'] for reader in data[1]['readers']])
+
+    def test_no_readers(self):
+        Book.objects.create(name='Test Book 1', price=100, author_name='Author 1')
+        data = BooksSerializer(Book.objects.with_top_readers(2), many=True).data
+        self.assertEqual((0, []), (data[0]['readers_count'], data[0]['readers']))
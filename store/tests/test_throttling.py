@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.utils.json import json
+from django.contrib.auth.models import User
+
+from store.models import Book
+from store.throttling import TokenBuckets, parse_rate, reset_buckets
+
+
+class TokenBucketsTestCase(TestCase):
+    def test_parse_rate(self):
+        self.assertEqual(20, parse_rate('20/s'))
+        self.assertEqual(10, parse_rate('600/min'))
+        self.assertEqual(1, parse_rate('3600/hour'))
+
+    def test_take(self):
+        buckets = TokenBuckets(rate=2, burst=3)
+        self.assertEqual([0, 0, 0], [buckets.take('a', now=0) for _ in range(3)])
+        self.assertEqual(0.5, buckets.take('a', now=0))
+        self.assertEqual(0.25, buckets.take('a', now=0.25))
+        self.assertEqual(0, buckets.take('a', now=0.5))
+        self.assertEqual(0, buckets.take('b', now=0.5))
+        self.assertEqual((5, 2), (buckets.allowed, buckets.throttled))
+
+    def test_refill_is_capped(self):
+        buckets = TokenBuckets(rate=1, burst=2)
+        buckets.take('a', now=0)
+        self.assertEqual([0, 0], [buckets.take('a', now=100) for _ in range(2)])
+        self.assertNotEqual(0, buckets.take('a', now=100))
+
+    def test_prune(self):
+        buckets = TokenBuckets(rate=1, burst=2, max_clients=2)
+        buckets.take('a', now=0)
+        buckets.take('b', now=9.5)
+        buckets.take('c', now=10)
+        self.assertEqual(2, len(buckets))
+        self.assertNotEqual(0, [buckets.take('b', now=10) for _ in range(2)][-1])
+
+    def test_flood_keeps_throttled_clients(self):
+        buckets = TokenBuckets(rate=1, burst=1, max_clients=3)
+        buckets.take('a', now=0)
+        for index in range(10):
+            self.assertNotEqual(0, buckets.take('a', now=index * 0.1))
+            buckets.take(f'flood {index}', now=index * 0.1)
+        self.assertEqual(3, len(buckets))
+        self.assertNotEqual(0, buckets.take('a', now=0.95))
+
+
+@override_settings(STORE_RESPONSE_CACHE=None, STORE_THROTTLE_RATES={
+    'books': {'user': {'rate': '1/min', 'burst': 2}, 'anon': {'rate': '1/min', 'burst': 1}},
+    'relations': {'user': {'rate': '1/min', 'burst': 1}},
+})
+class ThrottlingApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.other = User.objects.create(username='other')
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+        # Buckets outlive the class-wide settings override.
+        reset_buckets('STORE_THROTTLE_RATES')
+
+    def test_anonymous_per_ip(self):
+        url = reverse('book-list')
+        self.assertEqual(status.HTTP_200_OK, self.client.get(url).status_code)
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+        self.assertEqual('60', response['Retry-After'])
+        self.assertEqual(status.HTTP_200_OK, self.client.get(url, REMOTE_ADDR='10.0.0.2').status_code)
+
+    def test_anonymous_ignores_forwarded_for(self):
+        url = reverse('book-list')
+        self.assertEqual(status.HTTP_200_OK, self.client.get(url, HTTP_X_FORWARDED_FOR='1.1.1.1').status_code)
+        response = self.client.get(url, HTTP_X_FORWARDED_FOR='2.2.2.2')
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+
+    def test_anonymous_behind_proxy(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            url = reverse('book-list')
+            self.assertEqual(status.HTTP_200_OK, self.client.get(url, HTTP_X_FORWARDED_FOR='1.1.1.1').status_code)
+            self.assertEqual(status.HTTP_200_OK, self.client.get(url, HTTP_X_FORWARDED_FOR='2.2.2.2').status_code)
+            # Only the address appended by the proxy counts.
+            response = self.client.get(url, HTTP_X_FORWARDED_FOR='3.3.3.3, 2.2.2.2')
+            self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+
+    def test_user(self):
+        url = reverse('book-detail', args=(self.book.id,))
+        self.client.force_authenticate(self.user)
+        self.assertEqual(status.HTTP_200_OK, self.client.get(url).status_code)
+        self.assertEqual(status.HTTP_200_OK, self.client.get(url).status_code)
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, self.client.get(url).status_code)
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(status.HTTP_200_OK, self.client.get(url).status_code)
+
+    def test_async_endpoints(self):
+        # Same buckets as the sync endpoints.
+        self.assertEqual(status.HTTP_200_OK, self.client.get(reverse('async-book-list')).status_code)
+        response = self.client.get(reverse('async-book-detail', args=(self.book.id,)))
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+        self.assertEqual('60', response['Retry-After'])
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, self.client.get(reverse('book-list')).status_code)
+
+        self.client.force_login(self.user)
+        url = reverse('async-user-book-relation-detail', args=(self.book.id,))
+        response = self.client.patch(url, data=json.dumps({'rate': 3}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        response = self.client.patch(url, data=json.dumps({'rate': 4}), content_type='application/json')
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+
+    def test_relations(self):
+        url = reverse('user-book-relation-detail', args=(self.book.id,))
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(url, data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        response = self.client.patch(url, data=json.dumps({'like': False}), content_type='application/json')
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+
+    def test_metrics(self):
+        self.client.get(reverse('book-list'))
+        self.client.get(reverse('book-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertIn('store_throttle_requests_total{scope="books",kind="anon",result="throttled"} 1',
+                      response.content.decode())
+
+    @override_settings(STORE_THROTTLE_RATES=None)
+    def test_disabled(self):
+        for _ in range(3):
+            self.assertEqual(status.HTTP_200_OK, self.client.get(reverse('book-list')).status_code)
@@ -0,0 +1,202 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.utils.json import json
+from django.contrib.auth.models import User
+
+from store.models import Book, UserBookRelation
+from store.write_behind import BufferBusy, LocalBuffer, SharedBuffer, get_write_buffer
+
+
+class LocalBufferTestCase(TestCase):
+    buffer_class = LocalBuffer
+
+    def setUp(self):
+        self.user_1 = User.objects.create(username='user1')
+        self.user_2 = User.objects.create(username='user2')
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+        self.buffer = self.make_buffer()
+
+    def make_buffer(self, **options):
+        return self.buffer_class(flush_interval=0, **options)
+
+    def test_coalesces_toggles(self):
+        self.buffer.add(self.user_1.pk, self.book.pk, {'like': True})
+        self.buffer.add(self.user_1.pk, self.book.pk, {'like': False})
+        self.buffer.add(self.user_1.pk, self.book.pk, {'in_bookmarks': True})
+        self.buffer.add(self.user_1.pk, self.book.pk, {'like': True})
+        self.buffer.add(self.user_2.pk, self.book.pk, {'like': True})
+        self.assertFalse(UserBookRelation.objects.exists())
+
+        self.assertEqual(2, self.buffer.flush())
+        relation = UserBookRelation.objects.get(user=self.user_1, book=self.book)
+        self.assertEqual((True, True), (relation.like, relation.in_bookmarks))
+        self.book.refresh_from_db()
+        self.assertEqual(2, self.book.likes_count)
+        self.assertEqual(0, len(self.buffer))
+
+    def test_updates_existing_relation(self):
+        UserBookRelation.objects.create(user=self.user_1, book=self.book, like=True, rate=4)
+        self.buffer.add(self.user_1.pk, self.book.pk, {'like': False})
+        self.buffer.add(self.user_2.pk, self.book.pk, {'in_bookmarks': True})
+        self.buffer.flush()
+
+        relation = UserBookRelation.objects.get(user=self.user_1, book=self.book)
+        self.assertEqual((False, 4), (relation.like, relation.rate))
+        self.book.refresh_from_db()
+        self.assertEqual((0, 1, 4), (self.book.likes_count, self.book.rating_count, self.book.rating_sum))
+
+    def test_drops_unknown_books(self):
+        self.buffer.add(self.user_1.pk, 0, {'like': True})
+        self.assertEqual(0, self.buffer.flush())
+        self.assertFalse(UserBookRelation.objects.exists())
+
+    def test_flushes_when_full(self):
+        buffer = self.make_buffer(max_pending=2)
+        buffer.add(self.user_1.pk, self.book.pk, {'like': True})
+        self.assertFalse(UserBookRelation.objects.exists())
+        buffer.add(self.user_2.pk, self.book.pk, {'like': True})
+        self.assertEqual(2, UserBookRelation.objects.count())
+
+    def test_failed_flush_keeps_toggles(self):
+        self.buffer.add(self.user_1.pk, self.book.pk, {'like': True})
+        with mock.patch('store.write_behind.apply_changes', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual(1, self.buffer.flush())
+        self.assertTrue(UserBookRelation.objects.get(user=self.user_1).like)
+
+    def test_settle_applies_only_given_pairs(self):
+        self.buffer.add(self.user_1.pk, self.book.pk, {'like': True})
+        self.buffer.add(self.user_2.pk, self.book.pk, {'like': True})
+        self.buffer.settle([(self.user_1.pk, self.book.pk)])
+        self.assertTrue(UserBookRelation.objects.get(user=self.user_1).like)
+        self.buffer.settle([(self.user_1.pk, self.book.pk)])
+        self.assertEqual(1, UserBookRelation.objects.filter(like=True).count())
+
+
+class SharedBufferTestCase(LocalBufferTestCase):
+    buffer_class = SharedBuffer
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_waits_for_missing_slot(self):
+        self.buffer.add(self.user_1.pk, self.book.pk, {'like': True})
+        # A writer that took slot 2 but has not stored it yet.
+        cache.incr(self.buffer.key('seq'))
+        self.buffer.add(self.user_2.pk, self.book.pk, {'like': True})
+
+        self.assertEqual(1, self.buffer.flush())
+        self.assertEqual(2, len(self.buffer))
+        self.buffer.gap_timeout = 0
+        self.assertEqual(1, self.buffer.flush())
+        self.assertEqual(0, len(self.buffer))
+
+    def test_settle_applies_only_given_pairs(self):
+        # Slots are replayed in order, so settling user_2 also applies user_1.
+        self.buffer.add(self.user_1.pk, self.book.pk, {'like': True})
+        self.buffer.add(self.user_2.pk, self.book.pk, {'like': True})
+        self.buffer.settle([(self.user_1.pk, self.book.pk)])
+        self.assertTrue(UserBookRelation.objects.get(user=self.user_1).like)
+        self.buffer.settle([(self.user_2.pk, self.book.pk)])
+        self.assertEqual(2, UserBookRelation.objects.filter(like=True).count())
+
+    def test_settle_times_out_while_locked(self):
+        buffer = self.make_buffer(settle_timeout=0)
+        buffer.add(self.user_1.pk, self.book.pk, {'like': True})
+        cache.add(self.buffer.key('lock'), 1)
+        with self.assertRaises(BufferBusy):
+            buffer.settle([(self.user_1.pk, self.book.pk)])
+        buffer.settle([(self.user_2.pk, self.book.pk)])
+
+    def test_skips_while_locked(self):
+        self.buffer.add(self.user_1.pk, self.book.pk, {'like': True})
+        cache.add(self.buffer.key('lock'), 1)
+        self.assertEqual(0, self.buffer.flush())
+        cache.delete(self.buffer.key('lock'))
+        self.assertEqual(1, self.buffer.flush())
+
+
+@override_settings(STORE_WRITE_BEHIND={'BACKEND': 'store.write_behind.LocalBuffer',
+                                       'OPTIONS': {'flush_interval': 0}})
+class WriteBehindApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+        self.url = reverse('user-book-relation-detail', args=(self.book.id,))
+        self.client.force_authenticate(self.user)
+
+    def test_like_is_buffered(self):
+        # Only the check that the book exists.
+        with self.assertNumQueries(1):
+            response = self.client.patch(self.url, data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_202_ACCEPTED, response.status_code)
+        self.assertEqual({'book': self.book.id, 'like': True}, response.data)
+        self.assertFalse(UserBookRelation.objects.exists())
+
+        get_write_buffer().flush()
+        self.assertTrue(UserBookRelation.objects.get(user=self.user, book=self.book).like)
+        self.book.refresh_from_db()
+        self.assertEqual(1, self.book.likes_count)
+
+    def test_rate_writes_through(self):
+        response = self.client.patch(self.url, data=json.dumps({'like': True, 'rate': 3}),
+                                     content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(3, UserBookRelation.objects.get(user=self.user, book=self.book).rate)
+
+    def test_invalid_toggle(self):
+        response = self.client.patch(self.url, data=json.dumps({'like': 'maybe'}), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_falls_back_when_buffer_fails(self):
+        with mock.patch.object(LocalBuffer, 'add', side_effect=ConnectionError):
+            response = self.client.patch(self.url, data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(UserBookRelation.objects.get(user=self.user, book=self.book).like)
+
+    def test_unknown_book_is_not_acknowledged(self):
+        url = reverse('user-book-relation-detail', args=(self.book.id + 1,))
+        response = self.client.patch(url, data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        self.assertEqual(0, len(get_write_buffer()))
+
+    def test_sync_write_is_not_overwritten(self):
+        self.client.patch(self.url, data=json.dumps({'like': True}), content_type='application/json')
+        response = self.client.patch(self.url, data=json.dumps({'like': False, 'rate': 3}),
+                                     content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        get_write_buffer().flush()
+        relation = UserBookRelation.objects.get(user=self.user, book=self.book)
+        self.assertEqual((False, 3), (relation.like, relation.rate))
+        self.book.refresh_from_db()
+        self.assertEqual(0, self.book.likes_count)
+
+    def test_bulk_write_is_not_overwritten(self):
+        self.client.patch(self.url, data=json.dumps({'in_bookmarks': True}), content_type='application/json')
+        response = self.client.post(reverse('user-book-relation-bulk'),
+                                    data=json.dumps([{'book': self.book.id, 'in_bookmarks': False}]),
+                                    content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        get_write_buffer().flush()
+        self.assertFalse(UserBookRelation.objects.get(user=self.user, book=self.book).in_bookmarks)
+
+    def test_async_write_is_not_overwritten(self):
+        self.client.patch(self.url, data=json.dumps({'like': True}), content_type='application/json')
+        self.client.force_login(self.user)
+        response = self.client.patch(reverse('async-user-book-relation-detail', args=(self.book.id,)),
+                                     data=json.dumps({'like': False}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        get_write_buffer().flush()
+        self.assertFalse(UserBookRelation.objects.get(user=self.user, book=self.book).like)
+
+    def test_command_rejects_local_buffer(self):
+        with self.assertRaisesMessage(CommandError, 'LocalBuffer'):
+            call_command('flush_write_behind')
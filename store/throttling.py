@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Token-bucket throttling kept in process memory. A client may send `burst`
+# requests at once and is then refilled at `rate`. Unlike DRF's
+# SimpleRateThrottle there is no cache round trip and no request history per
+# client: a check is a dict lookup and a little arithmetic under one lock.
+# Limits are per process, so with N workers a client can get up to N times
+# the configured rate.
+#
+# STORE_THROTTLE_RATES maps a view's `throttle_scope` to the limits for
+# authenticated users ('user', keyed by pk) and anonymous clients ('anon',
+# keyed by IP address, see AnonTokenBucketThrottle), e.g. {'books': {'user': {'rate': '20/s', 'burst': 200}}}.
+# A missing entry means no limit.
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    # '20/s', '600/min', ... as tokens per second.
+    count, _, period = rate.partition('/')
+    return int(count) / PERIODS[period[0]]
+
+
+class TokenBuckets:
+    def __init__(self, rate, burst, max_clients=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.allowed = 0
+        self.throttled = 0
+        # client -> [tokens, updated_at], least recently used first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client, now=None):
+        # Returns 0 when the request may go ahead, otherwise the seconds until
+        # the client has a token again.
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._prune(now)
+                bucket = self._buckets[client] = [self.burst, now]
+            else:
+                self._buckets.move_to_end(client)
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                self.allowed += 1
+                return 0
+            bucket[0] = tokens
+            self.throttled += 1
+            return (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        # Drops buckets from the least recently used end: those that have
+        # refilled (the same as no bucket), and then as many as it takes to
+        # make room. A flood of new clients evicts the clients that went
+        # quiet first, not the ones still being throttled.
+        while self._buckets:
+            client, (tokens, updated_at) = next(iter(self._buckets.items()))
+            if len(self._buckets) < self.max_clients and tokens + (now - updated_at) * self.rate < self.burst:
+                return
+            del self._buckets[client]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_buckets(scope, kind):
+    config = (getattr(settings, 'STORE_THROTTLE_RATES', None) or {}).get(scope, {}).get(kind)
+    if not config:
+        return None
+    buckets = _buckets.get((scope, kind))
+    if buckets is None:
+        with _buckets_lock:
+            buckets = _buckets.get((scope, kind))
+            if buckets is None:
+                buckets = _buckets[(scope, kind)] = TokenBuckets(parse_rate(config['rate']), config['burst'])
+    return buckets
+
+
+@receiver(setting_changed)
+def reset_buckets(setting, **kwargs):
+    if setting == 'STORE_THROTTLE_RATES':
+        with _buckets_lock:
+            _buckets.clear()
+
+
+def throttle_metrics():
+    # {(scope, kind, result): count} for the metrics endpoint.
+    with _buckets_lock:
+        items = list(_buckets.items())
+    metrics = {}
+    for (scope, kind), buckets in items:
+        metrics[(scope, kind, 'allowed')] = buckets.allowed
+        metrics[(scope, kind, 'throttled')] = buckets.throttled
+    return metrics
+
+
+class TokenBucketThrottle(BaseThrottle):
+    kind = None
+
+    def get_client(self, request):
+        raise NotImplementedError('.get_client() must be overridden')
+
+    def allow_request(self, request, view):
+        self.delay = 0
+        scope = getattr(view, 'throttle_scope', None)
+        client = self.get_client(request)
+        if scope is None or client is None:
+            return True
+        buckets = get_buckets(scope, self.kind)
+        if buckets is None:
+            return True
+        self.delay = buckets.take(client)
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'user'
+
+    def get_client(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'anon'
+
+    def get_client(self, request):
+        if request.user and request.user.is_authenticated:
+            return None
+        # X-Forwarded-For is set by the client unless a proxy overwrites it,
+        # so it is only trusted with NUM_PROXIES configured. DRF's get_ident
+        # takes the whole header when NUM_PROXIES is None, which would give
+        # every forged value a fresh bucket.
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR')
+        return self.get_ident(request)
@@ -1,44 +1,268 @@
+import io
+import logging
+
 from rest_framework.viewsets import ModelViewSet
+from django.db import router
+from django.db.models import F
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter
-from rest_framework.filters import OrderingFilter
 from django.shortcuts import render
+from django.http import Http404, StreamingHttpResponse
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.mixins import UpdateModelMixin
+from rest_framework.mixins import ListModelMixin, UpdateModelMixin
 from rest_framework.viewsets import GenericViewSet
-from django.db.models import Count, Case, When
+from rest_framework.generics import get_object_or_404
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework import status
 
 from .models import Book, UserBookRelation
-from .serializers import BooksSerializer, UserBookRelationSerializer
-from .permissions import IsOwnerOrStaffOrReadOnly
+from .serializers import (BooksSerializer, BookReadersSerializer, BookSummarySerializer, LibrarySerializer,
+                          SimilarBooksSerializer, UserBookRelationSerializer)
+from .permissions import IsOwnerOrStaffOrReadOnly, annotate_writable
+from .readers_process import attach_top_readers
+from .pagination import KeysetPagination, LeaderboardPagination, LibraryPagination, ReadersPagination
+from .caching import CachedResponseMixin
+from .conditional import ConditionalGetMixin
+from .instrumentation import InstrumentedViewMixin
+from .fast_serializers import FastBookReadMixin, fast_book_serializer_enabled
+from .fieldsets import SparseFieldsMixin
+from .renderers import CompactFormatsMixin
+from .throttling import AnonTokenBucketThrottle, UserTokenBucketThrottle
+from .search import BookSearchFilter, BookOrderingFilter
+from .leaderboards import leaderboard_queryset
+from .library import SHELVES, OwnRelationFilter, own_relation_requested
+from .relations_process import RELATION_FIELDS, bulk_update_relations
+from .importer import IMPORT_FORMATS, BookImporter, UnreadableFile, guess_import_format
+from .exporter import EXPORT_CONTENT_TYPES, EXPORT_FORMATS, render_export
+from .write_behind import BUFFERED_FIELDS, get_write_buffer
+
+logger = logging.getLogger(__name__)
 
 
-class BookViewSet(ModelViewSet):
-    queryset = Book.objects.all().annotate(
-        annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))
-        ).select_related('owner').prefetch_related('readers').order_by('id')
+class BookViewSet(InstrumentedViewMixin, CompactFormatsMixin, ConditionalGetMixin, CachedResponseMixin,
+                  SparseFieldsMixin, FastBookReadMixin, ModelViewSet):
+    queryset = Book.objects.all().defer('search_vector').select_related('owner').with_top_readers(
+        BooksSerializer.readers_limit).order_by('id')
     permission_classes = [IsOwnerOrStaffOrReadOnly]
+    throttle_classes = [UserTokenBucketThrottle, AnonTokenBucketThrottle]
+    throttle_scope = 'books'
     serializer_class = BooksSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, BookSearchFilter, BookOrderingFilter, OwnRelationFilter]
     filterset_fields = ['price']
     search_fields = ['name', 'author_name']
-    ordering_fields = ['price', 'author_name']
+    ordering_fields = ['price', 'author_name', 'search_rank']
+    replica_reads = True
+    cached_actions = ('list', 'retrieve', 'leaderboard', 'similar')
+    # Import and export scale with their input, so they carry no budget.
+    query_budget = {'list': 2, 'retrieve': 3, 'create': 4, 'update': 4, 'partial_update': 4, 'destroy': 5,
+                    'readers': 2, 'leaderboard': 3, 'similar': 2}
+
+    write_actions = ('update', 'partial_update', 'destroy')
+    import_rejected_sample = 100
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.write_actions:
+            # The book and whether the caller may modify it come back in one
+            # query; readers are only loaded once the write is allowed.
+            queryset = annotate_writable(queryset.with_top_readers(None), self.request.user)
+            if self.action == 'destroy':
+                queryset = queryset.select_related(None).only('id', 'owner_id')
+            return queryset
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return queryset
+        # Drop the readers query and the owner join unless a selected field
+        # needs them, and load only the selected columns.
+        if not fieldset.includes('readers_count', 'readers'):
+            queryset = queryset.with_top_readers(None)
+        if not fieldset.includes('owner_name') and not fieldset.expands('owner'):
+            queryset = queryset.select_related(None)
+        return queryset.only(*self.fast_serializer_class.values_fields(fieldset), 'owner',
+                             *(name for name in self.ordering_fields if name != 'search_rank'))
 
     def perform_create(self, serializer):
         serializer.validated_data['owner'] = self.request.user
         serializer.save()
 
+    def perform_update(self, serializer):
+        serializer.save()
+        attach_top_readers([serializer.instance], BooksSerializer.readers_limit,
+                           using=router.db_for_read(UserBookRelation))
+
+    def get_response_cache_key(self, request, version):
+        key = super().get_response_cache_key(request, version)
+        if own_relation_requested(request):
+            return f'{key}:user:{request.user.pk}'
+        return key
+
+    def get_last_modified(self, request):
+        # Book.updated_at does not move when the caller toggles a bookmark, so
+        # it says nothing about responses carrying their own relation.
+        if own_relation_requested(request):
+            return None
+        return super().get_last_modified(request)
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import',
+            parser_classes=[MultiPartParser], permission_classes=[IsAuthenticated])
+    def import_books(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['No file was submitted.']})
+        file_format = request.data.get('file_format') or guess_import_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            raise ValidationError({'file_format': [f'Expected one of: {", ".join(IMPORT_FORMATS)}.']})
+
+        rejected = []
+
+        def on_reject(record):
+            if len(rejected) < self.import_rejected_sample:
+                rejected.append(record)
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            report = BookImporter(owner=request.user, on_reject=on_reject).run(stream, file_format)
+        except UnreadableFile as e:
+            return Response({**e.report.as_dict(), 'rejected_rows': rejected, 'file': [str(e)]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({**report.as_dict(), 'rejected_rows': rejected}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'], pagination_class=ReadersPagination)
+    def readers(self, request, pk=None):
+        book = get_object_or_404(Book.objects.only('id'), pk=pk)
+        relations = UserBookRelation.objects.filter(book=book).select_related('user').only(
+            'id', 'user__first_name', 'user__last_name').order_by('id')
+        page = self.paginate_queryset(relations)
+        serializer = BookReadersSerializer([relation.user for relation in page], many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='leaderboard/(?P<board>top-rated|most-liked)',
+            url_name='leaderboard', pagination_class=LeaderboardPagination)
+    def leaderboard(self, request, board=None):
+        return self.cached_response(self.leaderboard_page, request, board=board)
+
+    def leaderboard_page(self, request, board=None):
+        queryset = leaderboard_queryset(self.get_queryset(), board, request.query_params.get('author'))
+        if fast_book_serializer_enabled():
+            page = self.paginate_queryset(self.book_values(queryset))
+            serializer = self.get_fast_serializer(page, many=True)
+        else:
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class UserBookRelationView(UpdateModelMixin, GenericViewSet):
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        return self.cached_response(self.similar_books, request, pk=pk)
+
+    def similar_books(self, request, pk=None):
+        # Neighbours stored by `manage.py compute_similar_books`, best first.
+        try:
+            books = list(Book.objects.filter(recommended_for__book_id=pk).annotate(
+                score=F('recommended_for__score')).only(*SimilarBooksSerializer.model_fields).order_by(
+                'recommended_for__rank'))
+        except (TypeError, ValueError):
+            raise Http404
+        if not books:
+            get_object_or_404(Book.objects.only('id'), pk=pk)
+        return Response(SimilarBooksSerializer(books, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'export_format': [f'Expected one of: {", ".join(EXPORT_FORMATS)}.']})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(render_export(queryset, export_format),
+                                         content_type=EXPORT_CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="books.{export_format}"'
+        return response
+
+
+class LibraryView(InstrumentedViewMixin, CompactFormatsMixin, ListModelMixin, GenericViewSet):
+    # /me/library/<shelf>/: the caller's bookmarked, liked or rated books.
     permission_classes = [IsAuthenticated]
+    serializer_class = LibrarySerializer
+    pagination_class = LibraryPagination
+    query_budget = {'list': 1}
+
+    def get_queryset(self):
+        return UserBookRelation.objects.filter(SHELVES[self.kwargs['shelf']], user=self.request.user).select_related(
+            'book').only(*RELATION_FIELDS, *(f'book__{name}' for name in BookSummarySerializer.model_fields)).order_by(
+            '-id')
+
+
+class UserBookRelationView(InstrumentedViewMixin, CompactFormatsMixin, UpdateModelMixin, GenericViewSet):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [UserTokenBucketThrottle]
+    throttle_scope = 'relations'
     queryset = UserBookRelation.objects.all()
     serializer_class = UserBookRelationSerializer
     lookup_field = 'book'
+    bulk_max_items = 1000
+    # bulk issues one upsert per distinct set of supplied fields (at most 8).
+    # A toggle that cannot be buffered is written through after the check
+    # that its book exists.
+    query_budget = {'update': 7, 'partial_update': 8, 'bulk': 12}
 
     def get_object(self):
         obj, created = UserBookRelation.objects.get_or_create(user=self.request.user, book_id=self.kwargs['book'])
         return obj
 
+    def update(self, request, *args, **kwargs):
+        buffer = get_write_buffer()
+        if buffer is not None and kwargs.get('partial') and isinstance(request.data, dict) and request.data \
+                and set(request.data) <= set(BUFFERED_FIELDS):
+            return self.buffered_update(buffer, request, *args, **kwargs)
+        self.settle_buffered([self.kwargs['book']])
+        return super().update(request, *args, **kwargs)
+
+    def settle_buffered(self, book_ids):
+        # Buffered toggles for these books are older than this synchronous
+        # write and must not land on top of it.
+        buffer = get_write_buffer()
+        if buffer is None:
+            return
+        keys = []
+        for book_id in book_ids:
+            try:
+                keys.append((self.request.user.pk, int(book_id)))
+            except (TypeError, ValueError):
+                pass
+        with self.unbudgeted():
+            buffer.settle(keys)
+
+    def buffered_update(self, buffer, request, *args, **kwargs):
+        # Like/bookmark toggles are acknowledged before they reach the
+        # database, see store/write_behind.py.
+        try:
+            book_id = int(self.kwargs['book'])
+        except ValueError:
+            raise Http404
+        serializer = self.get_serializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        if not Book.objects.filter(id=book_id).exists():
+            raise Http404
+        try:
+            buffer.add(request.user.pk, book_id, dict(serializer.validated_data))
+        except Exception:
+            logger.exception('Write-behind buffer unavailable, writing through.')
+            return super().update(request, *args, **kwargs)
+        return Response({'book': book_id, **serializer.validated_data}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError({'detail': 'Expected a list of relations.'})
+        if len(request.data) > self.bulk_max_items:
+            raise ValidationError({'detail': f'At most {self.bulk_max_items} relations per request.'})
+        self.settle_buffered(item.get('book') for item in request.data if isinstance(item, dict))
+        return Response(bulk_update_relations(request.user, request.data))
+
 
 def auth(request):
     return render(request, 'store/oauth.html')
@@ -0,0 +1,303 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .caching import bump_catalogue_version
+from .models import Book, UserBookRelation
+
+# Write-behind buffering for like/bookmark toggles (STORE_WRITE_BEHIND).
+#
+# When enabled, a PATCH on /book_relation/<book>/ that only touches `like`
+# and/or `in_bookmarks` is validated, put into a buffer and answered with
+# 202 without touching the database. Buffered toggles are coalesced per
+# (user, book), last value wins per field, and flushed in batches: one
+# upsert per set of touched fields plus one likes_count UPDATE per distinct
+# delta, in a single transaction.
+#
+# Guarantees:
+# - Per (user, book), toggles are applied in the order they were
+#   acknowledged; only the final state of a batch reaches the database.
+# - Synchronous writes to a (user, book) pair (a PATCH with `rate`, bulk,
+#   the async endpoint) first apply that pair's buffered toggles, so an
+#   older toggle never overwrites a newer synchronous write. If that takes
+#   longer than `settle_timeout` the write is refused with 503.
+# - A toggle is only acknowledged for a book that exists at that moment.
+# - Reads, counters and the response cache lag behind by up to one flush
+#   interval; a client does not read its own buffered writes.
+# - LocalBuffer lives in process memory. Toggles acknowledged since the last
+#   flush are lost if the process dies without running its atexit flush,
+#   and only the process itself can flush it (not `manage.py
+#   flush_write_behind`).
+# - SharedBuffer keeps toggles in a Django cache until they are flushed, so
+#   they survive a restart of the web process but not an eviction or loss
+#   of the cache itself. Use a persistent, non-evicting cache.
+# - Toggles for books or users deleted before the flush are dropped.
+# - A failed flush is retried on the next interval; nothing is dropped.
+# - likes_count deltas are computed against the rows locked in the flush
+#   transaction. A concurrent synchronous insert of the same relation can
+#   still make the counter drift; `manage.py check_likes --fix` repairs it.
+#
+# Synchronous fallback: with STORE_WRITE_BEHIND unset (the default), for
+# payloads that carry `rate` or `book`, and whenever the buffer cannot
+# accept a toggle, the view writes through as before.
+
+logger = logging.getLogger('store.write_behind')
+
+BUFFERED_FIELDS = ('like', 'in_bookmarks')
+
+
+class BufferBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Earlier changes to this relation are still being written, try again shortly.'
+    default_code = 'buffer_busy'
+
+
+def apply_changes(changes):
+    # `changes` maps (user_id, book_id) to {field: value}.
+    book_ids = set(Book.objects.filter(id__in={book_id for user_id, book_id in changes}).values_list('id', flat=True))
+    user_ids = set(User.objects.filter(id__in={user_id for user_id, book_id in changes}).values_list('id', flat=True))
+    changes = {key: fields for key, fields in changes.items() if key[0] in user_ids and key[1] in book_ids}
+    if not changes:
+        return 0
+
+    with transaction.atomic():
+        likes = {
+            (relation.user_id, relation.book_id): relation.like
+            for relation in UserBookRelation.objects.select_for_update().filter(
+                user_id__in={user_id for user_id, book_id in changes},
+                book_id__in={book_id for user_id, book_id in changes}).only('user_id', 'book_id', 'like')
+        }
+
+        groups = {}
+        deltas = {}
+        for (user_id, book_id), fields in changes.items():
+            groups.setdefault(tuple(sorted(fields)), []).append(
+                UserBookRelation(user_id=user_id, book_id=book_id, **fields))
+            if 'like' in fields:
+                delta = bool(fields['like']) - bool(likes.get((user_id, book_id), False))
+                deltas[book_id] = deltas.get(book_id, 0) + delta
+
+        for fields, relations in groups.items():
+            UserBookRelation.objects.bulk_create(relations, update_conflicts=True,
+                                                 unique_fields=['user', 'book'], update_fields=list(fields))
+
+        books_by_delta = {}
+        for book_id, delta in deltas.items():
+            if delta:
+                books_by_delta.setdefault(delta, []).append(book_id)
+        now = timezone.now()
+        for delta, ids in books_by_delta.items():
+            Book.objects.filter(id__in=ids).update(likes_count=F('likes_count') + delta, updated_at=now)
+    bump_catalogue_version()
+    return len(changes)
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush_interval=1.0, max_pending=10000, settle_timeout=5.0):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.settle_timeout = settle_timeout
+        self.flush_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def add(self, user_id, book_id, fields):
+        if self.put(user_id, book_id, fields) >= self.max_pending:
+            # Back-pressure: the request that fills the buffer flushes it.
+            self.flush()
+        else:
+            self.start_flusher()
+
+    def start_flusher(self):
+        if not self.flush_interval or self.thread is not None:
+            return
+        with self.flush_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='store-write-behind', daemon=True)
+                self.thread.start()
+                atexit.register(self.stop)
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Write-behind flush failed, retrying on the next interval.')
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self.stopped.set()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Final write-behind flush failed.')
+
+
+class LocalBuffer(WriteBehindBuffer):
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, user_id, book_id, fields):
+        with self.lock:
+            self.pending.setdefault((user_id, book_id), {}).update(fields)
+            return len(self.pending)
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                changes, self.pending = self.pending, {}
+            return self.apply(changes)
+
+    def settle(self, keys):
+        # Applies the buffered toggles of these (user_id, book_id) pairs now,
+        # ahead of a synchronous write to them. Holding flush_lock also waits
+        # for a flush that has already taken them out of `pending`.
+        if not self.flush_lock.acquire(timeout=self.settle_timeout):
+            raise BufferBusy()
+        try:
+            with self.lock:
+                changes = {key: self.pending.pop(key) for key in keys if key in self.pending}
+            self.apply(changes)
+        finally:
+            self.flush_lock.release()
+
+    def apply(self, changes):
+        if not changes:
+            return 0
+        try:
+            return apply_changes(changes)
+        except Exception:
+            with self.lock:
+                # Toggles that arrived meanwhile are newer and win.
+                for key, fields in changes.items():
+                    self.pending[key] = {**fields, **self.pending.get(key, {})}
+            raise
+
+
+class SharedBuffer(WriteBehindBuffer):
+    # Every toggle gets a slot number from cache.incr() and is stored under its
+    # own key, so writers never read-modify-write each other's entries. A
+    # flush replays slots in order under a cache lock and only then moves the
+    # `flushed` pointer. A slot whose writer died between incr() and set()
+    # is skipped once it has been missing for `gap_timeout` seconds.
+    #
+    # Each toggle also records its slot under pending:<user>:<book> before
+    # the slot itself is stored, so a synchronous write can tell whether its
+    # pair still has toggles beyond the `flushed` pointer.
+    settle_poll = 0.05
+
+    def __init__(self, cache_alias='default', key_prefix='store:write_behind', batch_size=5000,
+                 lock_timeout=60, gap_timeout=30, marker_timeout=86400, **options):
+        super().__init__(**options)
+        self.cache = caches[cache_alias]
+        self.key_prefix = key_prefix
+        self.batch_size = batch_size
+        self.lock_timeout = lock_timeout
+        self.gap_timeout = gap_timeout
+        self.marker_timeout = marker_timeout
+        self.gaps = {}
+
+    def key(self, name):
+        return f'{self.key_prefix}:{name}'
+
+    def __len__(self):
+        return (self.cache.get(self.key('seq')) or 0) - (self.cache.get(self.key('flushed')) or 0)
+
+    def put(self, user_id, book_id, fields):
+        self.cache.add(self.key('seq'), 0, timeout=None)
+        seq = self.cache.incr(self.key('seq'))
+        self.cache.set(self.key(f'pending:{user_id}:{book_id}'), seq, timeout=self.marker_timeout)
+        self.cache.set(self.key(f'slot:{seq}'), (user_id, book_id, fields), timeout=None)
+        return seq - (self.cache.get(self.key('flushed')) or 0)
+
+    def flush(self):
+        if not self.cache.add(self.key('lock'), 1, timeout=self.lock_timeout):
+            return 0
+        try:
+            flushed = self.cache.get(self.key('flushed')) or 0
+            last = min(self.cache.get(self.key('seq')) or 0, flushed + self.batch_size)
+            slots = self.cache.get_many([self.key(f'slot:{seq}') for seq in range(flushed + 1, last + 1)])
+
+            changes = {}
+            end = flushed
+            for seq in range(flushed + 1, last + 1):
+                entry = slots.get(self.key(f'slot:{seq}'))
+                if entry is None and not self.gap_expired(seq):
+                    break
+                if entry is not None:
+                    user_id, book_id, fields = entry
+                    changes.setdefault((user_id, book_id), {}).update(fields)
+                end = seq
+            if end == flushed:
+                return 0
+
+            applied = apply_changes(changes) if changes else 0
+            self.cache.set(self.key('flushed'), end, timeout=None)
+            self.cache.delete_many([self.key(f'slot:{seq}') for seq in range(flushed + 1, end + 1)])
+            self.gaps = {seq: seen for seq, seen in self.gaps.items() if seq > end}
+            return applied
+        finally:
+            self.cache.delete(self.key('lock'))
+
+    def settle(self, keys):
+        markers = self.cache.get_many([self.key(f'pending:{user_id}:{book_id}') for user_id, book_id in keys])
+        if not markers:
+            return
+        # Slots are applied in order, so the pairs are settled once the
+        # pointer has passed their latest slot.
+        target = max(markers.values())
+        deadline = time.monotonic() + self.settle_timeout
+        while (self.cache.get(self.key('flushed')) or 0) < target:
+            if time.monotonic() >= deadline:
+                raise BufferBusy()
+            if not self.flush():
+                time.sleep(self.settle_poll)
+
+    def gap_expired(self, seq):
+        first_seen = self.gaps.setdefault(seq, time.monotonic())
+        return time.monotonic() - first_seen >= self.gap_timeout
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_buffer():
+    global _buffer
+    config = getattr(settings, 'STORE_WRITE_BEHIND', None)
+    if not config:
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                buffer_class = import_string(config.get('BACKEND', 'store.write_behind.LocalBuffer'))
+                _buffer = buffer_class(**config.get('OPTIONS', {}))
+    return _buffer
+
+
+@receiver(setting_changed)
+def reset_write_buffer(setting, **kwargs):
+    global _buffer
+    if setting == 'STORE_WRITE_BEHIND':
+        if _buffer is not None:
+            _buffer.stopped.set()
+        _buffer = None